@@ -0,0 +1,73 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+
+Compare per-upload duplicate check cost: rebuilding a set from get_all_ihash() vs the in-process HashIndex.
+Run with: PYTHONPATH=src/photomap python benchmarks/bench_hash_index.py
+"""
+
+import hashlib
+import time
+
+from indexes import HashIndex
+
+LIBRARY_SIZES = [1_000, 10_000, 50_000, 100_000]
+UPLOADS = 50
+
+
+def make_hash(i: int) -> str:
+    """
+    Generate deterministic sha1 hex digest
+    :param i: seed
+    :return: hex digest
+    """
+    return hashlib.sha1(str(i).encode()).hexdigest()
+
+
+def bench_rebuild(records: list[dict], new_hashes: list[str]) -> float:
+    """
+    Old approach: build a set of all hashes on every upload (DB round trip not included)
+    :param records: rows as returned by get_all_ihash
+    :param new_hashes: hashes of the uploaded photos
+    :return: seconds per upload
+    """
+    start = time.perf_counter()
+    for ihash in new_hashes:
+        hashes = {record["ihash"] for record in records}
+        if ihash not in hashes:
+            records.append({"ihash": ihash})
+    return (time.perf_counter() - start) / len(new_hashes)
+
+
+def bench_index(index: HashIndex, new_hashes: list[str]) -> float:
+    """
+    New approach: reserve / release hashes in the in-process index
+    :param index: populated hash index
+    :param new_hashes: hashes of the uploaded photos
+    :return: seconds per upload
+    """
+    start = time.perf_counter()
+    for ihash in new_hashes:
+        if index.reserve(ihash):
+            index.release(ihash, True)
+    return (time.perf_counter() - start) / len(new_hashes)
+
+
+def main() -> None:
+    """
+    Run benchmark for increasing library sizes
+    """
+    print(f"{'library size':>12} {'rebuild (us)':>14} {'index (us)':>12}")
+    for size in LIBRARY_SIZES:
+        existing = [make_hash(i) for i in range(size)]
+        new_hashes = [make_hash(-i) for i in range(1, UPLOADS + 1)]
+        rebuild = bench_rebuild([{"ihash": ihash} for ihash in existing], new_hashes)
+        index = HashIndex()
+        index.hashes = set(existing)
+        indexed = bench_index(index, new_hashes)
+        print(f"{size:>12} {rebuild * 1e6:>14.1f} {indexed * 1e6:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
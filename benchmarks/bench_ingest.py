@@ -0,0 +1,287 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+
+End-to-end ingest benchmark: parse_exif, load_image, make_thumbnails and the full upload request (Upload.post,
+against the Postgres / Redis configured in settings, only with --database, use a throwaway database), in photos/s
+and peak RSS. Every stage runs in a fresh process so peak RSS values are per stage. Results are saved as JSON.
+Run with: PYTHONPATH=src/photomap python benchmarks/bench_ingest.py [--count N] [--database] [--baseline old.json]
+"""
+
+import argparse
+import asyncio
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import PIL
+from aiohttp import FormData
+from aiohttp.test_utils import TestClient, TestServer
+from corpus import make_corpus
+
+import security
+import settings
+from database import Database
+from photo import load_image, make_thumbnails, parse_exif
+
+STAGES = ["parse_exif", "load_image", "make_thumbnails", "upload"]
+SIZES = [(4000, 3000), (3000, 4000), (6000, 4000), (1920, 1080), (4032, 3024), (1080, 1920)]
+BENCH_USER = "benchmark"
+BENCH_PASSWORD = "benchmark"
+
+
+def peak_rss() -> dict:
+    """
+    Read peak resident set size of this process and of its (finished) children. VmHWM is used when available since
+    ru_maxrss survives exec and would report the parent peak (e.g. corpus generation) for spawned processes.
+    :return: peak RSS values (MB)
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        with open("/proc/self/status", encoding="utf-8") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return {
+        "peak_rss_mb": peak,
+        "children_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def bench_parse_exif(paths: list[str], _: str) -> float:
+    """
+    Read EXIF data and dimensions of every photo
+    :param paths: corpus files
+    :return: duration (seconds)
+    """
+    start = time.perf_counter()
+    for path in paths:
+        parse_exif(path)
+    return time.perf_counter() - start
+
+
+def bench_load_image(paths: list[str], _: str) -> float:
+    """
+    Decode every photo at the largest thumbnail scale
+    :param paths: corpus files
+    :return: duration (seconds)
+    """
+    start = time.perf_counter()
+    for path in paths:
+        load_image(path, None, max(settings.THUMBNAIL_RESOLUTIONS)).load()
+    return time.perf_counter() - start
+
+
+def bench_make_thumbnails(paths: list[str], work_dir: str) -> float:
+    """
+    Render and save all thumbnails of the (already decoded) photos
+    :param paths: corpus files
+    :param work_dir: folder for the thumbnails
+    :return: duration (seconds)
+    """
+    images = [load_image(path, None, max(settings.THUMBNAIL_RESOLUTIONS)) for path in paths]
+    for image in images:
+        image.load()
+    start = time.perf_counter()
+    for i, image in enumerate(images):
+        make_thumbnails(image, f"{i:040x}", work_dir, overwrite=True)
+    return time.perf_counter() - start
+
+
+async def prepare_database(hashes: list[str]) -> None:
+    """
+    Remove photos left by previous runs and create the benchmark user
+    :param hashes: corpus photo hashes
+    """
+    database = await connect_database()
+    try:
+        await database.create_structure()
+        await database.execute("DELETE FROM photo WHERE ihash = any($1::text[])", hashes)
+        if not await database.get_user_by_key(BENCH_USER, "local"):
+            password = security.make_pw_hash(BENCH_PASSWORD)
+            await database.add_user(BENCH_USER, "local", "Benchmark", "benchmark@localhost", BENCH_USER, password)
+    finally:
+        await database.disconnect()
+
+
+async def cleanup_database(hashes: list[str]) -> None:
+    """
+    Remove the uploaded photos and the benchmark user
+    :param hashes: corpus photo hashes
+    """
+    database = await connect_database()
+    try:
+        await database.execute("DELETE FROM photo WHERE ihash = any($1::text[])", hashes)
+        await database.execute("DELETE FROM users WHERE key = $1 AND source = 'local'", BENCH_USER)
+    finally:
+        await database.disconnect()
+
+
+async def connect_database() -> Database:
+    """
+    Connect to the database configured in settings
+    :return: connected database instance
+    """
+    database = Database(
+        settings.POSTGRES_USER,
+        settings.POSTGRES_PASSWORD,
+        settings.POSTGRES_HOST,
+        settings.POSTGRES_PORT,
+        settings.POSTGRES_DB,
+    )
+    await database.connect()
+    return database
+
+
+async def upload_photos(paths: list[str]) -> dict:
+    """
+    Upload photos one by one through the web application, then wait for the background thumbnails
+    :param paths: photos to upload
+    :return: upload timings (seconds)
+    """
+    from main import make_app  # pylint: disable=import-outside-toplevel
+
+    hashes = []
+    for path in paths:
+        with open(path, "rb") as file_handle:
+            hashes.append(hashlib.sha1(file_handle.read()).hexdigest())
+    await prepare_database(hashes)
+    app = make_app()
+    try:
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post("/login", data={"username": BENCH_USER, "password": BENCH_PASSWORD})
+            assert response.status == 200, "cannot log in"
+            start = time.perf_counter()
+            for path in paths:
+                with open(path, "rb") as file_handle:
+                    form = FormData()
+                    form.add_field("photo", file_handle, filename=os.path.basename(path))
+                    response = await client.post("/upload", data=form, headers={"Authentication": settings.SECRET})
+                    assert response.status == 200, await response.text()
+            responses = time.perf_counter() - start
+            await asyncio.gather(*list(app.thumbnails.inflight.values()), return_exceptions=True)
+            total = time.perf_counter() - start
+    finally:
+        app.executor.shutdown()
+        await cleanup_database(hashes)
+    return {"responses_seconds": responses, "seconds": total}
+
+
+def bench_upload(paths: list[str], _: str) -> dict:
+    """
+    Upload photos through the web application (see upload_photos)
+    :param paths: corpus files
+    :return: upload timings (seconds)
+    """
+    return asyncio.run(upload_photos(paths))
+
+
+BENCHMARKS = {
+    "parse_exif": bench_parse_exif,
+    "load_image": bench_load_image,
+    "make_thumbnails": bench_make_thumbnails,
+    "upload": bench_upload,
+}
+
+
+def run_stage(name: str, paths: list[str], work_dir: str) -> dict:
+    """
+    Run one benchmark stage (meant to run in a fresh process)
+    :param name: stage name
+    :param paths: corpus files
+    :param work_dir: folder for stage output
+    :return: stage results
+    """
+    timings = BENCHMARKS[name](paths, work_dir)
+    result = timings if isinstance(timings, dict) else {"seconds": timings}
+    result.update({"photos": len(paths), "photos_per_s": len(paths) / result["seconds"]})
+    result.update(peak_rss())
+    return result
+
+
+def compare(results: dict, baseline: dict) -> None:
+    """
+    Print throughput change against a previous run
+    :param results: current results
+    :param baseline: previous results
+    """
+    for name, stage in results["stages"].items():
+        previous = baseline.get("stages", {}).get(name)
+        if not previous or "photos_per_s" not in stage or "photos_per_s" not in previous:
+            continue
+        change = (stage["photos_per_s"] / previous["photos_per_s"] - 1) * 100
+        print(
+            f"{name:>16}: {change:+6.1f}% photos/s, peak RSS {previous['peak_rss_mb']:.0f} -> "
+            f"{stage['peak_rss_mb']:.0f} MB"
+        )
+
+
+def main() -> None:
+    """
+    Generate the corpus, run all stages and save the results
+    """
+    parser = argparse.ArgumentParser(description="End-to-end ingest benchmark")
+    parser.add_argument("--count", type=int, default=24, help="number of corpus photos")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="stages to run")
+    parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), "photomap_corpus"))
+    parser.add_argument("--output", help="results file, defaults to benchmarks/results/ingest-<time>.json")
+    parser.add_argument("--baseline", help="previous results file to compare with")
+    parser.add_argument(
+        "--database",
+        action="store_true",
+        help="run the upload stage against the database configured in settings (adds and removes a benchmark user)",
+    )
+    args = parser.parse_args()
+    # read by settings in the stage processes, which are spawned and import it again
+    os.environ.setdefault("MEDIA_PATH", os.path.join(tempfile.gettempdir(), "photomap_bench_media"))
+    paths = make_corpus(args.corpus, args.count, SIZES)
+    results: dict = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "cpu_count": os.cpu_count(),
+        "corpus": {"count": len(paths), "bytes": sum(os.path.getsize(path) for path in paths)},
+        "stages": {},
+    }
+    context = multiprocessing.get_context("spawn")
+    for name in args.stages:
+        if name == "upload" and not args.database:
+            print(f"{name:>16}: skipped, needs --database")
+            continue
+        work_dir = tempfile.mkdtemp(prefix=f"photomap_{name}_")
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results["stages"][name] = executor.submit(run_stage, name, paths, work_dir).result()
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            results["stages"][name] = {"error": str(exc)}
+            print(f"{name:>16}: failed, {exc}")
+            continue
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        stage = results["stages"][name]
+        print(f"{name:>16}: {stage['photos_per_s']:7.2f} photos/s, peak RSS {stage['peak_rss_mb']:.0f} MB")
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results", f"ingest-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"results saved to {output}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            compare(results, json.load(baseline_file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+
+Compare the legacy thumbnail path (full decode, copy + LANCZOS for every size) with the draft / cascade path.
+Run with: PYTHONPATH=src/photomap python benchmarks/bench_thumbnails.py [count]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from corpus import make_corpus
+from PIL import Image as PilImage
+
+import settings
+from photo import load_image, make_thumbnails
+
+
+def legacy_thumbnails(file_path: str, output_dir: str) -> None:
+    """
+    Previous implementation: decode full image, then copy + LANCZOS thumbnail for each resolution
+    :param file_path: source image
+    :param output_dir: folder to write thumbnails to
+    """
+    image = PilImage.open(file_path)
+    image.load()
+    for resolution in settings.THUMBNAIL_RESOLUTIONS:
+        temp = image.copy()
+        temp.thumbnail((resolution, resolution), PilImage.LANCZOS)
+        temp.save(os.path.join(output_dir, f"legacy_{resolution}"), "JPEG")
+
+
+def cascade_thumbnails(file_path: str, output_dir: str) -> None:
+    """
+    Current implementation: JPEG draft decoding close to the largest size, then successive downscaling (JPEG only,
+    like the legacy path, the AVIF / WebP variants are extra work)
+    :param file_path: source image
+    :param output_dir: folder to write thumbnails to
+    """
+    image = load_image(file_path, 1, max(settings.THUMBNAIL_RESOLUTIONS))
+    make_thumbnails(image, "0" * 40, output_dir, overwrite=True, formats=["jpeg"])
+
+
+def main() -> None:
+    """
+    Run both implementations over the synthetic corpus
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    corpus_dir = os.path.join(tempfile.gettempdir(), "photomap_corpus")
+    paths = make_corpus(corpus_dir, count)
+    with tempfile.TemporaryDirectory() as output_dir:
+        for name, function in (("legacy", legacy_thumbnails), ("cascade", cascade_thumbnails)):
+            start = time.perf_counter()
+            for path in paths:
+                function(path, output_dir)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>8}: {elapsed / len(paths) * 1000:8.1f} ms/photo, {len(paths) / elapsed:6.2f} photos/s")
+
+
+if __name__ == "__main__":
+    main()
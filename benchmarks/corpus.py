@@ -0,0 +1,92 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+
+Deterministic synthetic JPEG corpus for benchmarks
+"""
+
+import datetime
+import os
+
+import piexif
+from PIL import Image as PilImage
+
+SIZES = [(4000, 3000), (6000, 4000), (3000, 4000), (1920, 1080)]
+ORIENTATIONS = [1, 6, 3, 8, 1]
+CAMERAS = [
+    (b"Canon", b"Canon EOS 80D"),
+    (b"NIKON CORPORATION", b"NIKON D750"),
+    (b"Apple", b"iPhone 12"),
+    (b"SONY", b"ILCE-7M3"),
+    None,  # no camera details
+]
+
+
+def make_image(width: int, height: int, seed: int) -> PilImage.Image:
+    """
+    Generate a deterministic image with some detail (so JPEG encoding / decoding cost is realistic)
+    :param width: image width
+    :param height: image height
+    :param seed: variation seed
+    :return: RGB image
+    """
+    extent = (-2.0 + seed * 0.01, -1.2, 0.8, 1.2 + seed * 0.01)
+    red = PilImage.effect_mandelbrot((width, height), extent, 64)
+    green = PilImage.linear_gradient("L").resize((width, height))
+    blue = PilImage.radial_gradient("L").resize((width, height)).rotate(seed * 7)
+    return PilImage.merge("RGB", (red, green, blue))
+
+
+def make_exif(index: int, width: int, height: int) -> bytes:
+    """
+    Generate deterministic EXIF data: varying camera, orientation, timestamp, GPS for every other photo and
+    pixel dimensions for two photos out of three (the others need the header fallback)
+    :param index: photo index
+    :param width: image width
+    :param height: image height
+    :return: EXIF bytes
+    """
+    moment = datetime.datetime(2015, 1, 1) + datetime.timedelta(days=index * 3, minutes=index * 7)
+    zeroth = {
+        piexif.ImageIFD.Orientation: ORIENTATIONS[index % len(ORIENTATIONS)],
+        piexif.ImageIFD.DateTime: moment.strftime("%Y:%m:%d %H:%M:%S").encode(),
+    }
+    camera = CAMERAS[index % len(CAMERAS)]
+    if camera:
+        zeroth[piexif.ImageIFD.Make], zeroth[piexif.ImageIFD.Model] = camera
+    exif = {}
+    if index % 3:
+        exif = {piexif.ExifIFD.PixelXDimension: width, piexif.ExifIFD.PixelYDimension: height}
+    gps = {}
+    if index % 2 == 0:
+        lat, lng = 44.0 + (index % 50) * 0.1, 21.0 + (index % 70) * 0.1
+        gps = {
+            piexif.GPSIFD.GPSLatitudeRef: b"N",
+            piexif.GPSIFD.GPSLatitude: ((int(lat), 1), (int(lat % 1 * 60), 1), (0, 1)),
+            piexif.GPSIFD.GPSLongitudeRef: b"E",
+            piexif.GPSIFD.GPSLongitude: ((int(lng), 1), (int(lng % 1 * 60), 1), (0, 1)),
+            piexif.GPSIFD.GPSAltitudeRef: 0,
+            piexif.GPSIFD.GPSAltitude: (100 + index, 1),
+        }
+    return piexif.dump({"0th": zeroth, "Exif": exif, "GPS": gps})
+
+
+def make_corpus(directory: str, count: int, sizes: list[tuple[int, int]] | None = None) -> list[str]:
+    """
+    Write count synthetic JPEG files with EXIF data to directory (existing files are reused)
+    :param directory: output folder
+    :param count: number of files
+    :param sizes: image sizes to cycle through
+    :return: list of file paths
+    """
+    sizes = sizes or SIZES
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        width, height = sizes[i % len(sizes)]
+        path = os.path.join(directory, f"photo_{i:04d}_{width}x{height}.jpg")
+        if not os.path.isfile(path):
+            make_image(width, height, i).save(path, "JPEG", quality=90, exif=make_exif(i, width, height))
+        paths.append(path)
+    return paths
@@ -0,0 +1,186 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import asyncio
+import logging
+import math
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """
+    Raised when the admission queue is full
+    """
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"server busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Reservation:
+    """
+    Queue room reserved by AdmissionController.admit for the tasks of one request, unused room is returned when the
+    request is done (use as a context manager)
+    """
+
+    def __init__(self, admission: "AdmissionController", count: int) -> None:
+        """
+        :param admission: admission controller the room was reserved in
+        :param count: number of reserved tasks
+        """
+        self.admission = admission
+        self.count = count
+
+    def __enter__(self) -> "Reservation":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def extend(self, count: int = 1) -> None:
+        """
+        Reserve room for more tasks (e.g. for every further file of a batch upload)
+        :param count: number of additional tasks
+        :raise Overloaded: if the queue is full
+        """
+        self.admission.reserve(count)
+        self.count += count
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        """
+        Run function in the executor using one of the reserved tasks (see AdmissionController.run)
+        :param func: function to run (must be picklable for process pools)
+        :param args: function arguments
+        :return: function result
+        """
+        if self.count <= 0:
+            return await self.admission.run(func, *args)
+        self.count -= 1
+        self.admission.reserved -= 1
+        return await self.admission.execute(func, *args)
+
+    def close(self) -> None:
+        """
+        Return the room of the tasks that were not run
+        """
+        self.admission.reserved -= self.count
+        self.count = 0
+
+
+class AdmissionController:
+    """
+    Bound the work submitted to the process pool: at most `workers` tasks run at once (so nothing piles up inside the
+    executor) and at most `max_queue` tasks wait for a worker or are reserved by requests still receiving their data.
+    New requests (and tasks) are rejected while the queue is full.
+    """
+
+    def __init__(self, executor: Executor | None, workers: int, max_queue: int) -> None:
+        """
+        :param executor: executor to run tasks in (None for the default loop executor)
+        :param workers: number of executor workers
+        :param max_queue: maximum number of tasks waiting for a worker (or reserved)
+        """
+        self.executor = executor
+        self.workers = workers
+        self.max_queue = max_queue
+        self.slots = asyncio.Semaphore(workers)
+        self.running = 0
+        self.waiting = 0
+        self.reserved = 0  # tasks admitted but not submitted yet
+        self.rejected = 0
+        self.completed = 0
+        self.wait_total = 0.0  # seconds spent waiting for a worker, all completed tasks
+        self.wait_max = 0.0
+        self.task_time = 1.0  # moving average of task duration (seconds)
+
+    def retry_after(self) -> int:
+        """
+        Estimate how long it takes for the current queue to drain
+        :return: seconds
+        """
+        return max(1, math.ceil(self.task_time * (self.waiting + self.reserved + self.running) / self.workers))
+
+    def reserve(self, count: int = 1) -> None:
+        """
+        Take room in the queue for new tasks
+        :param count: number of tasks
+        :raise Overloaded: if the queue is full
+        """
+        if self.waiting + self.reserved + count > self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.retry_after())
+        self.reserved += count
+
+    def admit(self, count: int = 1) -> Reservation:
+        """
+        Reserve room in the queue for the tasks of a request (call before accepting the request), so that requests
+        still receiving their data cannot overfill the queue once they submit their tasks
+        :param count: number of tasks
+        :return: reservation to run the tasks with
+        :raise Overloaded: if the queue is full
+        """
+        self.reserve(count)
+        return Reservation(self, count)
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        """
+        Run function in the executor once a worker is free, for work not reserved with admit
+        :param func: function to run (must be picklable for process pools)
+        :param args: function arguments
+        :return: function result
+        :raise Overloaded: if the queue is full
+        """
+        with self.admit() as reservation:
+            return await reservation.run(func, *args)
+
+    async def execute(self, func: Callable, *args: Any) -> Any:
+        """
+        Run function in the executor once a worker is free (queue room must have been checked, see run)
+        :param func: function to run (must be picklable for process pools)
+        :param args: function arguments
+        :return: function result
+        """
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        wait = time.perf_counter() - start
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.running += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.task_time = 0.9 * self.task_time + 0.1 * (time.perf_counter() - start)
+            self.slots.release()
+
+    def stats(self) -> dict:
+        """
+        Report queue state, to tune client concurrency against the real capacity
+        :return: queue statistics
+        """
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "waiting": self.waiting,
+            "reserved": self.reserved,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_avg": self.wait_total / self.completed if self.completed else 0.0,
+            "wait_max": self.wait_max,
+            "task_time": self.task_time,
+        }
@@ -4,6 +4,12 @@ Created on Nov 25, 2015
 @author: ionut
 """
 
+import asyncio
+import logging
+import zlib
+from collections import Counter
+from typing import Any, Awaitable, Callable
+
 from redis import Redis  # type: ignore
 
 try:
@@ -11,35 +17,198 @@ try:
 except ImportError:
     import pickle
 
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+SERIALIZERS: dict[str, tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    "pickle": (pickle.dumps, pickle.loads),
+}
+if orjson:
+    SERIALIZERS["orjson"] = (orjson.dumps, orjson.loads)
+if msgpack:
+    SERIALIZERS["msgpack"] = (msgpack.packb, msgpack.unpackb)
+
+RAW, COMPRESSED = b"r", b"z"  # one byte header for stored values
+
+
+class Cache:
+    """
+    Redis cache with namespaced and versioned keys, fast (pluggable) serialization, optional compression,
+    per-key TTLs and single-flight recomputation of missing values
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        red: Redis,
+        prefix: str = "photomap",
+        version: int = 1,
+        serializer: str = "pickle",
+        compress_min_size: int | None = None,
+        ttl: int | None = None,
+    ) -> None:
+        """
+        :param red: redis instance
+        :param prefix: key prefix (namespace)
+        :param version: key version, bump it to ignore all previously cached values
+        :param serializer: serializer name (pickle, orjson or msgpack)
+        :param compress_min_size: compress serialized values larger than this (bytes), None to disable
+        :param ttl: default time to live (seconds), None for no expiry
+        """
+        if serializer not in SERIALIZERS:
+            logger.warning("serializer %s not available, using pickle", serializer)
+            serializer = "pickle"
+        self.red = red
+        self.prefix = f"{prefix}:{version}:"
+        self.serializer = serializer
+        self.dumps, self.loads = SERIALIZERS[serializer]
+        self.compress_min_size = compress_min_size
+        self.ttl = ttl
+        self.inflight: dict[str, asyncio.Future] = {}
+        self.lookups: Counter[tuple[str, str]] = Counter()  # (key family, hit / miss) counts
+
+    def make_key(self, key: str) -> str:
+        """
+        Add namespace and version to key
+        :param key: key name
+        :return: full Redis key
+        """
+        return self.prefix + key
+
+    def encode(self, obj: Any) -> bytes:
+        """
+        Serialize (and compress if large enough) object
+        :param obj: object to serialize
+        :return: value to be stored in Redis
+        """
+        value = self.dumps(obj)
+        if self.compress_min_size is not None and len(value) >= self.compress_min_size:
+            return COMPRESSED + zlib.compress(value, 1)
+        return RAW + value
+
+    def decode(self, value: bytes) -> Any:
+        """
+        Deserialize value stored in Redis
+        :param value: value from Redis
+        :return: object
+        """
+        if value[:1] == COMPRESSED:
+            return self.loads(zlib.decompress(value[1:]))
+        return self.loads(value[1:])
+
+    async def get(self, key: str) -> Any | None:
+        """
+        Retrieve cache value for specified key
+        :param key: key to retrieve the data for
+        :return: retrieved data or None
+        """
+        value = await self.red.get(self.make_key(key))
+        family = key.split(":", 1)[0]
+        if value:
+            self.lookups[(family, "hit")] += 1
+            return self.decode(value)
+        self.lookups[(family, "miss")] += 1
+        return None
+
+    async def set(self, key: str, obj: Any, ttl: int | None = None) -> None:
+        """
+        Set value in Redis cache
+        :param key: key to set the value for
+        :param obj: value to save in cache
+        :param ttl: time to live (seconds), defaults to the cache TTL
+        """
+        await self.red.set(self.make_key(key), self.encode(obj), ex=ttl or self.ttl)
+
+    async def delete(self, *keys: str) -> None:
+        """
+        Remove objects from Redis cache
+        :param keys: keys to remove objects for
+        """
+        await self.red.delete(*[self.make_key(key) for key in keys])
+
+    async def generation(self, name: str) -> int:
+        """
+        Retrieve current generation counter (keys built with it are implicitly invalidated when it is bumped)
+        :param name: counter name
+        :return: generation number
+        """
+        value = await self.red.get(self.make_key(f"generation:{name}"))
+        return int(value) if value else 0
+
+    async def bump(self, name: str) -> int:
+        """
+        Increment generation counter, stale entries are no longer read and expire with their TTL
+        :param name: counter name
+        :return: new generation number
+        """
+        return await self.red.incr(self.make_key(f"generation:{name}"))
+
+    async def get_or_set(self, key: str, factory: Callable[[], Awaitable[Any]], ttl: int | None = None) -> Any:
+        """
+        Retrieve cache value, computing and storing it on a miss. Concurrent misses for the same key share a single
+        factory call (running in its own task, so a cancelled request does not cancel it for the others).
+        :param key: key to retrieve the data for
+        :param factory: coroutine function computing the value
+        :param ttl: time to live (seconds), defaults to the cache TTL
+        :return: cached or computed value
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(key, factory, ttl))
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _compute(self, key: str, factory: Callable[[], Awaitable[Any]], ttl: int | None) -> Any:
+        value = await factory()
+        await self.set(key, value, ttl)
+        return value
+
 
-async def set_value(red: Redis, key: str, obj: dict) -> None:
+async def set_value(red: Redis | Cache, key: str, obj: dict) -> None:
     """
     Set value in Redis cache
-    :param red: redis instance
+    :param red: redis (or Cache) instance
     :param key: key to set the value for
     :param obj: value to save in cache
     """
+    if isinstance(red, Cache):
+        await red.set(key, obj)
+        return
     value = pickle.dumps(obj)
     await red.set(key, value)
 
 
-async def get_value(red: Redis, key: str) -> dict | None:
+async def get_value(red: Redis | Cache, key: str) -> dict | None:
     """
     Retrieve cache value for specified key
-    :param red: redis instance
+    :param red: redis (or Cache) instance
     :param key: key to retrieve the data for
     :return: retrieved data or None
     """
+    if isinstance(red, Cache):
+        return await red.get(key)
     value = await red.get(key)
     if value:
         return pickle.loads(value)
     return None
 
 
-async def del_value(red: Redis, key: str) -> None:
+async def del_value(red: Redis | Cache, key: str) -> None:
     """
     Remove object from Redis cache
-    :param red: redis instance
+    :param red: redis (or Cache) instance
     :param key: key to remove object for
     """
-    await red.delete(key)
+    await red.delete(key)  # same signature for Redis and Cache
@@ -7,6 +7,9 @@ Created on Nov 1, 2015
 import datetime
 import json
 import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator
 
 import asyncpg
 from pydantic import Field
@@ -14,6 +17,8 @@ from pydantic.dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
 
+EXPLAINABLE = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
 
 @dataclass
 class Album:
@@ -73,13 +78,85 @@ class Tag:
     name: str = Field(title="Tag text", max_length=64)
 
 
+def redact(value: Any) -> str:
+    """
+    Describe query parameter without revealing its value (for logs)
+    :param value: query parameter
+    :return: type name and length for sized values
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, (str, bytes, list, tuple)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+class QueryStats:
+    """
+    Execution statistics for one statement, percentiles are computed over the most recent executions
+    """
+
+    def __init__(self, method: str, query: str, window: int = 1000) -> None:
+        """
+        :param method: Database method running the statement
+        :param query: SQL statement
+        :param window: number of recent durations to keep for percentiles
+        """
+        self.method = method
+        self.query = query
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.durations: deque[float] = deque(maxlen=window)
+        self.slowest_args: tuple = ()  # kept in memory only, to EXPLAIN the statement
+
+    def add(self, duration: float, args: tuple) -> None:
+        """
+        Record statement execution
+        :param duration: execution time (seconds)
+        :param args: statement parameters
+        """
+        self.count += 1
+        self.total += duration
+        self.durations.append(duration)
+        if duration >= self.max:
+            self.max = duration
+            self.slowest_args = args
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Compute duration percentile over the recent executions
+        :param fraction: percentile as a fraction (0.5 for p50)
+        :return: duration (seconds)
+        """
+        if not self.durations:
+            return 0.0
+        durations = sorted(self.durations)
+        return durations[min(round(fraction * (len(durations) - 1)), len(durations) - 1)]
+
+    def to_dict(self) -> dict:
+        """
+        Summarize statistics (durations in milliseconds)
+        :return: statistics
+        """
+        return {
+            "method": self.method,
+            "query": " ".join(self.query.split()),
+            "count": self.count,
+            "mean": 1000 * self.total / self.count if self.count else 0.0,
+            "p50": 1000 * self.percentile(0.5),
+            "p95": 1000 * self.percentile(0.95),
+            "max": 1000 * self.max,
+        }
+
+
 class Database:
     """
     Database related functions for PG-based SQL data store
     """
 
     def __init__(  # pylint: disable=too-many-arguments
-        self, username: str, password: str, host: str, port: int, db_name: str
+        self, username: str, password: str, host: str, port: int, db_name: str, slow_query_threshold: float = 0.2
     ) -> None:
         self.username = username
         self.password = password
@@ -87,6 +164,8 @@ class Database:
         self.port = port
         self.db_name = db_name
         self.dsn = f"postgresql://{self.username}:{self.password}@{self.host}:{self.port}/{self.db_name}"
+        self.slow_query_threshold = slow_query_threshold  # seconds
+        self.query_stats: dict[tuple[str, str], QueryStats] = {}
         # self.pool
 
     async def connect(self) -> None:
@@ -110,23 +189,124 @@ class Database:
         await self.pool.close()
         logger.info("successfully disconnected from database")
 
+    async def run(self, kind: str, query: str, args: tuple, conn: asyncpg.Connection | None, method: str) -> Any:
+        """
+        Central query execution: run statement on the given (or a pooled) connection, timing it per calling method
+        :param kind: connection method (fetch, fetchrow, fetchval or execute)
+        :param query: SQL statement
+        :param args: statement parameters
+        :param conn: connection to use, None to acquire one from the pool
+        :param method: calling Database method (statistics and slow query log tag)
+        :return: statement result
+        """
+        if conn is None:
+            async with self.pool.acquire() as pooled:
+                return await self.run(kind, query, args, pooled, method)
+        start = time.perf_counter()  # statement time only, pool waits are not included
+        try:
+            return await getattr(conn, kind)(query, *args)
+        finally:
+            duration = time.perf_counter() - start
+            key = (method, query)
+            if key not in self.query_stats:
+                self.query_stats[key] = QueryStats(method, query)
+            self.query_stats[key].add(duration, args)
+            if duration >= self.slow_query_threshold:
+                logger.warning(
+                    "slow query in %s (%.1f ms): %s, params: %s",
+                    method,
+                    1000 * duration,
+                    " ".join(query.split()),
+                    ", ".join(redact(arg) for arg in args) or "-",
+                )
+
+    async def fetch(
+        self, query: str, *args: Any, conn: asyncpg.Connection | None = None, method: str = "direct"
+    ) -> list:
+        """
+        Run statement and return all rows (see run)
+        :param query: SQL statement
+        :param args: statement parameters
+        :param conn: connection to use, None to acquire one from the pool
+        :param method: calling Database method (statistics and slow query log tag)
+        :return: list of records
+        """
+        return await self.run("fetch", query, args, conn, method)
+
+    async def fetchrow(
+        self, query: str, *args: Any, conn: asyncpg.Connection | None = None, method: str = "direct"
+    ) -> asyncpg.Record | None:
+        """
+        Run statement and return the first row (see run)
+        :param query: SQL statement
+        :param args: statement parameters
+        :param conn: connection to use, None to acquire one from the pool
+        :param method: calling Database method (statistics and slow query log tag)
+        :return: record or None
+        """
+        return await self.run("fetchrow", query, args, conn, method)
+
+    async def fetchval(
+        self, query: str, *args: Any, conn: asyncpg.Connection | None = None, method: str = "direct"
+    ) -> Any:
+        """
+        Run statement and return the first column of the first row (see run)
+        :param query: SQL statement
+        :param args: statement parameters
+        :param conn: connection to use, None to acquire one from the pool
+        :param method: calling Database method (statistics and slow query log tag)
+        :return: value or None
+        """
+        return await self.run("fetchval", query, args, conn, method)
+
+    async def execute(
+        self, query: str, *args: Any, conn: asyncpg.Connection | None = None, method: str = "direct"
+    ) -> str:
+        """
+        Run statement without returning rows (see run)
+        :param query: SQL statement
+        :param args: statement parameters
+        :param conn: connection to use, None to acquire one from the pool
+        :param method: calling Database method (statistics and slow query log tag)
+        :return: status of the last command
+        """
+        return await self.run("execute", query, args, conn, method)
+
+    async def get_slow_queries(self, limit: int = 10, explain: bool = True) -> list[dict]:
+        """
+        Report statements with the highest p95 duration, optionally with their plans (EXPLAIN, not executed)
+        using the parameters of their slowest execution
+        :param limit: number of statements to report
+        :param explain: flag to include query plans
+        :return: statement statistics, slowest first
+        """
+        ranked = sorted(self.query_stats.values(), key=lambda stats: stats.percentile(0.95), reverse=True)
+        report = []
+        async with self.pool.acquire() as conn:
+            for stats in ranked[:limit]:
+                item = stats.to_dict()
+                if explain and stats.query.lstrip().split(None, 1)[0].upper() in EXPLAINABLE:
+                    try:
+                        plan = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {stats.query}", *stats.slowest_args)
+                        item["plan"] = json.loads(plan)
+                    except asyncpg.PostgresError as exc:
+                        item["plan"] = f"cannot explain statement: {exc}"
+                report.append(item)
+        return report
+
     async def save_album(self, album: Album) -> int:
         """
         Upsert album data to database
         :param album: album object to add or update
         :return: album ID
         """
-        conn = await self.pool.acquire()
         data = [album.name, album.description, album.start_moment, album.stop_moment]
         if album.album_id:
             data.append(album.album_id)
             query = "UPDATE album SET name=$1, description=$2, start_moment=$3, stop_moment=$4 WHERE id=$5 RETURNING id"
         else:
             query = "INSERT INTO album(name,description,start_moment,stop_moment) VALUES($1, $2, $3, $4) RETURNING id"
-        try:
-            album_id = await conn.fetchrow(query, *data)
-        finally:
-            await self.pool.release(conn)
+        album_id = await self.fetchrow(query, *data, method="save_album")
         return album_id
 
     async def delete_album(self, album_id: int) -> None:
@@ -134,12 +314,8 @@ class Database:
         Delete album object from database
         :param album_id: album ID to delete
         """
-        conn = await self.pool.acquire()
         query = "DELETE FROM album WHERE id=$1"
-        try:
-            await conn.fetchrow(query, album_id)
-        finally:
-            await self.pool.release(conn)
+        await self.execute(query, album_id, method="delete_album")
 
     async def save_camera(self, camera: Camera) -> int:
         """
@@ -147,17 +323,13 @@ class Database:
         :param camera: camera object to add or update
         :return: camera ID
         """
-        conn = await self.pool.acquire()
         data: list[str | int] = [camera.make, camera.model]
         if camera.camera_id:
             data.append(camera.camera_id)
             query = "UPDATE camera SET make=$1, model=$2 WHERE id=$3 RETURNING id"
         else:
             query = "INSERT INTO camera(make, model) VALUES($1, $2) RETURNING id"
-        try:
-            camera_id = await conn.fetchrow(query, *data)
-        finally:
-            await self.pool.release(conn)
+        camera_id = await self.fetchrow(query, *data, method="save_camera")
         return camera_id
 
     async def get_cameras(self) -> list[Camera]:
@@ -165,12 +337,8 @@ class Database:
         Retrieve all cameras from database
         :return: list of cameras
         """
-        conn = await self.pool.acquire()
         query = "SELECT id, make, model FROM camera"
-        try:
-            cameras = await conn.fetch(query)
-        finally:
-            await self.pool.release(conn)
+        cameras = await self.fetch(query, method="get_cameras")
         return cameras
 
     async def delete_camera(self, camera_id: int) -> None:
@@ -178,12 +346,8 @@ class Database:
         Delete camera object from database
         :param camera_id: camera ID to delete
         """
-        conn = await self.pool.acquire()
         query = "DELETE FROM camera WHERE id=$1"
-        try:
-            await conn.fetchrow(query, camera_id)
-        finally:
-            await self.pool.release(conn)
+        await self.execute(query, camera_id, method="delete_camera")
 
     async def save_photo(self, photo: Photo) -> int:
         """
@@ -191,7 +355,6 @@ class Database:
         :param photo: photo object to add or update
         :return: photo ID
         """
-        conn = await self.pool.acquire()
         data = [
             photo.ihash,
             photo.description,
@@ -217,14 +380,49 @@ class Database:
             query = """INSERT INTO photo(ihash, description, album_id, moment, filename, width, height, size,
             camera_id, lat, lng, altitude, gps_ref, access)
             VALUES($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14) RETURNING id"""
-        try:
-            photo_id = await conn.fetchrow(query, *data)
-        # except asyncpg.exceptions.PostgresError as exc:
-        #     logger.error("cannot save image: %s", exc)
-        finally:
-            await self.pool.release(conn)
+        photo_id = await self.fetchrow(query, *data, method="save_photo")
         return photo_id
 
+    async def save_photos(self, photos: list[Photo]) -> dict[str, int]:
+        """
+        Insert several photos using a single statement, skipping photos with an already existing i-hash
+        :param photos: new photo objects to add
+        :return: i-hash to photo ID mapping for the inserted photos
+        """
+        if not photos:
+            return {}
+        columns = list(
+            zip(
+                *[
+                    (
+                        photo.ihash,
+                        photo.description,
+                        photo.album,
+                        photo.moment,
+                        photo.filename,
+                        photo.width,
+                        photo.height,
+                        photo.size,
+                        photo.camera,
+                        photo.lat,
+                        photo.lng,
+                        photo.altitude,
+                        photo.gps_ref,
+                        photo.access,
+                    )
+                    for photo in photos
+                ]
+            )
+        )
+        query = """INSERT INTO photo(ihash, description, album_id, moment, filename, width, height, size,
+                camera_id, lat, lng, altitude, gps_ref, access)
+                SELECT * FROM unnest($1::text[], $2::text[], $3::integer[], $4::timestamp[], $5::text[],
+                $6::smallint[], $7::smallint[], $8::integer[], $9::integer[], $10::float8[], $11::float8[],
+                $12::float8[], $13::text[], $14::smallint[])
+                ON CONFLICT (ihash) DO NOTHING RETURNING id, ihash"""
+        rows = await self.fetch(query, *columns, method="save_photos")
+        return {row["ihash"]: row["id"] for row in rows}
+
     async def update_photo_location(self, photo_id: int, ihash: str, lat: float, lng: float) -> int:
         """
         Update location data for existing photo
@@ -232,55 +430,76 @@ class Database:
         :param ihash: photo hash to double-check
         :param lat: latitude to save
         :param lng: longitude to save
-        :return: photo ID
+        :return: photo ID and moment
         """
-        conn = await self.pool.acquire()
-        query = "UPDATE photo set lat=$1, lng=$2 WHERE id=$3 and ihash=$4 RETURNING id"
-        try:
-            photo_id = await conn.fetchrow(query, lat, lng, photo_id, ihash)
-        finally:
-            await self.pool.release(conn)
+        query = """UPDATE photo set lat=$1, lng=$2 WHERE id=$3 and ihash=$4
+                RETURNING id, extract(epoch from moment)::bigint as moment"""
+        photo_id = await self.fetchrow(query, lat, lng, photo_id, ihash, method="update_photo_location")
         return photo_id
 
-    async def delete_photo(self, photo_id: int) -> None:
+    async def update_photo_locations(
+        self, locations: list[tuple[int, str, float, float]], conn: asyncpg.Connection | None = None
+    ) -> list:
+        """
+        Update location data for many photos with a single statement
+        :param locations: (photo ID, photo hash to double-check, lat, lng) tuples
+        :param conn: connection to use (e.g. inside a transaction), None to acquire one from the pool
+        :return: updated photos (id, ihash, lat, lng and moment)
+        """
+        query = """UPDATE photo SET lat=location.lat, lng=location.lng
+                FROM unnest($1::integer[], $2::text[], $3::double precision[], $4::double precision[])
+                AS location(id, ihash, lat, lng)
+                WHERE photo.id=location.id AND photo.ihash=location.ihash
+                RETURNING photo.id, photo.ihash, photo.lat, photo.lng,
+                    extract(epoch from photo.moment)::bigint as moment"""
+        columns = list(zip(*locations)) or [(), (), (), ()]
+        photos = await self.fetch(
+            query, *[list(column) for column in columns], conn=conn, method="update_photo_locations"
+        )
+        return photos
+
+    async def delete_photo(self, photo_id: int) -> str | None:
         """
-        Delete photo from database
+        Delete photo (and its tag links) from database
         :param photo_id: ID of the photo to remove
+        :return: i-hash of the removed photo (to update in-memory indexes), None if there is no such photo
         """
-        conn = await self.pool.acquire()
-        query = "DELETE FROM photo WHERE id=$1"
-        try:
-            await conn.fetchrow(query, photo_id)
-        finally:
-            await self.pool.release(conn)
+        query = """WITH tags AS (DELETE FROM photo_tags WHERE photo_id=$1)
+                DELETE FROM photo WHERE id=$1 RETURNING ihash"""
+        ihash = await self.fetchval(query, photo_id, method="delete_photo")
+        return ihash
 
     async def get_all_ihash(self) -> list[str]:
         """
         Retrieve all existing i-hashes from the database
         :return: list of i-hashes
         """
-        conn = await self.pool.acquire()
-        try:
-            hashes = await conn.fetch("SELECT photo.ihash FROM photo")
-        finally:
-            await self.pool.release(conn)
+        hashes = await self.fetch("SELECT photo.ihash FROM photo", method="get_all_ihash")
         return hashes
 
+    async def iter_photos(self, batch_size: int = 1000) -> AsyncIterator[asyncpg.Record]:
+        """
+        Iterate over all photos using a server-side cursor (rows are fetched in batches, never loaded all at once)
+        :param batch_size: rows fetched per round trip
+        :return: async iterator of photo records
+        """
+        query = """SELECT id, ihash, filename, moment, width, height, size, lat, lng, altitude
+                FROM photo ORDER BY id"""
+        async with self.pool.acquire() as conn, conn.transaction():
+            async for record in conn.cursor(query, prefetch=batch_size):
+                yield record
+
     async def get_photo(self, photo_id: int) -> Photo:
         """
         Retrieve photo details
         :param photo_id: id of the photo to retrieve
         :return: photo details
         """
-        conn = await self.pool.acquire()
         query = """SELECT photo.id, ihash, extract(epoch from moment)::bigint as moment, filename, size,
                 make, model, width, height, photo.description
                 FROM photo LEFT OUTER JOIN camera on photo.camera_id = camera.id
                 WHERE photo.id=$1"""
-        try:
-            photo = await conn.fetchrow(query, photo_id)
-        finally:
-            await self.pool.release(conn)
+        photo = await self.fetchrow(query, photo_id, method="get_photo")
         return photo
 
     async def get_geotagged_photos(self, start: datetime.date, stop: datetime.date) -> list[Photo]:
@@ -288,30 +507,81 @@ class Database:
         Retrieve all existing photos from the database that have location information
         :return: list of photos
         """
-        conn = await self.pool.acquire()
         query = """SELECT photo.id, ihash, lat, lng, altitude, extract(epoch from moment)::bigint as moment
                 FROM photo LEFT OUTER JOIN camera on photo.camera_id = camera.id
                 WHERE moment > $1 AND moment < $2 AND lat IS NOT NULL AND lng IS NOT NULL"""
-        try:
-            photos = await conn.fetch(query, start, stop)
-        finally:
-            await self.pool.release(conn)
+        photos = await self.fetch(query, start, stop, method="get_geotagged_photos")
         return photos
 
-    async def get_photos_nogps(self, start_moment: datetime.datetime, stop_moment: datetime.datetime) -> list[Photo]:
+    @staticmethod
+    def bbox_query(antimeridian: bool = False) -> str:
         """
-        Retrieve first 30 photos from the database without location information
-        :return: list of photos
+        Build query for photos inside a bounding box, matching the photo_location_idx expression and predicate
+        :param antimeridian: True if the box crosses the antimeridian (split in two boxes)
+        :return: SQL query with $1-$4 for west, south, east, north, $5-$6 for start, stop and $7 for limit
         """
-        conn = await self.pool.acquire()
+        if antimeridian:
+            location = "(point(lng, lat) <@ box(point($1, $2), point(180, $4)) OR "
+            location += "point(lng, lat) <@ box(point(-180, $2), point($3, $4)))"
+        else:
+            location = "point(lng, lat) <@ box(point($1, $2), point($3, $4))"
+        return f"""SELECT photo.id, ihash, lat, lng, altitude, extract(epoch from moment)::bigint as moment
+                FROM photo WHERE {location} AND lat IS NOT NULL AND lng IS NOT NULL
+                AND moment > $5 AND moment < $6 ORDER BY moment LIMIT $7"""
+
+    async def get_photos_in_bbox(
+        self, bbox: tuple[float, float, float, float], start: datetime.datetime, stop: datetime.datetime, limit: int
+    ) -> list[Photo]:
+        """
+        Retrieve geotagged photos inside a bounding box and time range (uses the GiST location index)
+        :param bbox: west, south, east, north (deg)
+        :param start: lower moment limit (exclusive)
+        :param stop: upper moment limit (exclusive)
+        :param limit: maximum number of photos to return
+        :return: list of photos, ordered by moment
+        """
+        west, south, east, north = bbox
+        query = self.bbox_query(antimeridian=west > east)
+        photos = await self.fetch(query, west, south, east, north, start, stop, limit, method="get_photos_in_bbox")
+        return photos
+
+    async def get_photos_nogps(
+        self,
+        start_moment: datetime.datetime,
+        stop_moment: datetime.datetime,
+        after: tuple[datetime.datetime, int] | None = None,
+        limit: int = 30,
+    ) -> list[Photo]:
+        """
+        Retrieve a page of photos without location information, keyset paginated by (moment, id) so every page is
+        an index range scan (see photo_nogps_idx) no matter how far the client has paged
+        :param start_moment: lower moment limit (inclusive)
+        :param stop_moment: upper moment limit (inclusive)
+        :param after: (moment, id) of the last photo on the previous page, None for the first page
+        :param limit: maximum number of photos to return
+        :return: list of photos, ordered by moment and id
+        """
+        after_moment, after_id = after or (start_moment, 0)
         query = """SELECT photo.id, ihash, extract(epoch from moment)::bigint as moment, filename, size,
                 make, model, width, height, photo.description
                 FROM photo LEFT OUTER JOIN camera on photo.camera_id = camera.id
-                WHERE (lat IS NULL OR lng IS NULL) AND moment BETWEEN $1 AND $2 ORDER BY moment ASC LIMIT 25"""
-        try:
-            photos = await conn.fetch(query, start_moment, stop_moment)
-        finally:
-            await self.pool.release(conn)
+                WHERE (lat IS NULL OR lng IS NULL) AND (moment, photo.id) > ($1, $2) AND moment >= $3
+                AND moment <= $4 ORDER BY moment, photo.id LIMIT $5"""
+        photos = await self.fetch(
+            query, after_moment, after_id, start_moment, stop_moment, limit, method="get_photos_nogps"
+        )
+        return photos
+
+    async def get_untagged_photos(self, start_moment: datetime.datetime, stop_moment: datetime.datetime) -> list:
+        """
+        Retrieve all photos without location information taken in a time range (uses photo_nogps_idx)
+        :param start_moment: lower moment limit (inclusive)
+        :param stop_moment: upper moment limit (inclusive)
+        :return: list of (id, ihash, moment) records, moment in epoch seconds
+        """
+        query = """SELECT id, ihash, extract(epoch from moment)::bigint as moment FROM photo
+                WHERE (lat IS NULL OR lng IS NULL) AND moment >= $1 AND moment <= $2 ORDER BY moment, id"""
+        photos = await self.fetch(query, start_moment, stop_moment, method="get_untagged_photos")
         return photos
 
     async def save_tag(self, tag: Tag) -> int:
@@ -320,17 +590,13 @@ class Database:
         :param tag: tag object to add or update
         :return: tag ID
         """
-        conn = await self.pool.acquire()
         data: list[str | int] = [tag.name]
         if tag.tag_id:
             data.append(tag.tag_id)
             query = "UPDATE tag SET name=$1, photo=$2 WHERE id=$3 RETURNING id"
         else:
             query = "INSERT INTO tag(name, photo_id) VALUES($1, $2) RETURNING id"
-        try:
-            tag_id = await conn.fetchrow(query, *data)
-        finally:
-            await self.pool.release(conn)
+        tag_id = await self.fetchrow(query, *data, method="save_tag")
         return tag_id
 
     async def delete_tag(self, tag_id: int) -> None:
@@ -338,27 +604,50 @@ class Database:
         Delete tag from database
         :param tag_id: ID of the tag to remove
         """
-        conn = await self.pool.acquire()
         query = "DELETE FROM tag WHERE id=$1"
-        try:
-            await conn.fetchrow(query, tag_id)
-        finally:
-            await self.pool.release(conn)
+        await self.execute(query, tag_id, method="delete_tag")
 
-    async def get_stats(self) -> list:
+    async def get_stats(self) -> dict:
         """
-        Retrieve photo and camera stats from database
+        Retrieve aggregated photo stats (per camera, per month, size and resolution histograms, location coverage)
         :return: stats
         """
-        conn = await self.pool.acquire()
-        query = """SELECT photo.id,extract(epoch from moment)::bigint as moment,lat,lng,size,make,model,
-                width, height FROM photo LEFT OUTER JOIN camera on photo.camera_id = camera.id"""
-        try:
-            stats = await conn.fetch(query)
-        finally:
-            await self.pool.release(conn)
+        queries = {
+            "cameras": """SELECT make, model, count(*) AS total,
+                count(*) FILTER (WHERE lat IS NOT NULL AND lng IS NOT NULL) AS geotagged,
+                extract(epoch from min(moment))::bigint AS start, extract(epoch from max(moment))::bigint AS stop,
+                sum(size)::bigint AS size
+                FROM photo LEFT OUTER JOIN camera on photo.camera_id = camera.id
+                GROUP BY make, model ORDER BY total DESC""",
+            "months": """SELECT extract(year from moment)::int AS year, extract(month from moment)::int AS month,
+                count(*) AS total FROM photo GROUP BY 1, 2 ORDER BY 1, 2""",
+            "sizes": """SELECT least(size / 1000000, 20) AS megabytes, count(*) AS total
+                FROM photo GROUP BY 1 ORDER BY 1""",
+            "resolutions": """SELECT least(width::integer * height::integer / 1000000, 50) AS megapixels,
+                count(*) AS total FROM photo GROUP BY 1 ORDER BY 1""",
+            "location": """SELECT count(*) FILTER (WHERE lat IS NOT NULL AND lng IS NOT NULL) AS geotagged,
+                count(*) FILTER (WHERE lat IS NULL OR lng IS NULL) AS not_geotagged FROM photo""",
+        }
+        stats = {}
+        async with self.pool.acquire() as conn:
+            for name, query in queries.items():
+                stats[name] = [dict(row) for row in await self.fetch(query, conn=conn, method="get_stats")]
+        stats["location"] = stats["location"][0]
         return stats
 
+    async def get_photo_page(self, after_id: int, limit: int) -> list:
+        """
+        Retrieve photo and camera details, paginated by photo ID
+        :param after_id: return photos with an ID greater than this value
+        :param limit: maximum number of photos to return
+        :return: list of photos
+        """
+        query = """SELECT photo.id,extract(epoch from moment)::bigint as moment,lat,lng,size,make,model,
+                width, height FROM photo LEFT OUTER JOIN camera on photo.camera_id = camera.id
+                WHERE photo.id > $1 ORDER BY photo.id LIMIT $2"""
+        photos = await self.fetch(query, after_id, limit, method="get_photo_page")
+        return photos
+
     async def get_user_by_key(self, key: str, source: str) -> dict | None:
         """
         Return first user matching username
@@ -366,12 +655,8 @@ class Database:
         :param source: source to filter by (local, google)
         :return user
         """
-        conn = await self.pool.acquire()
         query = "SELECT key,name,username,password FROM users WHERE key=$1 AND source=$2"
-        try:
-            user = await conn.fetchrow(query, key, source)
-        finally:
-            await self.pool.release(conn)
+        user = await self.fetchrow(query, key, source, method="get_user_by_key")
         return user
 
     async def add_user(self, key: str, source: str, name: str, email: str, username: str, password: str) -> None:
@@ -384,12 +669,8 @@ class Database:
         :param username: username (email for Google accounts)
         :param password: user password (empty for Google accounts)
         """
-        conn = await self.pool.acquire()
         query = "INSERT INTO users(key,source,name,email,username,password,level) VALUES($1,$2,$3,$4,$5,$6,$7)"
-        try:
-            await conn.fetchrow(query, key, source, name, email, username, password, 1)
-        finally:
-            await self.pool.release(conn)
+        await self.execute(query, key, source, name, email, username, password, 1, method="add_user")
 
     async def create_structure(self) -> None:
         """
@@ -436,6 +717,10 @@ class Database:
             "CREATE INDEX IF NOT EXISTS photo_lat_idx ON photo USING btree(lat)",
             "CREATE INDEX IF NOT EXISTS photo_lng_idx ON photo USING btree(lng)",
             "CREATE INDEX IF NOT EXISTS photo_moment_idx ON photo USING btree(moment)",
+            """CREATE INDEX IF NOT EXISTS photo_location_idx ON photo USING gist(point(lng, lat))
+                WHERE lat IS NOT NULL AND lng IS NOT NULL""",
+            """CREATE INDEX IF NOT EXISTS photo_nogps_idx ON photo USING btree(moment, id)
+                WHERE lat IS NULL OR lng IS NULL""",
             "CREATE INDEX IF NOT EXISTS photo_access_idx ON photo USING btree(access)",
             """CREATE TABLE IF NOT EXISTS tag(
                     id serial NOT NULL,
@@ -461,13 +746,12 @@ class Database:
             )""",
             "CREATE INDEX IF NOT EXISTS user_key_idx ON users USING btree(key);",
         ]
-        conn = await self.pool.acquire()
-        for query in queries:
-            try:
-                await conn.fetch(query)
-            except asyncpg.PostgresError as exc:
-                logger.error("cannot run query: %s", exc)
-        await self.pool.release(conn)
+        async with self.pool.acquire() as conn:
+            for query in queries:
+                try:
+                    await self.execute(query, conn=conn, method="create_structure")
+                except asyncpg.PostgresError as exc:
+                    logger.error("cannot run query: %s", exc)
 
     # @property
     # def gear_level(self) -> int:
@@ -0,0 +1,165 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import bisect
+import datetime
+import logging
+from array import array
+from typing import BinaryIO
+from xml.parsers import expat
+
+logger = logging.getLogger(__name__)
+
+
+def parse_time(value: str) -> float:
+    """
+    Parse GPX (ISO 8601) timestamp, values without timezone are UTC as required by the GPX schema
+    :param value: timestamp text
+    :return: epoch seconds
+    """
+    moment = datetime.datetime.fromisoformat(value.strip())
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.UTC)
+    return moment.timestamp()
+
+
+class Track:
+    """
+    Timestamped track points from one or more GPX files, kept in (compact) parallel arrays sorted by time
+    """
+
+    def __init__(self) -> None:
+        self.times = array("d")
+        self.lats = array("d")
+        self.lngs = array("d")
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def add(self, moment: float, lat: float, lng: float) -> None:
+        """
+        Append track point (call sort when done if points may be out of order)
+        :param moment: epoch seconds (UTC)
+        :param lat: latitude
+        :param lng: longitude
+        """
+        self.times.append(moment)
+        self.lats.append(lat)
+        self.lngs.append(lng)
+
+    def sort(self) -> None:
+        """
+        Order points by time (needed when merging several files or segments)
+        """
+        if all(self.times[i] <= self.times[i + 1] for i in range(len(self.times) - 1)):
+            return
+        order = sorted(range(len(self.times)), key=self.times.__getitem__)
+        self.times = array("d", (self.times[i] for i in order))
+        self.lats = array("d", (self.lats[i] for i in order))
+        self.lngs = array("d", (self.lngs[i] for i in order))
+
+    def locate(self, moment: float, max_gap: float) -> tuple[float, float] | None:
+        """
+        Find position at a given time: binary search for the surrounding points, linearly interpolated when they are
+        at most max_gap apart, otherwise the nearest point if it is within max_gap
+        :param moment: epoch seconds (UTC)
+        :param max_gap: maximum time distance to the track data (seconds)
+        :return: lat, lng or None if the track has no data close enough
+        """
+        position = bisect.bisect_left(self.times, moment)
+        if position < len(self.times) and self.times[position] == moment:
+            return self.lats[position], self.lngs[position]
+        if 0 < position < len(self.times):
+            before, after = self.times[position - 1], self.times[position]
+            if after - before <= max_gap:
+                ratio = (moment - before) / (after - before)
+                lat = self.lats[position - 1] + ratio * (self.lats[position] - self.lats[position - 1])
+                lng = self.lngs[position - 1] + ratio * (self.lngs[position] - self.lngs[position - 1])
+                return lat, lng
+        candidates = [index for index in (position - 1, position) if 0 <= index < len(self.times)]
+        if not candidates:
+            return None
+        nearest = min(candidates, key=lambda index: abs(self.times[index] - moment))
+        if abs(self.times[nearest] - moment) > max_gap:
+            return None
+        return self.lats[nearest], self.lngs[nearest]
+
+
+def parse_gpx(source: str | BinaryIO, track: Track) -> int:
+    """
+    Stream track points (trkpt) from a GPX file into the track using expat callbacks, no element tree is built so
+    memory use does not grow with the file size
+    :param source: file path or binary file object
+    :param track: track to add the points to
+    :return: number of points added (points without time or with invalid values are skipped)
+    """
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    point: dict[str, str] | None = None  # attributes of the current trkpt
+    text: list[str] = []  # text of its time element
+    added = 0
+
+    def start(name: str, attributes: dict[str, str]) -> None:
+        nonlocal point
+        tag = name.rpartition(":")[2]  # no namespace processing, only strip the prefix (if any)
+        if tag == "trkpt":
+            point = attributes
+            text.clear()
+        elif tag == "time" and point is not None:
+            parser.CharacterDataHandler = text.append  # only collect text where needed, saves most callbacks
+
+    def end(name: str) -> None:
+        nonlocal point, added
+        tag = name.rpartition(":")[2]
+        if tag == "time":
+            parser.CharacterDataHandler = None
+        elif tag == "trkpt" and point is not None:
+            try:
+                if text:
+                    track.add(parse_time("".join(text)), float(point["lat"]), float(point["lon"]))
+                    added += 1
+            except (KeyError, ValueError) as exc:
+                logger.debug("skipping invalid track point: %s", exc)
+            point = None
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    if isinstance(source, str):
+        with open(source, "rb") as file_handle:
+            parser.ParseFile(file_handle)
+    else:
+        parser.ParseFile(source)
+    return added
+
+
+def load_tracks(paths: list[str]) -> Track:
+    """
+    Parse GPX files into a single time ordered track (meant to run in the process pool)
+    :param paths: GPX files
+    :return: track
+    """
+    track = Track()
+    for path in paths:
+        logger.info("loaded %d track points from %s", parse_gpx(path, track), path)
+    track.sort()
+    return track
+
+
+def match_photos(track: Track, photos: list, offset: float, max_gap: float) -> list[tuple[int, str, float, float]]:
+    """
+    Locate photos on the track by their timestamps
+    :param track: time ordered track
+    :param photos: (id, ihash, moment) records, moment in epoch seconds of the (naive) camera time
+    :param offset: camera clock offset from UTC (seconds, e.g. 10800 for a camera set to UTC+3)
+    :param max_gap: maximum time distance to the track data (seconds)
+    :return: list of (id, ihash, lat, lng) for the photos taken while the track was recorded
+    """
+    matches = []
+    for photo_id, ihash, moment in photos:
+        location = track.locate(moment - offset, max_gap)
+        if location:
+            matches.append((photo_id, ihash, *location))
+    return matches
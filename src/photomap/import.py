@@ -7,66 +7,186 @@ Created on Sep 11, 2012
 import asyncio
 import logging
 import os
-from typing import Generator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from typing import Generator, Mapping
 
-from aiohttp import ClientSession
+from aiohttp import ClientSession, FormData
 
 import settings
+from manifest import FAILED, UPLOADED, Manifest
+from utils import hash_file
 
 logger = logging.getLogger(__name__)
 BASE_DIR = "/media/data/poze/"
+MANIFEST_PATH = os.getenv("PHOTOMAP_MANIFEST", os.path.expanduser("~/.photomap_import.sqlite"))
+UPLOAD_URL = "http://127.0.0.1:8000/upload/"
+BATCH_SIZE = 16  # photos per upload request
+CHECK_BATCH_SIZE = 1000  # hashes per pre-flight check request
+UPLOAD_WORKERS = int(os.getenv("PHOTOMAP_UPLOAD_WORKERS", "4"))  # concurrent upload requests
+RETRY_DELAY = 5.0  # seconds to wait when the server is busy and does not say for how long
 
 
-def gather_file_list() -> Generator:
+def gather_file_list(base_dir: str = BASE_DIR) -> Generator:
     """
-    Generate list of image files from source folder
+    Generate list of image files from source folder (using scandir, the walk is the only cost for unchanged trees)
+    :param base_dir: folder to walk
+    :return: generator of (path, size, mtime_ns) tuples
     """
-    for dirpath, _, filenames in os.walk(BASE_DIR):
-        for filename in filenames:
-            if not filename.lower().endswith(".jpg") and not filename.lower().endswith(".jpeg"):
-                # logging.info("skipping %s from %s" % (filename, dirpath))
-                continue
-            yield os.path.join(dirpath, filename)
+    directories = [base_dir]
+    while directories:
+        try:
+            with os.scandir(directories.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                        continue
+                    if not entry.name.lower().endswith((".jpg", ".jpeg")):
+                        continue
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, stat.st_mtime_ns
+        except OSError as exc:
+            logger.warning("cannot scan folder: %s", exc)
+
+
+async def hash_files(files: list[tuple[str, int, int]], manifest: Manifest, executor: ProcessPoolExecutor) -> dict:
+    """
+    Hash new or changed files locally and record them in the manifest
+    :param files: list of (path, size, mtime_ns) to hash
+    :param manifest: import manifest
+    :param executor: process pool to hash files in
+    :return: path to i-hash mapping
+    """
+    loop = asyncio.get_running_loop()
+    hashes = await asyncio.gather(
+        *[loop.run_in_executor(executor, hash_file, path) for path, _, _ in files], return_exceptions=True
+    )
+    entries = []
+    for (path, size, mtime_ns), ihash in zip(files, hashes):
+        if isinstance(ihash, Exception):
+            logger.warning("cannot hash file %s: %s", path, ihash)
+            continue
+        entries.append((path, size, mtime_ns, ihash))
+    manifest.add_hashes(entries)
+    return {entry[0]: entry[3] for entry in entries}
 
 
-async def upload_worker(path_queue: asyncio.Queue, session: ClientSession) -> None:
+async def find_missing(hashed: dict[str, str], session: ClientSession, manifest: Manifest) -> list[str]:
+    """
+    Ask the server which of the (hashed) files are not imported yet, files it already has are marked as uploaded
+    :param hashed: path to i-hash mapping
+    :param session: client session to use for the request
+    :param manifest: import manifest
+    :return: files to be uploaded
+    """
+    headers = {"Authentication": settings.SECRET}
+    request = await session.post(
+        url=UPLOAD_URL, params={"op": "check_hashes"}, json={"hashes": list(hashed.values())}, headers=headers
+    )
+    data = await request.json()
+    missing = set(data["missing"])
+    manifest.set_status([path for path, ihash in hashed.items() if ihash not in missing], UPLOADED)
+    return [path for path, ihash in hashed.items() if ihash in missing]
+
+
+def retry_delay(headers: Mapping[str, str]) -> float:
+    """
+    Read the Retry-After header (seconds) of a 429 / 503 response
+    :param headers: response headers
+    :return: seconds to wait before retrying
     """
-    Pull file paths from the queue and upload them using the API
-    :param path_queue: queue to pull file paths from
+    try:
+        return max(float(headers.get("Retry-After", RETRY_DELAY)), 0.0)
+    except ValueError:  # HTTP date, not sent by photomap
+        return RETRY_DELAY
+
+
+async def upload_batch(batch: list[str], session: ClientSession) -> dict:
+    """
+    Upload photos using the batch API, waiting and retrying while the server is busy (429 / 503 with Retry-After)
+    :param batch: file paths to upload
+    :param session: client session to use for uploading
+    :return: server response
+    """
+    headers = {"Authentication": settings.SECRET}
+    while True:
+        with ExitStack() as stack:
+            form = FormData()
+            for file_path in batch:
+                file_handle = stack.enter_context(open(file_path, "rb"))
+                form.add_field("photo", file_handle, filename=os.path.basename(file_path))  # streamed from disk
+            async with session.post(url=UPLOAD_URL, params={"op": "batch"}, data=form, headers=headers) as response:
+                if response.status not in (429, 503):
+                    return await response.json()
+                delay = retry_delay(response.headers)
+        logger.info("server busy, retrying batch in %.1fs", delay)
+        await asyncio.sleep(delay)
+
+
+async def upload_worker(path_queue: asyncio.Queue, session: ClientSession, manifest: Manifest) -> None:
+    """
+    Pull batches of file paths from the queue and upload them
+    :param path_queue: queue to pull lists of file paths from
     :param session: client session to use for uploading
+    :param manifest: import manifest to record upload results in
     """
-    headers = {"Authentication": settings.SECRET}  # "Content-Type": content_type
     while True:
-        file_path = await path_queue.get()
-        logger.debug("uploading photo %s", file_path)
+        batch = await path_queue.get()
+        logger.debug("uploading %d photos", len(batch))
         try:
-            file_handle = open(file_path, "rb")
-            path, filename = os.path.split(file_path)
-            request = await session.post(
-                url="http://127.0.0.1:8000/upload/",
-                data={"photo": file_handle.read(), "filename": filename, "path": path},
-                headers=headers,
-            )
-            data = await request.json()
-            logger.debug("uploaded photo %s: %s", filename, data)
-            file_handle.close()
+            data = await upload_batch(batch, session)
+            uploaded, failed = [], []
+            for file_path, result in zip(batch, data.get("results", [])):  # results keep the upload order
+                if result.get("status") == "error":
+                    logger.warning("cannot import photo %s: %s", file_path, result.get("details"))
+                    failed.append(file_path)
+                else:
+                    logger.debug("uploaded photo %s: %s", file_path, result["status"])
+                    uploaded.append(file_path)
+            manifest.set_status(uploaded, UPLOADED)
+            manifest.set_status(failed, FAILED)
         except Exception as exc:  # pylint: disable=broad-exception-caught
-            logger.warning("cannot upload photo %s from %s: %s", filename, path, exc)
+            logger.warning("cannot upload batch starting with %s: %s", batch[0], exc)
         path_queue.task_done()
 
 
 async def main() -> None:
     """
-    Main function to import photos using async parallel workers
+    Main function to import photos using async parallel workers. Files already uploaded (same path, size and mtime
+    in the manifest) are skipped without being read, so an interrupted import resumes where it stopped.
     """
+    manifest = Manifest(MANIFEST_PATH)
+    known = manifest.load()
     session = ClientSession()
-    path_queue: asyncio.Queue = asyncio.Queue()
+    executor = ProcessPoolExecutor()
+    path_queue: asyncio.Queue = asyncio.Queue(maxsize=64)
     logger.info("creating workers")
-    workers = [asyncio.create_task(upload_worker(path_queue, session=session)) for _ in range(4)]
+    workers = [asyncio.create_task(upload_worker(path_queue, session, manifest)) for _ in range(UPLOAD_WORKERS)]
     logger.info("populating queue")
-    for filename in gather_file_list():
-        await path_queue.put(filename)
+    file_list = []
+    for path, size, mtime_ns in gather_file_list():
+        entry = known.get(path)
+        if entry and entry[:2] == (size, mtime_ns):
+            if entry[3] == UPLOADED:
+                continue
+            file_list.append((path, size, mtime_ns, entry[2]))  # unchanged, reuse stored i-hash
+        else:
+            file_list.append((path, size, mtime_ns, None))
+    logger.info("%d files not uploaded yet", len(file_list))
+    queued = 0
+    for i in range(0, len(file_list), CHECK_BATCH_SIZE):
+        chunk = file_list[i : i + CHECK_BATCH_SIZE]
+        hashed = {path: ihash for path, _, _, ihash in chunk if ihash}
+        hashed.update(await hash_files([file[:3] for file in chunk if not file[3]], manifest, executor))
+        missing = await find_missing(hashed, session, manifest) if hashed else []
+        for j in range(0, len(missing), BATCH_SIZE):
+            await path_queue.put(missing[j : j + BATCH_SIZE])
+        queued += len(missing)
+        logger.info(
+            "checked %d of %d files, %d to upload", min(i + CHECK_BATCH_SIZE, len(file_list)), len(file_list), queued
+        )
     logger.info("queue populated")
+    executor.shutdown()
     await path_queue.join()  # wait for all tasks to be processed
     await asyncio.sleep(2.0)
     logger.info("cancelling workers")
@@ -75,6 +195,7 @@ async def main() -> None:
     await asyncio.gather(*workers, return_exceptions=True)
     logger.info("workers cancelled, closing client session")
     await session.close()
+    manifest.close()
     logger.info("client session closed")
     await asyncio.sleep(2.0)
 
@@ -0,0 +1,275 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import bisect
+import calendar
+import datetime
+import logging
+import math
+from itertools import accumulate
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256  # web mercator tile size (px)
+MAX_LATITUDE = 85.05112878  # web mercator latitude limit
+
+
+def to_epoch(moment: datetime.date | datetime.datetime) -> int:
+    """
+    Convert (naive) date or datetime to epoch seconds, same as extract(epoch from moment) in PG
+    :param moment: date or datetime to convert
+    :return: epoch seconds
+    """
+    return calendar.timegm(moment.timetuple())
+
+
+def from_epoch(seconds: int) -> datetime.datetime:
+    """
+    Convert epoch seconds back to a naive datetime (inverse of to_epoch)
+    :param seconds: epoch seconds
+    :return: naive datetime
+    """
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=seconds)
+
+
+def project(lat: float, lng: float) -> tuple[float, float]:
+    """
+    Project coordinates to normalized web mercator space
+    :param lat: latitude (deg)
+    :param lng: longitude (deg)
+    :return: x, y in [0, 1] (y grows southwards)
+    """
+    lat = min(max(lat, -MAX_LATITUDE), MAX_LATITUDE)
+    x = (lng + 180.0) / 360.0
+    sin_lat = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return min(max(x, 0.0), 1.0), min(max(y, 0.0), 1.0)
+
+
+class _Cell:
+    """Photos falling into one grid cell, sorted by moment"""
+
+    __slots__ = ("moments", "photos", "lat_sums", "lng_sums")
+
+    def __init__(self) -> None:
+        self.moments: list[int] = []
+        self.photos: list[tuple] = []
+        self.lat_sums: list[float] | None = None
+        self.lng_sums: list[float] | None = None
+
+    def add(self, photo: tuple) -> None:
+        """
+        Insert photo keeping the cell sorted by moment
+        :param photo: (moment, id, ihash, lat, lng) tuple
+        """
+        position = bisect.bisect_right(self.moments, photo[0])
+        self.moments.insert(position, photo[0])
+        self.photos.insert(position, photo)
+        self.lat_sums = self.lng_sums = None
+
+    def remove(self, photo: tuple) -> None:
+        """
+        Remove photo from cell
+        :param photo: (moment, id, ihash, lat, lng) tuple
+        """
+        position = self.photos.index(photo)
+        del self.moments[position]
+        del self.photos[position]
+        self.lat_sums = self.lng_sums = None
+
+    def centroid(self, lo: int, hi: int) -> tuple[float, float]:
+        """
+        Compute centroid for photos[lo:hi] using (lazily built) prefix sums
+        :param lo: first photo position
+        :param hi: last photo position (exclusive)
+        :return: lat, lng
+        """
+        if self.lat_sums is None or self.lng_sums is None:
+            self.lat_sums = list(accumulate((photo[3] for photo in self.photos), initial=0.0))
+            self.lng_sums = list(accumulate((photo[4] for photo in self.photos), initial=0.0))
+        count = hi - lo
+        return (self.lat_sums[hi] - self.lat_sums[lo]) / count, (self.lng_sums[hi] - self.lng_sums[lo]) / count
+
+
+class ClusterIndex:
+    """
+    In-process grid index of geotagged photos, one grid per zoom level. Cells are sized so that a cluster covers
+    roughly cell_size px on screen, which keeps the number of cells to visit proportional to the viewport.
+    """
+
+    def __init__(self, max_zoom: int = 16, cell_size: int = 64, min_points: int = 4) -> None:
+        self.max_zoom = max_zoom
+        self.cell_size = cell_size
+        self.min_points = min_points
+        self.levels: list[dict[tuple[int, int], _Cell]] = [{} for _ in range(max_zoom + 1)]
+        self.photos: dict[int, tuple] = {}
+
+    def __len__(self) -> int:
+        return len(self.photos)
+
+    def _cells_per_axis(self, zoom: int) -> int:
+        return max(TILE_SIZE * 2**zoom // self.cell_size, 1)
+
+    def _cell_key(self, zoom: int, lat: float, lng: float) -> tuple[int, int]:
+        cells = self._cells_per_axis(zoom)
+        x, y = project(lat, lng)
+        return min(int(x * cells), cells - 1), min(int(y * cells), cells - 1)
+
+    async def load(self, database: Database) -> None:
+        """
+        Populate index with all geotagged photos from the database
+        :param database: database instance to load photos from
+        """
+        photos = await database.get_geotagged_photos(datetime.datetime.min, datetime.datetime.max)
+        self.levels = [{} for _ in range(self.max_zoom + 1)]
+        self.photos = {}
+        for photo in photos:
+            self.add(photo["id"], photo["ihash"], photo["lat"], photo["lng"], photo["moment"])
+        logger.info("cluster index loaded with %d photos", len(self.photos))
+
+    def add(self, photo_id: int, ihash: str, lat: float, lng: float, moment: int) -> None:
+        """
+        Add (or move) geotagged photo to the index
+        :param photo_id: photo ID
+        :param ihash: photo hash
+        :param lat: latitude
+        :param lng: longitude
+        :param moment: epoch seconds
+        """
+        self.remove(photo_id)
+        photo = (moment, photo_id, ihash, lat, lng)
+        self.photos[photo_id] = photo
+        for zoom, level in enumerate(self.levels):
+            key = self._cell_key(zoom, lat, lng)
+            if key not in level:
+                level[key] = _Cell()
+            level[key].add(photo)
+
+    def remove(self, photo_id: int) -> None:
+        """
+        Remove photo from the index (if present)
+        :param photo_id: photo ID
+        """
+        photo = self.photos.pop(photo_id, None)
+        if not photo:
+            return
+        for zoom, level in enumerate(self.levels):
+            key = self._cell_key(zoom, photo[3], photo[4])
+            level[key].remove(photo)
+            if not level[key].photos:
+                del level[key]
+
+    def _visible_cells(self, zoom: int, bbox: tuple[float, float, float, float]) -> list[_Cell]:
+        """
+        Collect non-empty cells intersecting the bounding box
+        :param zoom: index level
+        :param bbox: west, south, east, north
+        :return: list of cells
+        """
+        west, south, east, north = bbox
+        level = self.levels[zoom]
+        x_ranges = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]  # antimeridian
+        cells: list[_Cell] = []
+        for range_west, range_east in x_ranges:
+            x1, y1 = self._cell_key(zoom, north, range_west)
+            x2, y2 = self._cell_key(zoom, south, range_east)
+            if (x2 - x1 + 1) * (y2 - y1 + 1) > len(level):
+                cells.extend(cell for (x, y), cell in level.items() if x1 <= x <= x2 and y1 <= y <= y2)
+                continue
+            for x in range(x1, x2 + 1):
+                for y in range(y1, y2 + 1):
+                    if (x, y) in level:
+                        cells.append(level[(x, y)])
+        return cells
+
+    def query(self, bbox: tuple[float, float, float, float], zoom: float, start: int, stop: int) -> dict:
+        """
+        Aggregate photos taken between start and stop inside the bounding box
+        :param bbox: west, south, east, north (deg)
+        :param zoom: map zoom level
+        :param start: epoch seconds lower limit (exclusive)
+        :param stop: epoch seconds upper limit (exclusive)
+        :return: clusters (count, centroid, representative ihash) and individual photos for sparse cells
+        """
+        level = min(max(int(zoom), 0), self.max_zoom)
+        min_points = self.min_points if zoom <= self.max_zoom else math.inf
+        clusters, photos = [], []
+        for cell in self._visible_cells(level, bbox):
+            lo = bisect.bisect_right(cell.moments, start)
+            hi = bisect.bisect_left(cell.moments, stop)
+            count = hi - lo
+            if count <= 0:
+                continue
+            if count < min_points:
+                for moment, photo_id, ihash, lat, lng in cell.photos[lo:hi]:
+                    photos.append({"id": photo_id, "ihash": ihash, "lat": lat, "lng": lng, "moment": moment})
+                continue
+            lat, lng = cell.centroid(lo, hi)
+            clusters.append({"count": count, "lat": lat, "lng": lng, "ihash": cell.photos[hi - 1][2]})
+        return {"clusters": clusters, "photos": photos}
+
+
+class HashIndex:
+    """
+    In-process set of known photo hashes, loaded once at startup and updated on insert (uploads) / delete (Photo view).
+    Hashes of uploads still being processed are tracked separately so concurrent duplicates are rejected early.
+    """
+
+    def __init__(self) -> None:
+        self.hashes: set[str] = set()
+        self.pending: set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def __contains__(self, ihash: str) -> bool:
+        return ihash in self.hashes or ihash in self.pending
+
+    async def load(self, database: Database) -> None:
+        """
+        Populate index with all photo hashes from the database
+        :param database: database instance to load hashes from
+        """
+        hashes = await database.get_all_ihash()
+        self.hashes = {photo["ihash"] for photo in hashes}
+        logger.info("hash index loaded with %d hashes", len(self.hashes))
+
+    def reserve(self, ihash: str) -> bool:
+        """
+        Mark hash as being processed
+        :param ihash: photo hash
+        :return: False if the hash is already known or being processed, True otherwise
+        """
+        if ihash in self:
+            return False
+        self.pending.add(ihash)
+        return True
+
+    def release(self, ihash: str, known: bool) -> None:
+        """
+        Finish processing hash
+        :param ihash: photo hash
+        :param known: True if the hash now exists in the database
+        """
+        self.pending.discard(ihash)
+        if known:
+            self.hashes.add(ihash)
+
+    def add(self, ihash: str) -> None:
+        """
+        Add hash to the index
+        :param ihash: photo hash
+        """
+        self.hashes.add(ihash)
+
+    def discard(self, ihash: str) -> None:
+        """
+        Remove hash from the index (if present)
+        :param ihash: photo hash
+        """
+        self.hashes.discard(ihash)
@@ -0,0 +1,107 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Callable
+
+SOI = b"\xff\xd8"
+APP1 = 0xE1
+SOS, EOI = 0xDA, 0xD9
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}  # C4 (DHT), C8 (JPG) and CC (DAC) are not frames
+STANDALONE_MARKERS = {0x01, *range(0xD0, 0xD8)}  # TEM and RSTn have no length field
+EXIF_PREFIX = b"Exif\x00\x00"
+
+
+class InvalidJpeg(ValueError):
+    """
+    Data is not a (complete enough) JPEG stream
+    """
+
+
+@dataclass
+class JpegHeader:
+    """
+    Metadata found in the JPEG header segments
+    """
+
+    exif: bytes | memoryview | None = None  # APP1 payload, starting with the Exif\0\0 identifier
+    width: int | None = None
+    height: int | None = None
+
+
+def scan(read: Callable[[int], bytes | memoryview], skip: Callable[[int], object]) -> JpegHeader:
+    """
+    Walk JPEG marker segments until the frame header (SOF) is found, only the EXIF APP1 segment is read,
+    all other segments are skipped
+    :param read: function returning the next n bytes
+    :param skip: function advancing n bytes
+    :return: JPEG header details
+    """
+    if read(2) != SOI:
+        raise InvalidJpeg("missing SOI marker")
+    header = JpegHeader()
+    while True:
+        marker = read(2)
+        if len(marker) < 2:
+            raise InvalidJpeg("no frame header found")
+        if marker[0] != 0xFF:
+            raise InvalidJpeg(f"invalid marker {bytes(marker).hex()}")
+        code = marker[1]
+        while code == 0xFF:  # optional fill bytes
+            fill = read(1)
+            if not fill:
+                raise InvalidJpeg("no frame header found")
+            code = fill[0]
+        if code in STANDALONE_MARKERS:
+            continue
+        if code in (SOS, EOI):
+            raise InvalidJpeg("no frame header found")
+        length_field = read(2)
+        if len(length_field) < 2 or int.from_bytes(length_field, "big") < 2:
+            raise InvalidJpeg("truncated or invalid segment length")
+        length = int.from_bytes(length_field, "big") - 2
+        if code == APP1 and header.exif is None:
+            payload = read(length)
+            if len(payload) < length:
+                raise InvalidJpeg("truncated APP1 segment")
+            if payload[:6] == EXIF_PREFIX:
+                header.exif = payload
+        elif code in SOF_MARKERS:
+            frame = read(5)  # sample precision, height, width
+            if len(frame) < 5:
+                raise InvalidJpeg("truncated frame header")
+            header.height = int.from_bytes(frame[1:3], "big")
+            header.width = int.from_bytes(frame[3:5], "big")
+            return header  # APP segments always precede the frame header
+        else:
+            skip(length)
+
+
+def read_header(source: str | bytes | memoryview) -> JpegHeader:
+    """
+    Read EXIF segment and image dimensions without decoding the image, reading stops at the frame header
+    (usually within the first few KB). Buffers are sliced without copying.
+    :param source: file path or file content
+    :return: JPEG header details
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as file_handle:
+            return scan(file_handle.read, lambda size: file_handle.seek(size, os.SEEK_CUR))
+    view = memoryview(source)
+    position = 0
+
+    def read(size: int) -> memoryview:
+        nonlocal position
+        chunk = view[position : position + size]
+        position += size
+        return chunk
+
+    def skip(size: int) -> None:
+        nonlocal position
+        position += size
+
+    return scan(read, skip)
@@ -8,18 +8,25 @@ import asyncio
 import logging
 import os
 from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
 import aiohttp_jinja2
 import jinja2
 import redis.asyncio as redis
 from aiohttp import web
 from aiohttp_session import setup
-from aiohttp_session.redis_storage import RedisStorage
 
 import settings
 import views
+from admission import AdmissionController
+from cache import Cache
 from database import Database
-from middlewares import error_middleware
+from indexes import ClusterIndex, HashIndex
+from metrics import Metrics, collect_app
+from middlewares import error_middleware, metrics_middleware
+from sessions import make_storage
+from storage import BlobStore
+from thumbnails import ThumbnailStore
 
 logger = logging.getLogger(__name__)
 
@@ -32,11 +39,22 @@ async def startup(app: web.Application) -> None:
     logger.info("connecting to database")
     await app.database.connect()
     await app.database.create_structure()
+    logger.info("loading photo cluster index")
+    await app.cluster_index.load(app.database)
+    logger.info("loading photo hash index")
+    await app.hash_index.load(app.database)
     logger.info("connecting to REDIS instance")
-    app.cache = redis.Redis(host=app.config.REDIS_HOST, port=app.config.REDIS_PORT, password=app.config.REDIS_PASSWORD)
-    await app.cache.ping()
-    storage = RedisStorage(app.cache, max_age=14 * 86400)
-    setup(app, storage)
+    app.redis = redis.Redis(host=app.config.REDIS_HOST, port=app.config.REDIS_PORT, password=app.config.REDIS_PASSWORD)
+    await app.redis.ping()
+    app.cache = Cache(
+        app.redis,
+        prefix=app.config.CACHE_PREFIX,
+        version=app.config.CACHE_VERSION,
+        serializer=app.config.CACHE_SERIALIZER,
+        compress_min_size=app.config.CACHE_COMPRESS_MIN_SIZE,
+        ttl=app.config.CACHE_TTL,
+    )
+    setup(app, make_storage(app.config, app.redis))
 
 
 async def shutdown(app: web.Application) -> None:
@@ -47,7 +65,7 @@ async def shutdown(app: web.Application) -> None:
     logger.info("disconnecting from database")
     await app.database.disconnect()
     logger.info("disconnecting from redis")
-    await app.cache.aclose()
+    await app.redis.aclose()
     await asyncio.sleep(0.1)
 
 
@@ -67,10 +85,21 @@ def make_app() -> web.Application:
     app.router.add_view("/upload{tail:.*?}", views.Upload)
     path = os.path.join(os.path.dirname(__file__), "static")
     app.router.add_static("/static", path)
-    app.router.add_static("/media", settings.MEDIA_PATH)
+    app.router.add_view(
+        r"/media/thumbnails/{resolution:\d+}px/{a:[0-9a-f]}/{b:[0-9a-f]}/{ihash:[0-9a-f]{40}}", views.Thumbnail
+    )
+    app.router.add_view(r"/media/original/{a:[0-9a-f]}/{b:[0-9a-f]}/{ihash:[0-9a-f]{40}}", views.Original)
+    os.makedirs(os.path.join(settings.MEDIA_PATH, "thumbnails"), exist_ok=True)
+    app.router.add_static("/media/thumbnails", os.path.join(settings.MEDIA_PATH, "thumbnails"))
     app.router.add_view("/favicon.ico", views.Favicon)
+    app.router.add_view("/metrics", views.Metrics)
+    app.router.add_view("/debug/queries", views.Queries)
+    app.middlewares.append(metrics_middleware)
     app.middlewares.append(error_middleware)
-    app.executor = ProcessPoolExecutor(max_workers=12)
+    app.metrics = Metrics()
+    app.metrics.collectors.append(partial(collect_app, app))
+    app.executor = ProcessPoolExecutor(max_workers=settings.EXECUTOR_WORKERS)
+    app.admission = AdmissionController(app.executor, settings.EXECUTOR_WORKERS, settings.ADMISSION_QUEUE_SIZE)
     app.config = settings
     app.database = Database(
         settings.POSTGRES_USER,
@@ -78,7 +107,12 @@ def make_app() -> web.Application:
         settings.POSTGRES_HOST,
         settings.POSTGRES_PORT,
         settings.POSTGRES_DB,
+        slow_query_threshold=settings.SLOW_QUERY_THRESHOLD,
     )
+    app.cluster_index = ClusterIndex(settings.CLUSTER_MAX_ZOOM, settings.CLUSTER_CELL_SIZE, settings.CLUSTER_MIN_POINTS)
+    app.hash_index = HashIndex()
+    app.originals = BlobStore(os.path.join(settings.MEDIA_PATH, "original"))
+    app.thumbnails = ThumbnailStore(settings.MEDIA_PATH, app.admission, app.metrics)
     path = os.path.join(os.path.dirname(__file__), "templates")
     aiohttp_jinja2.setup(app, loader=jinja2.FileSystemLoader(path))
     app.on_startup.append(startup)
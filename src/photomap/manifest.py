@@ -0,0 +1,72 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+HASHED = "hashed"  # i-hash computed, upload not confirmed yet
+UPLOADED = "uploaded"  # photo exists on the server (uploaded now or before)
+FAILED = "failed"  # server could not import the photo
+
+
+class Manifest:
+    """
+    Local SQLite manifest for the import script, mapping each file (path, size, mtime) to its i-hash and upload status
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        :param path: SQLite database file
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS files(
+                path text PRIMARY KEY,
+                size integer NOT NULL,
+                mtime_ns integer NOT NULL,
+                ihash text NOT NULL,
+                status text NOT NULL
+            )"""
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        """
+        Close the manifest database
+        """
+        self.conn.close()
+
+    def load(self) -> dict[str, tuple[int, int, str, str]]:
+        """
+        Load the whole manifest in memory
+        :return: path to (size, mtime_ns, ihash, status) mapping
+        """
+        rows = self.conn.execute("SELECT path, size, mtime_ns, ihash, status FROM files")
+        return {row[0]: row[1:] for row in rows}
+
+    def add_hashes(self, entries: list[tuple[str, int, int, str]]) -> None:
+        """
+        Record (new or changed) files with their i-hash
+        :param entries: list of (path, size, mtime_ns, ihash)
+        """
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO files(path, size, mtime_ns, ihash, status) VALUES(?, ?, ?, ?, ?)",
+            [(*entry, HASHED) for entry in entries],
+        )
+        self.conn.commit()
+
+    def set_status(self, paths: list[str], status: str) -> None:
+        """
+        Update upload status for files
+        :param paths: file paths to update
+        :param status: new status
+        """
+        self.conn.executemany("UPDATE files SET status=? WHERE path=?", [(status, path) for path in paths])
+        self.conn.commit()
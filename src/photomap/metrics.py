@@ -0,0 +1,230 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import bisect
+import logging
+import math
+from typing import Callable, TypeVar
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+MetricT = TypeVar("MetricT", bound="Metric")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+
+
+def format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    """
+    Format label set for the text exposition format
+    :param names: label names
+    :param values: label values
+    :param extra: additional (already formatted) label, e.g. le="0.5"
+    :return: formatted labels, empty string if there are none
+    """
+    items = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        items.append(extra)
+    return "{" + ",".join(items) + "}" if items else ""
+
+
+def escape(value: str) -> str:
+    """
+    Escape label value
+    :param value: label value
+    :return: escaped value
+    """
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def format_value(value: float) -> str:
+    """
+    Format sample value
+    :param value: number
+    :return: formatted number
+    """
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """
+    Base metric class, one time series per label value combination
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        """
+        Build series key from label values
+        :param labels: label values
+        :return: values ordered as the label names
+        """
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> list[str]:
+        """
+        Format all series of this metric
+        :return: exposition lines
+        """
+        return [
+            f"{self.name}{format_labels(self.labels, key)} {format_value(value)}" for key, value in self.values.items()
+        ]
+
+    def render(self) -> list[str]:
+        """
+        Format metric with its HELP and TYPE headers
+        :return: exposition lines
+        """
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing value
+    """
+
+    kind = "counter"
+
+    def inc(self, value: float = 1.0, **labels: str) -> None:
+        """
+        Increase counter
+        :param value: amount to add
+        :param labels: label values
+        """
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0.0) + value
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down (usually set by a collector right before rendering)
+    """
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        """
+        Set gauge value
+        :param value: new value
+        :param labels: label values
+        """
+        self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values in cumulative buckets
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, description: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ) -> None:
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+        self.counts: dict[tuple[str, ...], list[int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """
+        Record observation
+        :param value: observed value
+        :param labels: label values
+        """
+        key = self.key(labels)
+        if key not in self.counts:
+            self.counts[key] = [0] * (len(self.buckets) + 1)  # last one is +Inf
+            self.values[key] = 0.0
+        self.counts[key][bisect.bisect_left(self.buckets, value)] += 1
+        self.values[key] += value
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, counts in self.counts.items():
+            total = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                total += count
+                le = f'le="{format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le)} {total}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {format_value(self.values[key])}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {total}")
+        return lines
+
+
+class Metrics:
+    """
+    Application metrics registry, rendered in the Prometheus text exposition format
+    """
+
+    def __init__(self) -> None:
+        self.metrics: list[Metric] = []
+        self.collectors: list[Callable[[], None]] = []
+        self.requests = self.add(
+            Counter("photomap_http_requests_total", "HTTP requests", ("route", "method", "status"))
+        )
+        self.latency = self.add(
+            Histogram("photomap_http_request_duration_seconds", "HTTP request latency", ("route", "method"))
+        )
+        self.upload_stages = self.add(
+            Histogram("photomap_upload_stage_duration_seconds", "Upload pipeline stage duration", ("stage",))
+        )
+        self.cache_requests = self.add(
+            Counter("photomap_cache_requests_total", "Cache lookups by key family", ("family", "result"))
+        )
+        self.pool_size = self.add(Gauge("photomap_db_pool_size", "Database pool connections"))
+        self.pool_idle = self.add(Gauge("photomap_db_pool_idle", "Idle database pool connections"))
+        self.executor_tasks = self.add(Gauge("photomap_executor_tasks", "Process pool tasks", ("state",)))
+
+    def add(self, metric: MetricT) -> MetricT:
+        """
+        Register metric
+        :param metric: metric to register
+        :return: registered metric
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Run collectors and format all metrics
+        :return: text exposition
+        """
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                logger.warning("metrics collector failed: %s", exc)
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def collect_app(app: web.Application) -> None:
+    """
+    Update gauges (and cache counters) from the application state
+    :param app: application instance
+    """
+    metrics = app.metrics
+    pool = getattr(app.database, "pool", None)
+    if pool is not None:
+        metrics.pool_size.set(pool.get_size())
+        metrics.pool_idle.set(pool.get_idle_size())
+    metrics.executor_tasks.set(app.admission.running, state="running")
+    metrics.executor_tasks.set(app.admission.waiting, state="waiting")
+    metrics.executor_tasks.set(app.admission.reserved, state="reserved")
+    cache = getattr(app, "cache", None)
+    if cache is not None:
+        for (family, result), count in cache.lookups.items():
+            metrics.cache_requests.values[(family, result)] = count
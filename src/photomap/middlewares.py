@@ -5,6 +5,7 @@ Created on 2022-02-25
 """
 
 import logging
+import time
 from typing import Callable
 
 import aiohttp_jinja2
@@ -44,3 +45,28 @@ async def error_middleware(request: web.Request, handler: Callable) -> web.Respo
             logger.error("error processing request: %s", request.raw_path, exc_info=True)
         message = str(exc)
     return aiohttp_jinja2.render_template("error.html", request, context={"message": message}, status=500)
+
+
+@web.middleware
+async def metrics_middleware(request: web.Request, handler: Callable) -> web.StreamResponse:
+    """
+    Record request count and latency per route (route patterns, not paths, to keep the number of series bounded)
+    :param request: web Request to handle
+    :param handler: handler to execute
+    :return: web response object
+    """
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as exc:
+        status = exc.status
+        raise
+    finally:
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource else "unmatched"
+        metrics = request.app.metrics
+        metrics.requests.inc(route=route, method=request.method, status=str(status))
+        metrics.latency.observe(time.perf_counter() - start, route=route, method=request.method)
@@ -6,26 +6,39 @@ Created on 2022-06-04
 
 import datetime
 import logging
+import math
 import os
-from io import BytesIO
+import time
 
 import piexif
 from PIL import Image as PilImage
-from PIL import ImageOps
+from PIL import ImageOps, features
 
+import jpeg
+import settings
 import utils
-from database import Photo
+from storage import blob_path
 
 logger = logging.getLogger(__name__)
 
+MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "avif": "image/avif"}
+
+
+def thumbnail_formats() -> list[str]:
+    """
+    List thumbnail formats that can be written (JPEG plus the configured variants supported by Pillow)
+    :return: format names, JPEG first
+    """
+    return ["jpeg"] + [image_format for image_format in settings.THUMBNAIL_FORMATS if features.check(image_format)]
+
 
 def parse_location(exif: dict) -> dict:
     """
     Parse latitude, longitude from EXIF GPS data
     :param exif: exif details loaded from image
-    :return: lat, lng, altitude
+    :return: lat, lng, altitude and GPS reference (NE0)
     """
-    location = {"lat": None, "lng": None, "altitude": None}
+    location = {"lat": None, "lng": None, "altitude": None, "gps_ref": "NE0"}
     if "GPS" not in exif:
         return location
     location["lat"] = utils.exif2gps(exif["GPS"].get(piexif.GPSIFD.GPSLatitude))
@@ -41,31 +54,49 @@ def parse_location(exif: dict) -> dict:
     # some cameras set a huge number for alt (like 4294967275)
     if location["altitude"] and location["altitude"] > 12000:
         location["altitude"] = 0
+    lat_ref, lng_ref, altitude_ref = "N", "E", "0"
     if piexif.GPSIFD.GPSLatitudeRef in exif["GPS"]:
         ref = exif["GPS"].get(piexif.GPSIFD.GPSLatitudeRef, b"").decode()
         if ref == "S":  # south latitude
             assert isinstance(location["lat"], float)
             location["lat"] = -1 * location["lat"]
+            lat_ref = ref
     if piexif.GPSIFD.GPSLongitudeRef in exif["GPS"]:
         ref = exif["GPS"].get(piexif.GPSIFD.GPSLongitudeRef, b"").decode()
         if ref == "W":  # west longitude
             assert isinstance(location["lng"], float)
             location["lng"] = -1 * location["lng"]
+            lng_ref = ref
     if piexif.GPSIFD.GPSAltitudeRef in exif["GPS"]:
-        ref = exif["GPS"].get(piexif.GPSIFD.GPSAltitudeRef, b"").decode()
-        if ref == 1:  # below sea level
-            assert isinstance(location["lat"], float)
+        ref = exif["GPS"].get(piexif.GPSIFD.GPSAltitudeRef)  # BYTE value, loaded as int
+        if ref in (1, b"\x01") and location["altitude"]:  # below sea level
             location["altitude"] = -1 * location["altitude"]
+            altitude_ref = "1"
+    location["gps_ref"] = lat_ref + lng_ref + altitude_ref
     return location
 
 
-def parse_exif(file_body: bytes) -> dict:
+def load_exif(source: str | bytes | memoryview) -> tuple[dict, int | None, int | None]:
+    """
+    Load EXIF data and frame dimensions, for JPEGs only the header segments are read (see jpeg.read_header)
+    :param source: path to the image file or file content
+    :return: exif data, width and height from the frame header (None if not a JPEG)
+    """
+    try:
+        header = jpeg.read_header(source)
+    except jpeg.InvalidJpeg:  # other formats (or damaged JPEGs), let piexif read the whole file
+        return piexif.load(source if isinstance(source, str) else bytes(source)), None, None
+    exif_data = piexif.load(bytes(header.exif)) if header.exif else {"0th": {}, "Exif": {}, "GPS": {}}
+    return exif_data, header.width, header.height
+
+
+def parse_exif(source: str | bytes | memoryview) -> dict:
     """
-    Parse EXIF data from image bytes
-    :param file_body: raw image data
+    Parse EXIF data from image file
+    :param source: path to the image file or file content
     :return: exif data
     """
-    exif_data = piexif.load(file_body)
+    exif_data, width, height = load_exif(source)
     camera_make = exif_data["0th"].get(piexif.ImageIFD.Make, b"").decode().strip("\x00")
     camera_model = exif_data["0th"].get(piexif.ImageIFD.Model, b"").decode().strip("\x00")
     if camera_make in camera_model:
@@ -79,43 +110,152 @@ def parse_exif(file_body: bytes) -> dict:
         "camera_make": camera_make,
         "camera_model": camera_model,
         "orientation": exif_data["0th"].get(piexif.ImageIFD.Orientation, 1) or 1,
-        "width": exif_data.get("Exif", {}).get(piexif.ExifIFD.PixelXDimension, None),
-        "height": exif_data.get("Exif", {}).get(piexif.ExifIFD.PixelYDimension, None),
-        "size": len(file_body),
+        "width": width or exif_data.get("Exif", {}).get(piexif.ExifIFD.PixelXDimension, None),
+        "height": height or exif_data.get("Exif", {}).get(piexif.ExifIFD.PixelYDimension, None),
+        "size": os.path.getsize(source) if isinstance(source, str) else memoryview(source).nbytes,
     }
     data.update(parse_location(exif_data))
     return data
 
 
-def make_thumbnails(image_file: PilImage, photo: Photo, base_path: str, overwrite: bool = False) -> None:
+def thumbnail_path(base_path: str, resolution: int, ihash: str, image_format: str = "jpeg") -> str:
+    """
+    Generate thumbnail file path (JPEG thumbnails have no extension, other formats use it as suffix)
+    :param base_path: base path of the media folder
+    :param resolution: thumbnail size (px)
+    :param ihash: photo hash
+    :param image_format: thumbnail format (see thumbnail_formats)
+    :return: thumbnail file path
+    """
+    directory = utils.generate_path(os.path.join(base_path, "thumbnails", f"{resolution}px"), ihash)
+    if image_format == "jpeg":
+        return os.path.join(directory, ihash)
+    return os.path.join(directory, f"{ihash}.{image_format}")
+
+
+def original_path(base_path: str, ihash: str) -> str:
+    """
+    Generate original (uploaded) photo file path
+    :param base_path: base path of the media folder
+    :param ihash: photo hash
+    :return: original file path
+    """
+    return blob_path(os.path.join(base_path, "original"), ihash)
+
+
+def detect_mime_type(file_path: str) -> str | None:
+    """
+    Detect image MIME type from the file header (originals are stored without extension)
+    :param file_path: image file
+    :return: MIME type or None if the file is not a known image format
+    """
+    try:
+        with PilImage.open(file_path) as image:
+            return PilImage.MIME.get(image.format or "")
+    except OSError:  # also UnidentifiedImageError
+        return None
+
+
+def make_thumbnails(  # pylint: disable=too-many-arguments
+    image_file: PilImage,
+    ihash: str,
+    base_path: str,
+    overwrite: bool = False,
+    formats: list[str] | None = None,
+) -> None:
     """
-    Create thumbnails for provided image
-    :param image_file: Pil Image object
-    :param photo: database photo object
+    Create thumbnails for provided image, largest first, each one derived from the previous (larger) thumbnail.
+    Every size is resized once and then saved in all formats.
+    :param image_file: Pil Image object (ideally loaded with draft, see load_image)
+    :param ihash: photo hash (used for the thumbnail path and filename)
     :param base_path: base path to store the thumbnails in
     :param overwrite: flag to create a new thumbnail even if one already exists
+    :param formats: thumbnail formats to write, defaults to all available (see thumbnail_formats)
     """
-    if not os.path.exists(base_path):
-        os.makedirs(base_path)
-    resolutions = [(64, 64), (192, 192), (960, 960)]
-    for resolution in resolutions:
-        directory = os.path.join(base_path, "thumbnails", f"{resolution[0]}px")
-        directory = utils.generate_path(directory, photo.ihash)
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-        outfile = os.path.join(directory, photo.ihash)
-        if not os.path.isfile(outfile) or overwrite:
-            utils.make_thumbnail(image_file, outfile, resolution[0], resolution[1])
+    outfiles: dict[int, dict[str, str]] = {}
+    for resolution in settings.THUMBNAIL_RESOLUTIONS:
+        for image_format in formats or thumbnail_formats():
+            outfile = thumbnail_path(base_path, resolution, ihash, image_format)
+            if not os.path.isfile(outfile) or overwrite:
+                os.makedirs(os.path.dirname(outfile), exist_ok=True)
+                outfiles.setdefault(resolution, {})[image_format] = outfile
+    if not outfiles:
+        return
+    image = image_file
+    for resolution in sorted(settings.THUMBNAIL_RESOLUTIONS, reverse=True):
+        if resolution < min(outfiles):
+            break
+        image = utils.make_thumbnail(image, None, resolution, resolution)
+        for image_format, outfile in outfiles.get(resolution, {}).items():
+            options = settings.THUMBNAIL_OPTIONS if image_format == "jpeg" else settings.THUMBNAIL_FORMATS[image_format]
+            utils.save_thumbnail(image, outfile, image_format.upper(), **options)
 
 
-def load_image(file_body: bytes, photo: Photo) -> PilImage:
+def load_image(file_path: str, orientation: int | None, draft_size: int | None = None) -> PilImage:
     """
-    Load the raw image data into a PIL image object, optionally rotating it
-    :param file_body: raw image data
-    :param photo: photo object to check orientation
+    Load the image file into a PIL image object, optionally rotating it
+    :param file_path: path to the image file
+    :param orientation: EXIF orientation code (None to read it from the file)
+    :param draft_size: for JPEG files, let the decoder downscale (DCT scaling) keeping the longer side >= draft_size
     :return: PIL image
     """
-    image_file = PilImage.open(BytesIO(file_body))
-    if photo.orientation != 1:
+    image_file = PilImage.open(file_path)
+    if draft_size and image_file.format == "JPEG":
+        scale = draft_size / max(image_file.size)
+        image_file.draft("RGB", (math.ceil(image_file.width * scale), math.ceil(image_file.height * scale)))
+    if orientation != 1:
         image_file = ImageOps.exif_transpose(image_file)
     return image_file
+
+
+def render_thumbnails(ihash: str, base_path: str, overwrite: bool = False, formats: list[str] | None = None) -> bool:
+    """
+    Create missing thumbnails for a photo (decoded once, see make_thumbnails) from its stored original or, for
+    photos without one, from the largest JPEG thumbnail (enough for the other formats and smaller sizes)
+    :param ihash: photo hash
+    :param base_path: base path of the media folder
+    :param overwrite: flag to create new thumbnails even if they already exist
+    :param formats: thumbnail formats to write, defaults to all available (see thumbnail_formats)
+    :return: False if there is nothing to render the thumbnails from, True otherwise
+    """
+    source = original_path(base_path, ihash)
+    if not os.path.isfile(source):
+        source = thumbnail_path(base_path, max(settings.THUMBNAIL_RESOLUTIONS), ihash)
+        if not os.path.isfile(source):
+            return False
+        if overwrite:  # never re-encode the JPEG thumbnails from themselves
+            formats = [image_format for image_format in formats or thumbnail_formats() if image_format != "jpeg"]
+            if not formats:
+                return True
+    image_file = load_image(source, None, max(settings.THUMBNAIL_RESOLUTIONS))
+    make_thumbnails(image_file, ihash, base_path, overwrite, formats)
+    return True
+
+
+def ingest(file_path: str, ihash: str, base_path: str, thumbnails: bool = True) -> dict:
+    """
+    Parse EXIF data, decode the image once and write all thumbnails. Meant to run as a single process pool task
+    so that only the (small) metadata record is sent back to the parent process.
+    :param file_path: path to the image file
+    :param ihash: photo hash
+    :param base_path: base path to store the thumbnails in
+    :param thumbnails: flag to create thumbnails, otherwise only the metadata (and header) is read
+    :return: exif data (see parse_exif) with image dimensions and per-stage timings (seconds)
+    """
+    timings = {}
+    start = time.perf_counter()
+    data = parse_exif(file_path)
+    if data["width"] is None or data["height"] is None:  # not a JPEG
+        with PilImage.open(file_path) as header:  # only parses the header
+            data["width"], data["height"] = header.size
+    timings["exif"] = time.perf_counter() - start
+    if thumbnails:
+        start = time.perf_counter()
+        image_file = load_image(file_path, data["orientation"], max(settings.THUMBNAIL_RESOLUTIONS))
+        image_file.load()
+        timings["decode"] = time.perf_counter() - start
+        start = time.perf_counter()
+        make_thumbnails(image_file, ihash, base_path)
+        timings["thumbnails"] = time.perf_counter() - start
+    data["timings"] = timings
+    return data
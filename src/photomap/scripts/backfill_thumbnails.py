@@ -0,0 +1,56 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from photo import render_thumbnails, thumbnail_formats
+from settings import MEDIA_PATH, THUMBNAIL_RESOLUTIONS
+
+
+def find_hashes(base_path: str) -> set[str]:
+    """
+    Collect photo hashes having an original or a (largest size) JPEG thumbnail
+    :param base_path: base path of the media folder
+    :return: photo hashes
+    """
+    hashes: set[str] = set()
+    folders = [
+        os.path.join(base_path, "original"),
+        os.path.join(base_path, "thumbnails", f"{max(THUMBNAIL_RESOLUTIONS)}px"),
+    ]
+    for folder in folders:
+        for _, _, filenames in os.walk(folder):
+            hashes.update(filename for filename in filenames if len(filename) == 40 and "." not in filename)
+    return hashes
+
+
+def main() -> None:
+    """
+    Create (or re-create) WebP / AVIF thumbnail variants for all photos
+    """
+    variants = thumbnail_formats()[1:]
+    parser = argparse.ArgumentParser(description="Create WebP / AVIF thumbnail variants")
+    parser.add_argument("--formats", nargs="+", choices=variants, default=variants, help="formats to write")
+    parser.add_argument("--overwrite", action="store_true", help="re-create existing variants")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    args = parser.parse_args()
+    hashes = sorted(find_hashes(MEDIA_PATH))
+    print(f"rendering {', '.join(args.formats)} thumbnails for {len(hashes)} photos")
+    render = partial(render_thumbnails, base_path=MEDIA_PATH, overwrite=args.overwrite, formats=args.formats)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for done, rendered in enumerate(executor.map(render, hashes, chunksize=16), start=1):
+            if not rendered:
+                print(f"nothing to render thumbnails from for {hashes[done - 1]}")
+            if done % 1000 == 0:
+                print(f"{done} of {len(hashes)} photos processed")
+    print("done")
+
+
+if __name__ == "__main__":
+    main()
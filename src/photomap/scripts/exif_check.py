@@ -4,53 +4,115 @@ Created on Sep 19, 2012
 @author: ionut
 """
 
+import argparse
 import asyncio
 import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator
 
-import piexif
-
-import database
+from database import Database
+from maintenance import Progress, invalidate_photos, map_unordered, open_database
+from photo import original_path, parse_exif
 from settings import MEDIA_PATH
-from utils import exif2gps
 
+TOLERANCE = 0.00001  # degrees / meters
+BATCH_SIZE = 1000  # locations restored per statement
 
-async def main() -> None:
+
+def differs(stored: float | None, found: float | None, tolerance: float = TOLERANCE) -> bool:
     """
-    Main loop to check exif data against already imported photos
+    Compare stored and EXIF values
+    :param stored: database value
+    :param found: EXIF value
+    :param tolerance: allowed difference
+    :return: True if the values are different
     """
-    images = await database.raw_query("SELECT id, ihash, lat, lng, altitude, path, filename from image", ())
-    base_dir = os.path.join(MEDIA_PATH, "original")
-    for image in images:
-        if not image[3]:
-            continue
-        file_path = os.path.join(base_dir, image[5], image[1])
+    if stored is None or found is None:
+        return stored != found
+    return abs(stored - found) > tolerance
+
+
+def check_photo(file_path: str, photo: dict) -> dict:
+    """
+    Compare database photo details with the EXIF data of the original (only the header is read, see parse_exif)
+    :param file_path: original photo file
+    :param photo: database photo details
+    :return: mismatching fields as {field: (stored, exif)}
+    """
+    exif = parse_exif(file_path)
+    mismatches = {}
+    if exif["lat"] is not None and exif["lng"] is not None:  # photos without GPS data are (manually) geotagged
+        for field in ("lat", "lng", "altitude"):
+            if differs(photo[field], exif[field]):
+                mismatches[field] = (photo[field], exif[field])
+    for field in ("width", "height", "size"):
+        if exif[field] and photo[field] != exif[field]:
+            mismatches[field] = (photo[field], exif[field])
+    if exif["moment"].year > 1970 and photo["moment"] != exif["moment"]:
+        mismatches["moment"] = (photo["moment"], exif["moment"])
+    return mismatches
+
+
+async def jobs(database: Database, progress: Progress) -> AsyncIterator[tuple[dict, tuple]]:
+    """
+    Generate check jobs for photos having an original
+    :param database: database instance
+    :param progress: progress report (photos without an original are counted here)
+    :return: async iterator of (photo, args) tuples
+    """
+    async for record in database.iter_photos():
+        photo = dict(record)
+        file_path = original_path(MEDIA_PATH, photo["ihash"])
         if not os.path.isfile(file_path):
-            print(f"missing file {file_path}, filename {image[6]}")
+            progress.update("no original")
             continue
-        input_file = open(file_path, "rb")
-        try:
-            file_content = input_file.read()
-            exif_data = piexif.load(file_content)
-            # size = input_file.tell()
-            lat = 0
-            lng = 0
-            altitude = 0
-            if exif_data.get("GPS", {}).get(piexif.GPSIFD.GPSLatitude):
-                lat = exif2gps(exif_data.get("GPS", {}).get(piexif.GPSIFD.GPSLatitude))
-            if exif_data.get("GPS", {}).get(piexif.GPSIFD.GPSLongitude):
-                lng = exif2gps(exif_data.get("GPS", {}).get(piexif.GPSIFD.GPSLongitude))
-            if exif_data.get("GPS", {}).get(piexif.GPSIFD.GPSAltitude):
-                altitude = exif_data.get("GPS", {}).get(piexif.GPSIFD.GPSAltitude)
-                if isinstance(altitude, tuple):
-                    altitude = altitude[0] / altitude[1]
-            if not lat:
-                continue
-            if image[2] - lat > 0.00001 or image[3] - lng > 0.00001 or image[4] - altitude > 0.00001:
-                print(f"coordinate mismatch for {image[6]}, path {image[5]}, {lat}:{lng}")
-                # image.save()
-        except Exception as exc:  # pylint: disable=broad-exception-caught
-            print(exc)
-        input_file.close()
+        yield photo, (file_path, photo)
+
+
+async def main() -> None:
+    """
+    Check EXIF data of the stored originals against the imported photo details, optionally restoring EXIF locations
+    """
+    parser = argparse.ArgumentParser(description="Compare stored photo details with the EXIF data of the originals")
+    parser.add_argument(
+        "--fix",
+        action="store_true",
+        help="restore locations from EXIF GPS data, overwriting locations changed later (e.g. on the geotag page)",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    args = parser.parse_args()
+    database = await open_database()
+    progress = Progress("photos")
+    fixes: list[tuple[int, str, float, float]] = []
+    fixed = 0
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            checks = map_unordered(executor, check_photo, jobs(database, progress), 4 * args.workers)
+            async for photo, mismatches in checks:
+                if isinstance(mismatches, Exception):
+                    print(f"cannot check photo {photo['id']} ({photo['filename']}): {mismatches}")
+                    progress.update("error")
+                    continue
+                if not mismatches:
+                    progress.update("ok")
+                    continue
+                details = ", ".join(f"{field} {stored} != {found}" for field, (stored, found) in mismatches.items())
+                print(f"mismatch for photo {photo['id']} ({photo['filename']}): {details}")
+                progress.update("mismatch")
+                if args.fix and {"lat", "lng"} & mismatches.keys():
+                    lat, lng = (mismatches.get(field, (None, photo[field]))[1] for field in ("lat", "lng"))
+                    fixes.append((photo["id"], photo["ihash"], lat, lng))
+                if len(fixes) >= BATCH_SIZE:
+                    fixed += len(await database.update_photo_locations(fixes))
+                    fixes.clear()
+        if fixes:
+            fixed += len(await database.update_photo_locations(fixes))
+    finally:
+        await database.disconnect()
+    progress.report()
+    if fixed:
+        await invalidate_photos()
+        print(f"{fixed} locations restored from EXIF data, restart the web application to reload its indexes")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,115 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Any, AsyncIterable, AsyncIterator, Callable
+
+import redis.asyncio as redis
+
+import settings
+from cache import Cache
+from database import Database
+
+
+async def open_database() -> Database:
+    """
+    Connect to the database configured in settings
+    :return: connected database instance
+    """
+    database = Database(
+        settings.POSTGRES_USER,
+        settings.POSTGRES_PASSWORD,
+        settings.POSTGRES_HOST,
+        settings.POSTGRES_PORT,
+        settings.POSTGRES_DB,
+        slow_query_threshold=settings.SLOW_QUERY_THRESHOLD,
+    )
+    await database.connect()
+    return database
+
+
+async def invalidate_photos() -> None:
+    """
+    Bump the photos cache generation so the web application stops serving cached photo lists
+    (its in-memory indexes are only reloaded on restart)
+    """
+    red = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, password=settings.REDIS_PASSWORD)
+    try:
+        await Cache(red, prefix=settings.CACHE_PREFIX, version=settings.CACHE_VERSION).bump("photos")
+    finally:
+        await red.aclose()
+
+
+class Progress:
+    """
+    Periodic progress report for long running scripts
+    """
+
+    def __init__(self, label: str, interval: float = 5.0) -> None:
+        """
+        :param label: name of the processed items
+        :param interval: seconds between reports
+        """
+        self.label = label
+        self.interval = interval
+        self.counts: dict[str, int] = {}
+        self.done = 0
+        self.start = self.last = time.monotonic()
+
+    def update(self, outcome: str | None = None) -> None:
+        """
+        Count processed item, printing a report if the interval has passed
+        :param outcome: optional outcome to count (e.g. missing, fixed)
+        """
+        self.done += 1
+        if outcome:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+        if time.monotonic() - self.last >= self.interval:
+            self.last = time.monotonic()
+            self.report()
+
+    def report(self) -> None:
+        """
+        Print processed items, rate and outcome counts
+        """
+        elapsed = time.monotonic() - self.start
+        counts = ", ".join(f"{outcome}: {count}" for outcome, count in sorted(self.counts.items()))
+        rate = self.done / elapsed if elapsed else 0.0
+        print(f"{self.done} {self.label} processed ({rate:.1f}/s){', ' + counts if counts else ''}")
+
+
+async def map_unordered(
+    executor: Executor, func: Callable, jobs: AsyncIterable[tuple[Any, tuple]], limit: int
+) -> AsyncIterator[tuple[Any, Any]]:
+    """
+    Run func over the jobs in the executor, keeping at most limit of them queued so that slow workers throttle the
+    (cursor) iteration producing the jobs instead of buffering all of them
+    :param executor: executor to run func in
+    :param func: picklable function
+    :param jobs: async iterable of (key, args) tuples
+    :param limit: maximum number of submitted jobs not yet consumed
+    :return: async iterator of (key, result) tuples in completion order, result is the exception for failed jobs
+    """
+    loop = asyncio.get_running_loop()
+    pending: dict[asyncio.Future, Any] = {}
+    iterator = aiter(jobs)
+    exhausted = False
+    while pending or not exhausted:
+        while not exhausted and len(pending) < limit:
+            try:
+                key, args = await anext(iterator)
+            except StopAsyncIteration:
+                exhausted = True
+                break
+            pending[loop.run_in_executor(executor, func, *args)] = key
+        if not pending:
+            break
+        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            key = pending.pop(future)
+            yield key, future.exception() or future.result()
@@ -3,53 +3,121 @@ Created on Sep 11, 2012
 @author: ionut
 """
 
+import argparse
 import asyncio
-import hashlib
 import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator
 
-from PIL import Image as PilImage
+from database import Database
+from maintenance import Progress, map_unordered, open_database
+from photo import original_path, render_thumbnails, thumbnail_path
+from settings import MEDIA_PATH, THUMBNAIL_RESOLUTIONS
+from storage import BlobStore
+from utils import hash_file
 
-import database
-from settings import MEDIA_PATH
-from utils import make_thumbnail
 
+def index_files(source_dirs: list[str]) -> dict[str, list[str]]:
+    """
+    Walk source folders once, indexing files by name
+    :param source_dirs: folders with the original photos
+    :return: filename to file paths mapping
+    """
+    index: dict[str, list[str]] = {}
+    directories = list(source_dirs)
+    while directories:
+        try:
+            with os.scandir(directories.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                    else:
+                        index.setdefault(entry.name, []).append(entry.path)
+        except OSError as exc:
+            print(f"cannot scan folder: {exc}")
+    return index
 
-async def main() -> None:
+
+def is_complete(ihash: str) -> bool:
+    """
+    Check that the original and all JPEG thumbnails of a photo exist
+    :param ihash: photo hash
+    :return: True if nothing is missing
+    """
+    paths = [original_path(MEDIA_PATH, ihash)]
+    paths.extend(thumbnail_path(MEDIA_PATH, resolution, ihash) for resolution in THUMBNAIL_RESOLUTIONS)
+    return all(os.path.isfile(path) for path in paths)
+
+
+def restore_photo(ihash: str, candidates: list[str], dry_run: bool) -> str | None:
     """
-    Main function to check thumbnails for already imported photos
+    Find the original among the candidate files (by hash), store it and re-create the missing thumbnails
+    :param ihash: photo hash
+    :param candidates: source files having the photo file name
+    :param dry_run: flag to only look for the original, without writing anything
+    :return: path of the original, None if it cannot be found
     """
-    base_dir = MEDIA_PATH
-    images = await database.raw_query("SELECT id, ihash, lat, lng, altitude, path, filename from image", ())
-    for image in images:
-        ihash = image[1]
-        path = image[5]
-        filename = image[6]
+    source = original_path(MEDIA_PATH, ihash)
+    if not os.path.isfile(source):
+        source = next((path for path in candidates if hash_file(path) == ihash), None)
+        if source is None:
+            return None
+        if not dry_run:
+            BlobStore(os.path.join(MEDIA_PATH, "original")).put_file(source, ihash)
+    if not dry_run:
+        render_thumbnails(ihash, MEDIA_PATH)
+    return source
 
-        thumb1 = os.path.join(base_dir, "thumbnails/64px", path, ihash)
-        thumb2 = os.path.join(base_dir, "thumbnails/192px", path, ihash)
-        thumb3 = os.path.join(base_dir, "thumbnails/960px", path, ihash)
-        original = os.path.join(base_dir, "original/", path, ihash)
-        if os.path.isfile(thumb1) and os.path.isfile(thumb2) and os.path.isfile(thumb3) and os.path.isfile(original):
+
+async def jobs(
+    database: Database, index: dict[str, list[str]], dry_run: bool, progress: Progress
+) -> AsyncIterator[tuple[dict, tuple]]:
+    """
+    Generate restore jobs for photos missing their original or thumbnails
+    :param database: database instance
+    :param index: filename to file paths mapping (see index_files)
+    :param dry_run: flag to only look for the originals
+    :param progress: progress report (complete photos are counted here)
+    :return: async iterator of (photo, args) tuples
+    """
+    async for record in database.iter_photos():
+        if is_complete(record["ihash"]):
+            progress.update("complete")
             continue
-        print(f"missing file: {ihash}")
-        for root, _, files in os.walk("/media/ionut/Poze"):
-            for file in files:
-                if file == filename:
-                    file_path = os.path.join(root, file)
-                    file_desc = open(file_path, "rb").read()
-                    sha1 = hashlib.sha1()
-                    sha1.update(file_desc)
-                    new_hash = sha1.hexdigest()
-                    if new_hash == ihash:
-                        print("found", root, file, filename, original)
-                        fwd = open(original, "wb")
-                        fwd.write(file_desc)
-                        fwd.close()
-                        image_file = PilImage.open(file_path)
-                        make_thumbnail(image_file, thumb1, 64, 64)
-                        make_thumbnail(image_file, thumb2, 192, 192)
-                        make_thumbnail(image_file, thumb3, 960, 960)
-                        break
+        yield dict(record), (record["ihash"], index.get(record["filename"], []), dry_run)
+
+
+async def main() -> None:
+    """
+    Restore missing originals (searching the source folders) and thumbnails for already imported photos
+    """
+    parser = argparse.ArgumentParser(description="Restore missing originals and thumbnails")
+    parser.add_argument("source_dirs", nargs="+", help="folders with the original photos")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be restored")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    args = parser.parse_args()
+    index = index_files(args.source_dirs)
+    print(f"{sum(len(paths) for paths in index.values())} source files indexed")
+    database = await open_database()
+    progress = Progress("photos")
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            restores = map_unordered(
+                executor, restore_photo, jobs(database, index, args.dry_run, progress), 4 * args.workers
+            )
+            async for photo, source in restores:
+                if isinstance(source, Exception):
+                    print(f"cannot restore photo {photo['id']} ({photo['filename']}): {source}")
+                    progress.update("error")
+                elif source is None:
+                    print(f"original not found for photo {photo['id']} ({photo['filename']}, {photo['ihash']})")
+                    progress.update("not found")
+                else:
+                    print(f"{'would restore' if args.dry_run else 'restored'} photo {photo['id']} from {source}")
+                    progress.update("restored")
+    finally:
+        await database.disconnect()
+    progress.report()
 
 
 if __name__ == "__main__":
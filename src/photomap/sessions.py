@@ -0,0 +1,152 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import secrets
+import time
+from types import ModuleType
+
+from aiohttp import web
+from aiohttp_session import AbstractStorage, Session
+from aiohttp_session.redis_storage import RedisStorage
+from redis.asyncio import Redis
+
+try:
+    from cryptography import fernet
+except ImportError:
+    fernet = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationList:
+    """
+    Revoked session ids kept in Redis (expiring together with the sessions), lookups are cached in process for a few
+    seconds so that most authenticated requests do not reach Redis
+    """
+
+    def __init__(self, red: Redis, prefix: str = "photomap", max_age: int = 14 * 86400, ttl: float = 30.0) -> None:
+        """
+        :param red: redis instance
+        :param prefix: key prefix (namespace)
+        :param max_age: session lifetime (seconds), revocations are kept for as long
+        :param ttl: how long a lookup result is trusted (seconds), i.e. the delay until other processes see a logout
+        """
+        self.red = red
+        self.prefix = f"{prefix}:revoked:"
+        self.max_age = max_age
+        self.ttl = ttl
+        self.checked: dict[str, tuple[float, bool]] = {}  # session id -> (expiry, revoked)
+        self.max_entries = 10000
+
+    async def is_revoked(self, sid: str) -> bool:
+        """
+        Check if session was revoked
+        :param sid: session id
+        :return: True if the session was revoked (logged out)
+        """
+        now = time.monotonic()
+        entry = self.checked.get(sid)
+        if entry and entry[0] > now:
+            return entry[1]
+        revoked = bool(await self.red.exists(self.prefix + sid))
+        if len(self.checked) >= self.max_entries:
+            self.checked = {key: value for key, value in self.checked.items() if value[0] > now}
+            if len(self.checked) >= self.max_entries:
+                self.checked.clear()
+        self.checked[sid] = (now + self.ttl, revoked)
+        return revoked
+
+    async def revoke(self, sid: str) -> None:
+        """
+        Revoke session (immediately in this process, after at most ttl seconds in the others)
+        :param sid: session id
+        """
+        await self.red.set(self.prefix + sid, b"1", ex=self.max_age)
+        self.checked[sid] = (time.monotonic() + self.max_age, True)
+
+
+class RevocableCookieStorage(AbstractStorage):
+    """
+    Encrypted and signed (Fernet) cookie session storage: session data travels with the request so loading it needs no
+    network round trip, every session gets a random id which is revoked on logout (see RevocationList)
+    """
+
+    def __init__(
+        self,
+        secret: str,
+        revocations: RevocationList,
+        cookie_name: str = "AIOHTTP_SESSION",
+        secure: bool | None = None,
+        samesite: str | None = None,
+    ) -> None:
+        """
+        :param secret: application secret, the encryption key is derived from it
+        :param revocations: revoked sessions (their max_age is the session lifetime)
+        :param cookie_name: session cookie name
+        :param secure: flag to only send the cookie over HTTPS
+        :param samesite: cookie SameSite attribute
+        """
+        if fernet is None:
+            raise RuntimeError("cookie sessions need the cryptography package")
+        if not secret:
+            raise ValueError("cookie sessions need a SECRET")
+        super().__init__(cookie_name=cookie_name, max_age=revocations.max_age, secure=secure, samesite=samesite)
+        key = hashlib.sha256(f"photomap session:{secret}".encode()).digest()
+        self.fernet = fernet.Fernet(base64.urlsafe_b64encode(key))
+        self.revocations = revocations
+
+    def new(self) -> Session:
+        """
+        Create empty session
+        :return: new session
+        """
+        return Session(None, data=None, new=True, max_age=self.max_age)
+
+    async def load_session(self, request: web.Request) -> Session:
+        cookie = self.load_cookie(request)
+        if cookie is None:
+            return self.new()
+        try:
+            data = json.loads(self.fernet.decrypt(cookie.encode(), ttl=self.max_age))
+        except (fernet.InvalidToken, ValueError):
+            logger.warning("cannot decrypt session cookie, creating a new session")
+            return self.new()
+        sid = data.get("session", {}).get("sid") if isinstance(data, dict) else None
+        if not sid or await self.revocations.is_revoked(sid):
+            return self.new()
+        return Session(sid, data=data, new=False, max_age=self.max_age)
+
+    async def save_session(self, request: web.Request, response: web.StreamResponse, session: Session) -> None:
+        if session.empty:
+            if session.identity:
+                await self.revocations.revoke(session.identity)
+            self.save_cookie(response, "", max_age=session.max_age)
+            return
+        if "sid" not in session:
+            session["sid"] = secrets.token_urlsafe(16)
+        cookie = self.fernet.encrypt(json.dumps(self._get_session_data(session)).encode())
+        self.save_cookie(response, cookie.decode(), max_age=session.max_age)
+
+
+def make_storage(config: ModuleType, red: Redis) -> AbstractStorage:
+    """
+    Create session storage for the configured SESSION_BACKEND
+    :param config: settings module
+    :param red: redis instance
+    :return: session storage
+    """
+    if config.SESSION_BACKEND == "cookie":
+        revocations = RevocationList(
+            red, prefix=config.CACHE_PREFIX, max_age=config.SESSION_MAX_AGE, ttl=config.SESSION_REVOCATION_TTL
+        )
+        return RevocableCookieStorage(config.SECRET, revocations)
+    if config.SESSION_BACKEND != "redis":
+        logger.warning("session backend %s not available, using redis", config.SESSION_BACKEND)
+    return RedisStorage(red, max_age=config.SESSION_MAX_AGE)
@@ -20,17 +20,52 @@ POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "password")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "127.0.0.1")
 POSTGRES_PORT = int(os.getenv("POSTGRES_PORT", "5432"))
 POSTGRES_DB = os.getenv("POSTGRES_DB", "photomap")
+SLOW_QUERY_THRESHOLD = float(os.getenv("SLOW_QUERY_THRESHOLD", "0.2"))  # log statements slower than this (seconds)
 
 # REDIS settings
 REDIS_HOST = "127.0.0.1"
 REDIS_PORT = 6379
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "password")
 
+# cache settings
+CACHE_PREFIX = "photomap"
+CACHE_VERSION = 1  # bump to ignore all previously cached values
+CACHE_SERIALIZER = os.getenv("CACHE_SERIALIZER", "orjson")  # pickle, orjson or msgpack
+CACHE_COMPRESS_MIN_SIZE = 16 * 1024  # compress cached values larger than this (bytes), None to disable
+CACHE_TTL = 24 * 3600  # default cache TTL (seconds)
+MAP_CACHE_TTL = 3600  # TTL for geotagged photos cached per date range (seconds)
+
 # Google Login
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "client_id")
 
 # media settings
 MEDIA_PATH = os.getenv("MEDIA_PATH", "/media/data/work/photomap/media")
+UPLOAD_TMP_PATH = os.path.join(MEDIA_PATH, "tmp")  # uploads are spooled here while being received
+UPLOAD_CHUNK_SIZE = 64 * 1024  # bytes read from the request body at once
+UPLOAD_MAX_SIZE = 64 * 1000 * 1000  # largest uploaded file (photo or GPX track) accepted (bytes)
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", str(os.cpu_count() or 4)))  # process pool size
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "64"))  # tasks waiting for a worker before rejecting
+
+# thumbnail settings
+THUMBNAIL_RESOLUTIONS = [960, 192, 64]  # px, each size is derived from the next larger one
+THUMBNAIL_OPTIONS = {"quality": 75, "optimize": False, "progressive": False}  # JPEG save options
+THUMBNAIL_FORMATS = {  # extra variants (if supported by Pillow) with their save options, best first
+    "avif": {"quality": 50, "speed": 8},
+    "webp": {"quality": 70, "method": 4},
+}
+
+# GPX geotagging settings
+GEOTAG_MAX_GAP = 300  # default maximum time distance between a photo and the track data (seconds)
 
 # Secret
 SECRET = os.getenv("SECRET", "")
+
+# session settings
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "redis")  # redis or cookie (encrypted, needs cryptography and SECRET)
+SESSION_MAX_AGE = 14 * 86400  # session lifetime (seconds)
+SESSION_REVOCATION_TTL = 30  # cookie sessions: seconds a logout may take to reach the other processes
+
+# map clustering settings
+CLUSTER_MAX_ZOOM = 16  # above this zoom level all photos are returned individually
+CLUSTER_CELL_SIZE = 64  # cluster grid cell size (px)
+CLUSTER_MIN_POINTS = 4  # cells with fewer photos are returned as individual photos
@@ -0,0 +1,77 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+
+from aiohttp import BodyPartReader
+
+logger = logging.getLogger(__name__)
+
+
+class TooLarge(Exception):
+    """
+    Raised when a body part is larger than allowed
+    """
+
+    def __init__(self, max_size: int) -> None:
+        super().__init__(f"file too large (more than {max_size} bytes)")
+        self.max_size = max_size
+
+
+@dataclass
+class SpooledFile:
+    """
+    Uploaded file written to disk while being received
+    """
+
+    path: str
+    ihash: str
+    size: int
+
+    def remove(self) -> None:
+        """
+        Remove spooled file from disk (if it still exists)
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def spool_part(part: BodyPartReader, directory: str, chunk_size: int, max_size: int | None = None) -> SpooledFile:
+    """
+    Write multipart body part to a temporary file chunk by chunk, computing the SHA-1 on the fly (multipart bodies
+    are streamed so the application client_max_size does not apply, max_size limits each part instead)
+    :param part: multipart body part to read
+    :param directory: folder to create the temporary file in
+    :param chunk_size: number of bytes to read at once
+    :param max_size: largest accepted part size (bytes), None for no limit
+    :return: spooled file details
+    :raise TooLarge: if the part is larger than max_size (the partial file is removed)
+    """
+    os.makedirs(directory, exist_ok=True)
+    loop = asyncio.get_running_loop()
+    sha1 = hashlib.sha1()
+    size = 0
+    handle, path = tempfile.mkstemp(dir=directory, prefix="upload-")
+    try:
+        with os.fdopen(handle, "wb") as output:
+            while chunk := await part.read_chunk(chunk_size):
+                sha1.update(chunk)
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise TooLarge(max_size)
+                await loop.run_in_executor(None, output.write, chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    logger.debug("spooled %d bytes to %s", size, path)
+    return SpooledFile(path=path, ihash=sha1.hexdigest(), size=size)
@@ -1,4 +1,6 @@
 let map = null;
+let nextCursor = null;  // keyset cursor of the next photo list page
+const PAGE_SIZE = 30;
 
 function allowDrop(ev) {
 	ev.preventDefault();
@@ -10,46 +12,70 @@ function drag(ev) {
 }
 
 function handleDrop(ev) {
-	let photoId = ev.dataTransfer.getData("id");
-	let hashId =  ev.dataTransfer.getData("hash");
+	let dragged = document.getElementById(ev.dataTransfer.getData("id"));
 	let coordinates = map.containerPointToLatLng(L.point([ev.clientX, ev.clientY]));
-	let marker = L.marker(coordinates, {icon: L.icon({iconUrl: document.getElementById(photoId).src}), draggable: true});
-	marker.addTo(map);
+	// dropping one of the selected photos (ctrl / shift + click) places the whole selection
+	let photos = dragged.classList.contains("selected") ?
+		Array.from(document.querySelectorAll(".photo-list-item.selected")) : [dragged];
+	let locations = photos.map(img => ({"id": img.id, "hash": img.dataset.hash, "lat": coordinates.lat, "lng": coordinates.lng}));
 	let url = new URL("/geotag", window.location.origin);
-	url.search = new URLSearchParams({"op": "update_location"}).toString();
-	let postData = {"id": photoId, "hash": hashId, "lat": coordinates.lat, "lng": coordinates.lng};
+	url.search = new URLSearchParams({"op": "update_locations"}).toString();
 	let headers = {"Content-Type": "application/json"};
-	fetch(url, {method: 'POST', headers: headers, body: JSON.stringify(postData)})
+	fetch(url, {method: 'POST', headers: headers, body: JSON.stringify({"locations": locations})})
 	.then(response => response.json())
 	.then(data => {
-		if (data.status === "ok")
-		    document.getElementById(photoId).remove();
-		else
-		    alert("Error: " + JSON.stringify(data));
+		if (data.status !== "ok") {
+			alert("Error: " + JSON.stringify(data));
+			return;
+		}
+		let failed = [];
+		for (const result of data.results) {
+			let img = document.getElementById(result.id);
+			if (result.status !== "ok") {
+				failed.push(result);
+				continue;
+			}
+			L.marker(coordinates, {icon: L.icon({iconUrl: img.src}), draggable: true}).addTo(map);
+			img.remove();
+		}
+		if (failed.length)
+			alert("Error: " + JSON.stringify(failed));
 	});
 }
 
 function filterPhotos(){
+	document.getElementById("photoList").innerHTML = "";
+	nextCursor = null;
+	loadPhotos();
+}
+
+function loadPhotos(){
 	let url = new URL("/geotag", window.location.origin);
 	let data = {
 		"op": "get_photo_list",
 		"album_filter": document.getElementById("album").value,
 		"start_filter": document.getElementById("startDate").value,
-		"stop_filter": document.getElementById("endDate").value
+		"stop_filter": document.getElementById("endDate").value,
+		"page_size": PAGE_SIZE
 	}
+	if (nextCursor)
+		data["after"] = nextCursor;
 	url.search = new URLSearchParams(data).toString();
 	fetch(url, {method: "GET"})
 	.then(response => response.json())
-	.then(photos => {
+	.then(data => {
 		let photoList = document.getElementById("photoList");
-		photoList.innerHTML = "";
+		let photos = data.photos;
 		for ( let i = 0; i < photos.length; i++) {
 			let photo = photos[i];
 			let img = document.createElement("img");
 			img.classList.add("photo-list-item");
 			img.draggable = true;
-			img.onclick = function () {
-				showImage(photo);
+			img.onclick = function (event) {
+				if (event.ctrlKey || event.shiftKey)
+					img.classList.toggle("selected");
+				else
+					showImage(photo);
 			};
 			img.src = "/media/thumbnails/64px/" + photo.ihash[0] + "/" + photo.ihash[1] + "/" + photo.ihash;
 			img.id = photo.id;
@@ -59,6 +85,38 @@ function filterPhotos(){
 			img.dataset.hash = photo.ihash;
 			photoList.appendChild(img);
 		}
+		nextCursor = data.next;
+		document.getElementById("morePhotos").hidden = !nextCursor;
+	});
+}
+
+function matchTracks(){
+	let url = new URL("/geotag", window.location.origin);
+	let params = {
+		"op": "match_tracks",
+		"offset": Math.round(parseFloat(document.getElementById("trackOffset").value || "0") * 3600),
+		"max_gap": Math.round(parseFloat(document.getElementById("trackMaxGap").value || "5") * 60),
+		"dry_run": document.getElementById("trackDryRun").checked ? "1" : "0"
+	}
+	url.search = new URLSearchParams(params).toString();
+	let form = new FormData();
+	for (const file of document.getElementById("trackFiles").files)
+		form.append("track", file, file.name);
+	let result = document.getElementById("tracksResult");
+	result.innerText = "matching photos...";
+	fetch(url, {method: "POST", body: form})
+	.then(response => response.json())
+	.then(data => {
+		if (data.status !== "ok") {
+			result.innerText = "Error: " + data.details;
+			return;
+		}
+		result.innerText = `${data.points} track points, ${data.photos.length} of ${data.candidates} photos matched, ` +
+			`${data.updated} updated`;
+		for (const photo of data.photos)
+			L.circleMarker([photo.lat, photo.lng], {radius: 4}).addTo(map);
+		if (data.updated)
+			filterPhotos();
 	});
 }
 
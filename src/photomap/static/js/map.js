@@ -37,150 +37,130 @@ function showGallery() {
 	myModal.show();
 }
 
-function filterPhotos() {
-    if (map.getSource("photos")) {
-        if (map.getLayer("cluster-count"))
-            map.removeLayer("cluster-count");
-        map.removeLayer("unclustered-photos");
-        map.removeLayer("photos");
-        map.removeSource("photos");
-    }
-    bounds = new maplibregl.LngLatBounds();
-    let startDate = document.getElementById("startDate");
-    let endDate = document.getElementById("endDate");
-    const params = new URLSearchParams();
-    params.append("op", "photos");
-    params.append("start_dt", startDate.value);
-    params.append("end_dt", endDate.value);
-    fetch(`/map?${params}`).then(function (response) {
-        return response.json()
-    }).then(function (photos) {
-        geoData = {"type": "FeatureCollection", "features": []};
-        photos.forEach((photo) => {
-            let iconUrl = "/media/thumbnails/64px/" + photo.ihash[0] + "/" + photo.ihash[1] + "/" + photo.ihash;
-            bounds.extend([photo.lng, photo.lat]);
-            geoData.features.push({
-                "type": "Feature",
-                "properties": {"id": photo.id, "title": photo.filename, "icon": iconUrl},
-                "geometry": {"type": "Point", "coordinates": [ photo.lng, photo.lat]}
-            });
-        });
-        map.addSource("photos", {
-            type: "geojson",
-            data: geoData,
-            cluster: true,
-            clusterMaxZoom: 16, // Max zoom to cluster points on
-            clusterRadius: 50 // Radius of each cluster when clustering points (defaults to 50)
-        });
-        map.addLayer({
-            id: "photos",
-            type: "circle",
-            source: "photos",
-            filter: ["has", "point_count"],
-            paint: {
-                // Use step expressions (https://maplibre.org/maplibre-style-spec/#expressions-step)
-                // with three steps to implement three types of circles:
-                //   * Blue, 20px circles when point count is less than 100
-                //   * Yellow, 30px circles when point count is between 100 and 750
-                //   * Pink, 40px circles when point count is greater than or equal to 750
-                "circle-color": [
-                    "step",
-                    ["get", "point_count"],
-                    "#51bbd6",
-                    100,
-                    "#f1f075",
-                    750,
-                    "#f28cb1"
-                ],
-                "circle-radius": [
-                    "step",
-                    ["get", "point_count"],
-                    20,
-                    100,
-                    30,
-                    750,
-                    40
-                ]
-            }
-        });
+function thumbnailUrl(ihash, size) {
+    return `/media/thumbnails/${size}px/` + ihash[0] + "/" + ihash[1] + "/" + ihash;
+}
 
-        map.addLayer({
-            id: "unclustered-photos",
-            type: "symbol",
-            source: "photos",
-            filter: ["!", ["has", "point_count"]],
-            layout: {
-              "icon-image": ["get", "icon"], // the name of that image that you added
-              "icon-size": 0.8, // Size of the icon
-              "icon-allow-overlap": true,
-            },
-        });
+function abbreviateCount(count) {
+    if (count >= 10000)
+        return Math.round(count / 1000) + "k";
+    if (count >= 1000)
+        return (count / 1000).toFixed(1) + "k";
+    return count.toString();
+}
 
-        map.addLayer({
-            id: "cluster-count",
-            type: "symbol",
-            source: "photos",
-            filter: ["has", "point_count"],
-            layout: {
-                "text-field": "{point_count_abbreviated}",
-                "text-font": ["Noto Sans Regular"],
-                "text-size": 12
-            }
-        });
+function addPhotoLayers() {
+    map.addSource("photos", {
+        type: "geojson",
+        data: {"type": "FeatureCollection", "features": []}
+    });
+    map.addLayer({
+        id: "photos",
+        type: "circle",
+        source: "photos",
+        filter: ["has", "point_count"],
+        paint: {
+            // Use step expressions (https://maplibre.org/maplibre-style-spec/#expressions-step)
+            // with three steps to implement three types of circles:
+            //   * Blue, 20px circles when point count is less than 100
+            //   * Yellow, 30px circles when point count is between 100 and 750
+            //   * Pink, 40px circles when point count is greater than or equal to 750
+            "circle-color": [
+                "step",
+                ["get", "point_count"],
+                "#51bbd6",
+                100,
+                "#f1f075",
+                750,
+                "#f28cb1"
+            ],
+            "circle-radius": [
+                "step",
+                ["get", "point_count"],
+                20,
+                100,
+                30,
+                750,
+                40
+            ]
+        }
+    });
 
-        map.on("click", "photos", async (e) => {
-            const features = map.queryRenderedFeatures(e.point, {
-                layers: ["photos"]
-            });
-            const clusterId = features[0].properties.cluster_id;
-            const zoom = await map.getSource("photos").getClusterExpansionZoom(clusterId);
-            map.easeTo({
-                center: features[0].geometry.coordinates,
-                zoom
-            });
+    map.addLayer({
+        id: "unclustered-photos",
+        type: "symbol",
+        source: "photos",
+        filter: ["!", ["has", "point_count"]],
+        layout: {
+          "icon-image": ["get", "icon"], // the name of that image that you added
+          "icon-size": 0.8, // Size of the icon
+          "icon-allow-overlap": true,
+        },
+    });
+
+    map.addLayer({
+        id: "cluster-count",
+        type: "symbol",
+        source: "photos",
+        filter: ["has", "point_count"],
+        layout: {
+            "text-field": "{point_count_abbreviated}",
+            "text-font": ["Noto Sans Regular"],
+            "text-size": 12
+        }
+    });
+
+    map.on("click", "photos", async (e) => {
+        const features = map.queryRenderedFeatures(e.point, {
+            layers: ["photos"]
+        });
+        map.easeTo({
+            center: features[0].geometry.coordinates,
+            zoom: map.getZoom() + 2
         });
+    });
 
-        map.on("click", "unclustered-photos", (e) => {
-            const feature = e.features[0];
-            const coordinates = feature.geometry.coordinates.slice();
-            let urlParams = new URLSearchParams({"photo_id": feature.properties.id});
-            fetch(`/photo?${urlParams}`, {method: "GET"})
-                .then(response => response.json())
-                .then(data => {
-                    if (data.status === "ok") {
-                        popup.setLngLat(coordinates).setDOMContent(generateInfoWindowContent(data.photo));
-                        let img = document.createElement("img");
-                        img.classList.add("rounded");
-                        img.style.cursor = "pointer";
-                        img.style.transform = "scale(0.75, 0.75)";
-                        img.onclick = function () {
-                            showImage(data.photo);
-                        };
-                        // if (data.photo.orientation != 1)
-                        // 	img.style.transform = getRotation(data.photo.orientation);
-                        img.src = "/media/thumbnails/192px/" + data.photo.ihash[0] + "/" + data.photo.ihash[1] + "/" + data.photo.ihash;
-                        popup.addTo(map);
-                        let popupImg = document.getElementById("popupImg");
-                        popupImg.appendChild(img);
-                        let sw = document.createElement("div");
-                        sw.innerHTML = '<div class="form-check form-switch">\n' +
-                            '  <input class="form-check-input" type="checkbox" role="switch" id="flexSwitchCheckDefault" />\n' +
-                            '  <label class="form-check-label" for="flexSwitchCheckDefault">Move</label>\n' +
-                            "</div>";
+    map.on("click", "unclustered-photos", (e) => {
+        const feature = e.features[0];
+        const coordinates = feature.geometry.coordinates.slice();
+        let urlParams = new URLSearchParams({"photo_id": feature.properties.id});
+        fetch(`/photo?${urlParams}`, {method: "GET"})
+            .then(response => response.json())
+            .then(data => {
+                if (data.status === "ok") {
+                    popup.setLngLat(coordinates).setDOMContent(generateInfoWindowContent(data.photo));
+                    let img = document.createElement("img");
+                    img.classList.add("rounded");
+                    img.style.cursor = "pointer";
+                    img.style.transform = "scale(0.75, 0.75)";
+                    img.onclick = function () {
+                        showImage(data.photo);
+                    };
+                    // if (data.photo.orientation != 1)
+                    // 	img.style.transform = getRotation(data.photo.orientation);
+                    img.src = "/media/thumbnails/192px/" + data.photo.ihash[0] + "/" + data.photo.ihash[1] + "/" + data.photo.ihash;
+                    popup.addTo(map);
+                    let popupImg = document.getElementById("popupImg");
+                    popupImg.appendChild(img);
+                    let sw = document.createElement("div");
+                    sw.innerHTML = '<div class="form-check form-switch">\n' +
+                        '  <input class="form-check-input" type="checkbox" role="switch" id="flexSwitchCheckDefault" />\n' +
+                        '  <label class="form-check-label" for="flexSwitchCheckDefault">Move</label>\n' +
+                        "</div>";
 //                        if (marker.dragging.enabled())
-                        sw.getElementsByTagName("input")[0].checked = true;
+                    sw.getElementsByTagName("input")[0].checked = true;
 //                        sw.onclick = function () {
 //                            if (marker.dragging.enabled())
 //                                marker.dragging.disable();
 //                            else
 //                                marker.dragging.enable();
 //                        }
-                        let actionsSpan = document.getElementById("actions");
-                        actionsSpan.appendChild(sw);
-                    } else
-                        alert("Error: " + JSON.stringify(data));
-                })
-            });
+                    let actionsSpan = document.getElementById("actions");
+                    actionsSpan.appendChild(sw);
+                } else
+                    alert("Error: " + JSON.stringify(data));
+            })
+        });
 
 //                marker.on("dragend", function (e) {
 //                    let position = marker.getLatLng();
@@ -199,16 +179,64 @@ function filterPhotos() {
 //                });
 //            });
 //        };
-        map.on("styleimagemissing", async(e) => {
-            if (loadedImages.has(e.id))
-                return;
-            loadedImages.add(e.id);
-            const image = await map.loadImage(e.id);
-            map.addImage(e.id, image.data);
+    map.on("styleimagemissing", async(e) => {
+        if (loadedImages.has(e.id))
+            return;
+        loadedImages.add(e.id);
+        const image = await map.loadImage(e.id);
+        map.addImage(e.id, image.data);
+    });
+}
+
+function loadPhotos(fitToPhotos) {
+    // the server aggregates photos into clusters for the requested viewport and zoom level
+    const viewport = map.getBounds();
+    let startDate = document.getElementById("startDate");
+    let endDate = document.getElementById("endDate");
+    const params = new URLSearchParams();
+    params.append("op", "photos");
+    params.append("start_dt", startDate.value);
+    params.append("end_dt", endDate.value);
+    if (fitToPhotos) {
+        params.append("bbox", "-180,-90,180,90");
+        params.append("zoom", "0");
+    } else {
+        params.append("bbox", [viewport.getWest(), viewport.getSouth(), viewport.getEast(), viewport.getNorth()].join(","));
+        params.append("zoom", map.getZoom().toString());
+    }
+    fetch(`/map?${params}`).then(function (response) {
+        return response.json()
+    }).then(function (data) {
+        bounds = new maplibregl.LngLatBounds();
+        geoData = {"type": "FeatureCollection", "features": []};
+        data.clusters.forEach((cluster) => {
+            bounds.extend([cluster.lng, cluster.lat]);
+            geoData.features.push({
+                "type": "Feature",
+                "properties": {
+                    "point_count": cluster.count,
+                    "point_count_abbreviated": abbreviateCount(cluster.count),
+                    "icon": thumbnailUrl(cluster.ihash, 64)
+                },
+                "geometry": {"type": "Point", "coordinates": [cluster.lng, cluster.lat]}
+            });
         });
-        map.fitBounds(bounds);
+        data.photos.forEach((photo) => {
+            bounds.extend([photo.lng, photo.lat]);
+            geoData.features.push({
+                "type": "Feature",
+                "properties": {"id": photo.id, "title": photo.filename, "icon": thumbnailUrl(photo.ihash, 64)},
+                "geometry": {"type": "Point", "coordinates": [photo.lng, photo.lat]}
+            });
+        });
+        map.getSource("photos").setData(geoData);
+        if (fitToPhotos && geoData.features.length)
+            map.fitBounds(bounds);
     });
+}
 
+function filterPhotos() {
+    loadPhotos(true);
 }
 
 function initMap() {
@@ -269,7 +297,14 @@ function initMap() {
     map.addControl(new maplibregl.GlobeControl(), "top-right");
     map.addControl(new maplibregl.NavigationControl());
     popup = new maplibregl.Popup({maxWidth: "480px"});
-    filterPhotos();
+    map.on("load", () => {
+        addPhotoLayers();
+        filterPhotos();
+    });
+    map.on("moveend", () => {
+        if (map.getSource("photos"))
+            loadPhotos(false);
+    });
 }
 
 document.onkeydown = function (e) {
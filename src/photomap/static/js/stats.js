@@ -1,7 +1,3 @@
-let images = [];
-let imagesById = {};
-let cameras = {};
-
 google.load("visualization", "1.1", {packages:["table"]});
 
 function initializeStats() {
@@ -9,8 +5,8 @@ function initializeStats() {
 	url.search = new URLSearchParams({"op": "get_stats"}).toString();
 	fetch(url, {method: 'GET'})
 		.then(response => response.json())
-		.then(images => {
-			imagesById = {};
+		.then(stats => {
+			// aggregates are computed by the server, one row per camera
 			let tableData = new google.visualization.DataTable();
 			tableData.addColumn('string', 'Camera');
 			tableData.addColumn('number', 'Total');
@@ -19,34 +15,13 @@ function initializeStats() {
 			tableData.addColumn('date', 'From');
 			tableData.addColumn('date', 'To');
 			tableData.addColumn('number', 'Size [MB]');
-			for ( let i = 0; i < images.length; i++) {
-				let image = images[i];
-				imagesById[image.id] = image;
-				let camera = image.make + ' ' + image.model;
-				if (!(camera in cameras)) {
-					cameras[camera] = {'total': 0, 'valid_pos': 0, 'start': 2000000000, 'stop': 0, 'size': 0};
-				}
-				cameras[camera]['total'] += 1;
-				cameras[camera]['size'] += image.size / 1000000;
-				if (image.lat && image.lng) {
-					cameras[camera]['valid_pos'] += 1;
-				};
-				if (image.moment < cameras[camera]['start']) {
-					cameras[camera]['start'] = image.moment;
-				}
-				if (image.moment > cameras[camera]['stop']) {
-					cameras[camera]['stop'] = image.moment;
-				}
-			}
-
-			for (const key in cameras) {
-				let v = cameras[key];
-				let p = v['valid_pos'] / v['total'] * 100;
+			for (const camera of stats.cameras) {
+				let p = camera.geotagged / camera.total * 100;
 				p = parseFloat(p.toFixed(2));
-				let s = parseFloat(v['size'].toFixed(2));
-				let d1 = new Date(v['start'] * 1000);
-				let d2 = new Date(v['stop'] * 1000);
-				tableData.addRow([key, v['total'], v['valid_pos'], p, d1, d2, s]);
+				let s = parseFloat((camera.size / 1000000).toFixed(2));
+				let d1 = new Date(camera.start * 1000);
+				let d2 = new Date(camera.stop * 1000);
+				tableData.addRow([camera.make + ' ' + camera.model, camera.total, camera.geotagged, p, d1, d2, s]);
 			}
 			tableData.sort([{column: 1, desc:true}]);
 			let table = new google.visualization.Table(document.getElementById('tableChart'));
@@ -11,8 +11,9 @@ function formatDatetime(moment){
 function showImage(photo) {
 	let title = `${photo.filename}, taken on ${formatDatetime(new Date(photo.moment * 1000))} with ${photo.make} ${photo.model}`;
 	document.getElementById("photoModalTitle").innerHTML = title;
-	let img = '<img id="dynamicImage" style="max-width: 100%; height: auto" src="/media/thumbnails/960px/'+
-			photo.ihash[0] + '/' + photo.ihash[1] + '/' + photo.ihash + '">';
+	let path = photo.ihash[0] + '/' + photo.ihash[1] + '/' + photo.ihash;
+	let img = '<a href="/media/original/' + path + '" target="_blank">' +
+			'<img id="dynamicImage" style="max-width: 100%; height: auto" src="/media/thumbnails/960px/' + path + '"></a>';
 	document.getElementById("photoModalBody").innerHTML = img;
 	// if (photo.orientation != 1)
 	// 	document.getElementById("dynamicImage").style.transform = getRotation(photo.orientation);
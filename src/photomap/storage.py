@@ -0,0 +1,113 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import errno
+import logging
+import os
+import shutil
+import tempfile
+
+import utils
+
+logger = logging.getLogger(__name__)
+
+
+def blob_path(base_path: str, ihash: str) -> str:
+    """
+    Generate content-addressed file path (same layout as the thumbnails, see utils.generate_path)
+    :param base_path: store folder
+    :param ihash: content hash
+    :return: file path
+    """
+    return os.path.join(utils.generate_path(base_path, ihash), ihash)
+
+
+def fsync_directory(directory: str) -> None:
+    """
+    Persist directory entries (e.g. after a rename)
+    :param directory: folder to sync
+    """
+    handle = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(handle)
+    finally:
+        os.close(handle)
+
+
+class BlobStore:
+    """
+    Content-addressed file store: files are written once (atomically: temporary file, fsync, rename) and named after
+    their SHA-1, so storing the same content twice is a no-op. All methods block, run them in an executor.
+    """
+
+    def __init__(self, base_path: str) -> None:
+        """
+        :param base_path: store folder
+        """
+        self.base_path = base_path
+
+    def path(self, ihash: str) -> str:
+        """
+        Generate file path for hash
+        :param ihash: content hash
+        :return: file path
+        """
+        return blob_path(self.base_path, ihash)
+
+    def __contains__(self, ihash: str) -> bool:
+        return os.path.isfile(self.path(ihash))
+
+    def commit(self, temp_path: str, ihash: str) -> str:
+        """
+        Move a fully written temporary file (e.g. a spooled upload) into the store, without copying it when it is on
+        the same filesystem. The temporary file is gone afterwards.
+        :param temp_path: file to store
+        :param ihash: SHA-1 of the file contents
+        :return: stored file path
+        """
+        path = self.path(ihash)
+        if os.path.isfile(path):
+            os.remove(temp_path)
+            return path
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        with open(temp_path, "rb") as handle:
+            os.fsync(handle.fileno())
+        try:
+            os.replace(temp_path, path)
+        except OSError as exc:
+            if exc.errno != errno.EXDEV:
+                raise
+            self.put_file(temp_path, ihash)  # different filesystem, copy instead
+            os.remove(temp_path)
+            return path
+        fsync_directory(directory)
+        return path
+
+    def put_file(self, source_path: str, ihash: str) -> str:
+        """
+        Copy a file into the store (the source is left in place)
+        :param source_path: file to store
+        :param ihash: SHA-1 of the file contents
+        :return: stored file path
+        """
+        path = self.path(ihash)
+        if os.path.isfile(path):
+            return path
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(handle, "wb") as output, open(source_path, "rb") as source:
+                shutil.copyfileobj(source, output, 1024 * 1024)
+                output.flush()
+                os.fsync(output.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        fsync_directory(directory)
+        return path
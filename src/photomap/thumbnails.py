@@ -0,0 +1,112 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from admission import AdmissionController, Overloaded
+from metrics import Metrics
+from photo import MIME_TYPES, render_thumbnails, thumbnail_formats, thumbnail_path
+
+logger = logging.getLogger(__name__)
+
+
+def negotiate_format(accept: str, formats: list[str]) -> str:
+    """
+    Pick thumbnail format based on the Accept header (formats must be listed explicitly, wildcards mean JPEG)
+    :param accept: Accept header value
+    :param formats: available formats, JPEG first, then best first
+    :return: format name
+    """
+    accepted = set()
+    for item in accept.split(","):
+        mime_type, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(mime_type.strip().lower())
+    for image_format in formats[1:]:
+        if MIME_TYPES[image_format] in accepted:
+            return image_format
+    return "jpeg"
+
+
+class ThumbnailStore:
+    """
+    On-demand thumbnails: existing files are served as they are, missing ones are rendered from the stored original
+    in the process pool. Concurrent requests for the same photo share a single rendering task.
+    """
+
+    def __init__(self, base_path: str, admission: AdmissionController, metrics: Metrics | None = None) -> None:
+        """
+        :param base_path: base path of the media folder
+        :param admission: admission controller to render thumbnails through (shares the process pool with uploads)
+        :param metrics: metrics registry to record rendering durations in
+        """
+        self.base_path = base_path
+        self.admission = admission
+        self.metrics = metrics
+        self.formats = thumbnail_formats()
+        self.inflight: dict[str, asyncio.Future] = {}
+
+    def render(self, ihash: str) -> asyncio.Future:
+        """
+        Start rendering all missing thumbnails for a photo, or join the rendering already in progress
+        :param ihash: photo hash
+        :return: future resolving to False if there is no original for this photo
+        """
+        future = self.inflight.get(ihash)
+        if future is None:
+            start = time.perf_counter()
+            future = asyncio.ensure_future(self.admission.run(render_thumbnails, ihash, self.base_path))
+            self.inflight[ihash] = future
+            future.add_done_callback(lambda done: self._finished(ihash, done, start))
+        return future
+
+    def _finished(self, ihash: str, future: asyncio.Future, start: float) -> None:
+        self.inflight.pop(ihash, None)
+        if not future.cancelled() and isinstance(future.exception(), Overloaded):
+            logger.info("thumbnails for %s not rendered: %s", ihash, future.exception())
+        elif not future.cancelled() and future.exception():
+            logger.warning("cannot render thumbnails for %s: %s", ihash, future.exception())
+        elif self.metrics and not future.cancelled():
+            self.metrics.upload_stages.observe(time.perf_counter() - start, stage="thumbnails")
+
+    def warm(self, ihash: str) -> None:
+        """
+        Render thumbnails in the background (e.g. right after an upload), skipped while the process pool queue is full
+        (they are rendered on demand then)
+        :param ihash: photo hash
+        """
+        self.render(ihash)
+
+    async def get(self, ihash: str, resolution: int, image_format: str = "jpeg") -> str | None:
+        """
+        Retrieve thumbnail file, rendering it if missing
+        :param ihash: photo hash
+        :param resolution: thumbnail size (px)
+        :param image_format: thumbnail format
+        :return: thumbnail file path or None if it cannot be rendered
+        :raise Overloaded: if the process pool queue is full
+        """
+        path = thumbnail_path(self.base_path, resolution, ihash, image_format)
+        if os.path.isfile(path):
+            return path
+        try:
+            await asyncio.shield(self.render(ihash))  # a disconnecting client does not stop the rendering
+        except Overloaded:
+            raise
+        except Exception:  # pylint: disable=broad-exception-caught
+            return None  # already logged by _finished
+        return path if os.path.isfile(path) else None
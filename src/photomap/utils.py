@@ -4,8 +4,11 @@ Created on Sep 11, 2012
 @author: ionut
 """
 
+import hashlib
 import logging
 import os
+import tempfile
+from typing import Any
 
 from PIL import Image as PilImage
 from PIL.Image import Image
@@ -42,21 +45,44 @@ def exif2gps(exif_data: list | None) -> float | None:
     return degree + minute / 60.0 + second / 3600.0
 
 
-def make_thumbnail(image: PilImage, outfile: str, width: int, height: int) -> None:
+def make_thumbnail(image: PilImage, outfile: str | None, width: int, height: int, **options: Any) -> PilImage:
     """
     Create new thumbnail from image
     :param image: input image to create thumbnail from
-    :param outfile: target filename for output
+    :param outfile: target filename for output (None to skip saving)
     :param width: thumbnail width
     :param height: thumbnail height
+    :param options: JPEG save options (quality, optimize etc.)
+    :return: thumbnail image (can be used as input for smaller thumbnails)
     """
     size = (width, height)
+    temp = image.copy()
+    temp.thumbnail(size, PilImage.LANCZOS)
+    if outfile:
+        save_thumbnail(temp, outfile, "JPEG", **options)
+    return temp
+
+
+def save_thumbnail(image: PilImage, outfile: str, image_format: str, **options: Any) -> None:
+    """
+    Save thumbnail image, logging (not raising) errors. The image is written to a temporary file which is then
+    renamed, so a thumbnail being rendered (or failing) is never visible under its final name.
+    :param image: thumbnail image
+    :param outfile: target filename
+    :param image_format: Pillow format name (JPEG, WEBP, AVIF)
+    :param options: format specific save options
+    """
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(outfile) or ".", prefix=".tmp-")
     try:
-        temp = image.copy()
-        temp.thumbnail(size, PilImage.LANCZOS)
-        temp.save(outfile, "JPEG")
+        with os.fdopen(handle, "wb") as output:
+            image.save(output, image_format, **options)
+        os.replace(temp_path, outfile)
     except IOError as exc:
-        logger.error("cannot create thumbnail for %s: %s", image.filename, exc)
+        os.remove(temp_path)
+        logger.error("cannot create thumbnail %s: %s", outfile, exc)
+    except BaseException:
+        os.remove(temp_path)
+        raise
 
 
 def rotate_image(filename: str, degrees: int) -> None:
@@ -81,6 +107,19 @@ def generate_path(base_path: str, ihash: str) -> str:
     return path
 
 
+def hash_file(file_path: str) -> str:
+    """
+    Compute SHA-1 (photo i-hash) of a file, reading it in chunks
+    :param file_path: file to hash
+    :return: hex digest
+    """
+    sha1 = hashlib.sha1()
+    with open(file_path, "rb") as file_handle:
+        while chunk := file_handle.read(1024 * 1024):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
 def main() -> None:
     """
     Test make thumbnail
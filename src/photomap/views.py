@@ -6,20 +6,27 @@ Created on May 24, 2016
 
 import asyncio
 import datetime
-import hashlib
 import logging
+import math
+import time
 from functools import partial
 from typing import Any, Callable
+from xml.parsers.expat import ExpatError
 
 import aiohttp_jinja2
-from aiohttp import web
+import asyncpg
+from aiohttp import BodyPartReader, web
 from aiohttp.web_fileresponse import FileResponse
 from aiohttp_session import get_session, new_session
 
-import cache
 import database
 import security
-from photo import load_image, make_thumbnails, parse_exif
+from admission import Overloaded, Reservation
+from gpx import load_tracks, match_photos
+from indexes import from_epoch, to_epoch
+from photo import MIME_TYPES, detect_mime_type, ingest
+from spool import SpooledFile, TooLarge, spool_part
+from thumbnails import negotiate_format
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +39,12 @@ class BaseView(web.View):
         self.config = self.request.app.config
         self.database = self.request.app.database
         self.cache = self.request.app.cache
+        self.cluster_index = self.request.app.cluster_index
+        self.hash_index = self.request.app.hash_index
+        self.thumbnails = self.request.app.thumbnails
+        self.originals = self.request.app.originals
+        self.admission = self.request.app.admission
+        self.metrics = self.request.app.metrics
 
     @staticmethod
     def authenticated(func: Callable) -> Callable:
@@ -119,16 +132,35 @@ class Map(BaseView):
     @BaseView.authenticated
     async def get(self) -> web.Response:
         if self.request.query.get("op") == "photos":
-            # photos = await cache.get_value(self.cache, "geotagged_photos")
-            # if not photos:
             start_dt = datetime.datetime.strptime(self.request.query.get("start_dt"), "%Y-%m-%d").date()
             end_dt = datetime.datetime.strptime(self.request.query.get("end_dt"), "%Y-%m-%d").date()
-            photos = await self.database.get_geotagged_photos(start_dt, end_dt)
-            photos = [dict(photo) for photo in photos]
-            # await cache.set_value(self.cache, "geotagged_photos", photos)
+            if "bbox" in self.request.query:
+                try:
+                    west, south, east, north = [float(value) for value in self.request.query["bbox"].split(",")]
+                    zoom = float(self.request.query.get("zoom", "0"))
+                except ValueError:
+                    return web.json_response({"status": "error", "details": "bbox and/or zoom invalid"}, status=400)
+                result = self.cluster_index.query(
+                    (west, south, east, north), zoom, to_epoch(start_dt), to_epoch(end_dt)
+                )
+                return web.json_response(result)
+            generation = await self.cache.generation("photos")
+            key = f"geotagged_photos:{generation}:{start_dt}:{end_dt}"
+            factory = partial(self.get_geotagged_photos, start_dt, end_dt)
+            photos = await self.cache.get_or_set(key, factory, ttl=self.config.MAP_CACHE_TTL)
             return web.json_response(photos)
         return aiohttp_jinja2.render_template("map.html", self.request, context={"session": self.session})
 
+    async def get_geotagged_photos(self, start_dt: datetime.date, end_dt: datetime.date) -> list[dict]:
+        """
+        Retrieve geotagged photos in the date range as JSON serializable objects
+        :param start_dt: start date
+        :param end_dt: end date
+        :return: list of photos
+        """
+        photos = await self.database.get_geotagged_photos(start_dt, end_dt)
+        return [dict(photo) for photo in photos]
+
 
 class Geo(BaseView):
     """
@@ -139,10 +171,19 @@ class Geo(BaseView):
     async def get(self) -> web.Response:
         op = self.request.query.get("op")
         if op == "get_photo_list":
-            start_dt = datetime.datetime.strptime(self.request.query.get("start_filter", "2020-12-01"), "%Y-%m-%d")
-            stop_dt = datetime.datetime.strptime(self.request.query.get("stop_filter", "2021-12-01"), "%Y-%m-%d")
-            photos = await self.database.get_photos_nogps(start_dt, stop_dt)
-            return web.json_response([dict(photo) for photo in photos])
+            try:
+                start_dt = datetime.datetime.strptime(self.request.query.get("start_filter", "2020-12-01"), "%Y-%m-%d")
+                stop_dt = datetime.datetime.strptime(self.request.query.get("stop_filter", "2021-12-01"), "%Y-%m-%d")
+                page_size = max(min(int(self.request.query.get("page_size", "30")), 500), 1)
+                after = None
+                if "after" in self.request.query:  # cursor: <epoch moment>:<photo id> of the previous page last photo
+                    moment, photo_id = self.request.query["after"].split(":")
+                    after = (from_epoch(int(moment)), int(photo_id))
+            except ValueError:
+                return web.json_response({"status": "error", "details": "filters and/or cursor invalid"}, status=400)
+            photos = await self.database.get_photos_nogps(start_dt, stop_dt, after, page_size)
+            next_cursor = f"{photos[-1]['moment']}:{photos[-1]['id']}" if len(photos) == page_size else None
+            return web.json_response({"photos": [dict(photo) for photo in photos], "next": next_cursor})
         return aiohttp_jinja2.render_template("geotag.html", self.request, context={"session": self.session})
 
     @BaseView.authenticated
@@ -159,16 +200,145 @@ class Geo(BaseView):
                 return web.json_response({"status": "error", "details": "lat and/or lng invalid"}, status=400)
             response = await self.database.update_photo_location(photo_id, ihash, lat, lng)
             if response:
-                await cache.del_value(self.cache, "geotagged_photos")
-                await cache.del_value(self.cache, "stats")
+                self.cluster_index.add(photo_id, ihash, lat, lng, response["moment"])
+                await self.cache.bump("photos")
                 return web.json_response({"status": "ok", "details": "photo location updated successfully"})
             return web.json_response({"status": "error", "details": "photo location not updated"}, status=400)
+        if op == "update_locations":
+            return await self.update_locations()
+        if op == "match_tracks":
+            return await self.match_tracks()
         return web.json_response({"status": "error", "details": "unknown operation"}, status=400)
 
+    async def update_locations(self) -> web.Response:
+        """
+        Update the location of several photos (JSON {"locations": [{"id", "hash", "lat", "lng"}, ...]}) with a single
+        statement, caches are invalidated once for the whole batch
+        :return: web response with a status for every location, in request order
+        """
+        try:
+            data = await self.request.json()
+        except ValueError:
+            data = None
+        items = data.get("locations") if isinstance(data, dict) else None
+        if not isinstance(items, list) or not 0 < len(items) <= 10000:
+            return web.json_response({"status": "error", "details": "provide 1 to 10000 locations"}, status=400)
+        results: list[dict] = []
+        locations: dict[int, tuple[int, str, float, float]] = {}
+        for item in items:
+            try:
+                photo_id, ihash = item["id"], str(item["hash"])
+                if isinstance(photo_id, bool) or not isinstance(photo_id, int) or not 0 < photo_id < 2**31:
+                    raise ValueError("not a photo id")  # a single out of range id would fail the whole statement
+                if any(isinstance(item[field], bool) for field in ("lat", "lng")):
+                    raise ValueError("not a coordinate")
+                lat, lng = float(item["lat"]), float(item["lng"])
+                if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                    raise ValueError("out of range")
+            except (KeyError, TypeError, ValueError):
+                photo_id = item.get("id") if isinstance(item, dict) else None
+                results.append({"id": photo_id, "status": "error", "details": "id, hash, lat and/or lng invalid"})
+                continue
+            results.append({"id": photo_id, "status": "ok"})
+            locations[photo_id] = (photo_id, ihash, lat, lng)  # the last location of a repeated photo wins
+        photos = await self.database.update_photo_locations(list(locations.values())) if locations else []
+        updated = {photo["id"]: photo for photo in photos}
+        for result in results:
+            if result["status"] != "ok":
+                continue
+            if result["id"] not in updated:
+                result.update({"status": "error", "details": "photo not found or hash mismatch"})
+        for photo in updated.values():
+            self.cluster_index.add(photo["id"], photo["ihash"], photo["lat"], photo["lng"], photo["moment"])
+        if updated:
+            await self.cache.bump("photos")
+        return web.json_response({"status": "ok", "updated": len(updated), "results": results})
+
+    async def match_tracks(self) -> web.Response:
+        """
+        Geotag photos without location from uploaded GPX tracks (multipart "track" parts): photo moments are located
+        on the track by binary search and linear interpolation (see gpx.Track.locate) and all matches are saved with
+        a single statement. Query arguments: offset (camera clock minus UTC, seconds), max_gap (seconds) and
+        dry_run=1 to only report the matches.
+        :return: web response with the matched photo locations
+        """
+        try:
+            offset = float(self.request.query.get("offset", "0"))
+            max_gap = float(self.request.query.get("max_gap", str(self.config.GEOTAG_MAX_GAP)))
+            if not (abs(offset) <= 86400 and 0 <= max_gap <= 366 * 86400):  # also rejects nan
+                raise ValueError("out of range")
+        except ValueError:
+            return web.json_response(
+                {"status": "error", "details": "offset (up to a day) and/or max_gap (up to a year) invalid"}, status=400
+            )
+        dry_run = self.request.query.get("dry_run") == "1"
+        try:
+            with self.admission.admit(2) as reservation:  # tracks are parsed and matched in the process pool
+                return await self.match_uploaded_tracks(offset, max_gap, dry_run, reservation)
+        except Overloaded as exc:
+            return web.json_response(
+                {"status": "error", "details": str(exc)}, status=503, headers={"Retry-After": str(exc.retry_after)}
+            )
+
+    async def match_uploaded_tracks(
+        self, offset: float, max_gap: float, dry_run: bool, reservation: Reservation
+    ) -> web.Response:
+        """
+        Receive, parse and match GPX tracks (see match_tracks)
+        :param offset: camera clock offset from UTC (seconds)
+        :param max_gap: maximum time distance to the track data (seconds)
+        :param dry_run: flag to only report the matches
+        :param reservation: process pool room reserved for parsing and matching
+        :return: web response with the matched photo locations
+        """
+        tracks: list[SpooledFile] = []
+        reader = await self.request.multipart()
+        try:
+            async for part in reader:
+                if part.name == "track":
+                    tracks.append(
+                        await spool_part(
+                            part,
+                            self.config.UPLOAD_TMP_PATH,
+                            self.config.UPLOAD_CHUNK_SIZE,
+                            self.config.UPLOAD_MAX_SIZE,
+                        )
+                    )
+            if not tracks:
+                return web.json_response({"status": "error", "details": "no track provided"}, status=400)
+            track = await reservation.run(partial(load_tracks, [spooled.path for spooled in tracks]))
+        except ExpatError as exc:
+            return web.json_response({"status": "error", "details": f"invalid GPX file: {exc}"}, status=400)
+        except TooLarge as exc:
+            return web.json_response({"status": "error", "details": str(exc)}, status=413)
+        finally:
+            for spooled in tracks:
+                spooled.remove()
+        if not track:
+            return web.json_response({"status": "error", "details": "no timestamped track points found"}, status=400)
+        start = from_epoch(math.floor(track.times[0] + offset - max_gap))  # photo moments are in camera time
+        stop = from_epoch(math.ceil(track.times[-1] + offset + max_gap))
+        photos = [tuple(photo) for photo in await self.database.get_untagged_photos(start, stop)]
+        matches = await reservation.run(partial(match_photos, track, photos, offset, max_gap))
+        updated = await self.database.update_photo_locations(matches) if matches and not dry_run else []
+        for photo in updated:
+            self.cluster_index.add(photo["id"], photo["ihash"], photo["lat"], photo["lng"], photo["moment"])
+        if updated:
+            await self.cache.bump("photos")
+        return web.json_response(
+            {
+                "status": "ok",
+                "points": len(track),
+                "candidates": len(photos),
+                "updated": len(updated),
+                "photos": [{"id": photo_id, "lat": lat, "lng": lng} for photo_id, _, lat, lng in matches],
+            }
+        )
+
 
 class Photo(BaseView):
     """
-    View for retrieving photo details
+    View for retrieving and deleting photo details
     """
 
     @BaseView.authenticated
@@ -181,6 +351,24 @@ class Photo(BaseView):
             return web.json_response({"status": "error", "details": "no photo found for this ID"}, status=404)
         return web.json_response({"status": "ok", "photo": dict(photo)})
 
+    @BaseView.authenticated
+    async def delete(self) -> web.Response:
+        """
+        Delete photo details, keeping the in-memory indexes in sync (the original and thumbnails stay on disk, a new
+        upload of the same photo reuses them)
+        :return: web response
+        """
+        photo_id = self.request.query.get("photo_id")
+        if not photo_id or not photo_id.isdigit():
+            return web.json_response({"status": "error", "details": "provide photo_id"}, status=400)
+        ihash = await self.database.delete_photo(int(photo_id))
+        if not ihash:
+            return web.json_response({"status": "error", "details": "no photo found for this ID"}, status=404)
+        self.hash_index.discard(ihash)
+        self.cluster_index.remove(int(photo_id))
+        await self.cache.bump("photos")
+        return web.json_response({"status": "ok", "details": "photo deleted"})
+
 
 class Upload(BaseView):
     """
@@ -189,6 +377,8 @@ class Upload(BaseView):
 
     @BaseView.authenticated
     async def get(self) -> web.Response:
+        if self.request.query.get("op") == "status":
+            return web.json_response({"status": "ok", "queue": self.admission.stats()})
         return aiohttp_jinja2.render_template("upload.html", self.request, context={"session": self.session})
 
     @BaseView.authenticated
@@ -196,23 +386,106 @@ class Upload(BaseView):
         secret = self.request.headers.get("Authentication", "")
         if secret != self.config.SECRET:
             return web.json_response({"status": "error", "details": "invalid secret value"}, status=403)
-        # TODO: use local cache for photo data
-        all_photo_ihash = await self.database.get_all_ihash()
-        hashes = {photo["ihash"] for photo in all_photo_ihash}
-        data = await self.request.post()
-        fileinfo = data["photo"]
-        filename = data["filename"]
-        file_body = fileinfo.file.read()
-        sha1 = hashlib.sha1()
-        sha1.update(file_body)
-        ihash = sha1.hexdigest()
-        if ihash in hashes:
-            logger.debug("photo %s, %s already imported", ihash, filename)
-            return web.json_response({"status": "error", "details": "photo hash already exists"}, status=409)
-        loop = asyncio.get_running_loop()
-        executor = self.request.app.executor
-        exif_data = await loop.run_in_executor(executor, partial(parse_exif, file_body))
-        photo = database.Photo(
+        op = self.request.query.get("op")
+        if op == "check_hashes":
+            return await self.check_hashes()
+        try:
+            with self.admission.admit() as reservation:  # reject before receiving the photos
+                if op == "batch":
+                    return await self.post_batch(reservation)
+                return await self.post_photo(reservation)
+        except TooLarge as exc:
+            return web.json_response({"status": "error", "details": str(exc)}, status=413)
+        except Overloaded as exc:
+            logger.info("rejecting upload: %s", exc)
+            return web.json_response(
+                {"status": "error", "details": str(exc), "queue": self.admission.stats()},
+                status=503,
+                headers={"Retry-After": str(exc.retry_after)},
+            )
+
+    async def post_photo(self, reservation: Reservation) -> web.Response:
+        """
+        Handle a single photo (multipart "photo" part with an optional "filename" part)
+        :param reservation: process pool room reserved for the request
+        :return: web response
+        """
+        filename, spooled = None, None
+        reader = await self.request.multipart()
+        try:
+            async for part in reader:
+                if part.name == "photo":
+                    spooled = await self.receive(part)
+                    filename = filename or part.filename
+                elif part.name == "filename":
+                    filename = await part.text()
+            if not spooled:
+                return web.json_response({"status": "error", "details": "no photo provided"}, status=400)
+            return await self.save_upload(spooled, filename or spooled.ihash, reservation)
+        finally:
+            if spooled:
+                spooled.remove()
+
+    async def receive(self, part: BodyPartReader) -> SpooledFile:
+        """
+        Spool uploaded photo to disk (see spool_part)
+        :param part: multipart "photo" part
+        :return: spooled file
+        :raise TooLarge: if the photo is larger than UPLOAD_MAX_SIZE
+        """
+        start = time.perf_counter()
+        spooled = await spool_part(
+            part, self.config.UPLOAD_TMP_PATH, self.config.UPLOAD_CHUNK_SIZE, self.config.UPLOAD_MAX_SIZE
+        )
+        self.metrics.upload_stages.observe(time.perf_counter() - start, stage="receive")
+        return spooled
+
+    async def check_hashes(self) -> web.Response:
+        """
+        Report which of the provided i-hashes are not imported yet (so clients only upload new photos)
+        :return: web response with the missing hashes
+        """
+        data = await self.request.json()
+        hashes = data.get("hashes")
+        if not isinstance(hashes, list) or len(hashes) > 10000 or not all(isinstance(h, str) for h in hashes):
+            return web.json_response({"status": "error", "details": "provide a list of up to 10000 hashes"}, status=400)
+        missing = [ihash for ihash in hashes if ihash not in self.hash_index.hashes]  # pending uploads may still fail
+        return web.json_response({"status": "ok", "missing": missing})
+
+    async def post_batch(self, reservation: Reservation) -> web.Response:
+        """
+        Handle several photos (multipart "photo" parts, each with its own filename) in a single request
+        :param reservation: process pool room reserved for the request, extended for every further photo
+        :return: web response with a status for every uploaded file
+        :raise Overloaded: if the queue fills up while receiving the photos
+        """
+        uploads: list[tuple[SpooledFile, str]] = []
+        reader = await self.request.multipart()
+        try:
+            async for part in reader:
+                if part.name == "photo":
+                    if uploads:
+                        reservation.extend()  # every file is a process pool task
+                    spooled = await self.receive(part)
+                    uploads.append((spooled, part.filename or spooled.ihash))
+            if not uploads:
+                return web.json_response({"status": "error", "details": "no photo provided"}, status=400)
+            results = await self.save_uploads(uploads, reservation)
+            return web.json_response({"status": "ok", "results": results})
+        finally:
+            for spooled, _ in uploads:
+                spooled.remove()
+
+    @staticmethod
+    def make_photo(exif_data: dict, ihash: str, filename: str) -> database.Photo:
+        """
+        Create photo object from the metadata returned by ingest
+        :param exif_data: photo metadata
+        :param ihash: photo hash
+        :param filename: original filename
+        :return: photo object (without camera)
+        """
+        return database.Photo(
             photo_id=None,
             camera=None,
             ihash=ihash,
@@ -230,31 +503,216 @@ class Upload(BaseView):
             access=1,
             orientation=exif_data["orientation"],
         )
-        image_file = await loop.run_in_executor(executor, partial(load_image, file_body, photo))
-        if photo.width is None:
-            photo.width = image_file.width
-        if photo.height is None:
-            photo.height = image_file.height
+
+    async def get_camera_dict(self) -> dict:
+        """
+        Retrieve existing cameras indexed by make and model
+        :return: camera dictionary
+        """
         cameras = await self.database.get_cameras()
-        camera_dict = {}
-        for camera in cameras:
-            camera_dict[camera[1] + "_" + camera[2]] = camera
-        if exif_data["camera_make"] or exif_data["camera_model"]:
-            key = exif_data["camera_make"] + "_" + exif_data["camera_model"]
-            if key in camera_dict:
-                photo.camera = camera_dict[key]["id"]
+        return {camera["make"] + "_" + camera["model"]: camera for camera in cameras}
+
+    async def get_camera_id(self, exif_data: dict, camera_dict: dict) -> int | None:
+        """
+        Find camera ID for photo metadata, creating the camera if needed
+        :param exif_data: photo metadata
+        :param camera_dict: existing cameras (see get_camera_dict), updated with new cameras
+        :return: camera ID or None if the photo has no camera details
+        """
+        if not exif_data["camera_make"] and not exif_data["camera_model"]:
+            return None
+        key = exif_data["camera_make"] + "_" + exif_data["camera_model"]
+        if key not in camera_dict:
+            camera = database.Camera(camera_id=None, make=exif_data["camera_make"], model=exif_data["camera_model"])
+            camera_dict[key] = await self.database.save_camera(camera)
+        return camera_dict[key]["id"]
+
+    async def save_upload(self, spooled: SpooledFile, filename: str, reservation: Reservation) -> web.Response:
+        """
+        Parse the spooled upload metadata (worker task), save photo details to the database and keep the original.
+        Thumbnails are rendered in the background (and on demand, see Thumbnail).
+        :param spooled: uploaded file written to disk
+        :param filename: original filename
+        :param reservation: process pool room reserved for the request
+        :return: web response
+        """
+        ihash = spooled.ihash
+        if not self.hash_index.reserve(ihash):
+            logger.debug("photo %s, %s already imported", ihash, filename)
+            return web.json_response({"status": "error", "details": "photo hash already exists"}, status=409)
+        known = False
+        try:
+            exif_data = await reservation.run(
+                partial(ingest, spooled.path, ihash, self.config.MEDIA_PATH, thumbnails=False)
+            )
+            start = time.perf_counter()
+            photo = self.make_photo(exif_data, ihash, filename)
+            photo.camera = await self.get_camera_id(exif_data, await self.get_camera_dict())
+            try:
+                result = await self.database.save_photo(photo)
+            except asyncpg.UniqueViolationError:
+                known = True
+                logger.debug("photo %s, %s already imported", ihash, filename)
+                return web.json_response({"status": "error", "details": "photo hash already exists"}, status=409)
+            known = True
+            photo_id = int(result["id"])
+            timings = exif_data["timings"]
+            timings["database"] = time.perf_counter() - start
+            timings["store"] = await self.store_original(spooled)
+            if photo.lat is not None and photo.lng is not None:
+                self.cluster_index.add(photo_id, ihash, photo.lat, photo.lng, to_epoch(photo.moment))
+            await self.cache.bump("photos")
+            for stage, duration in timings.items():
+                self.metrics.upload_stages.observe(duration, stage=stage)
+            logger.debug("photo %s, %s imported: %s", ihash, filename, timings)
+            return web.json_response({"status": "ok", "message": f"photo saved, id {photo_id}", "timings": timings})
+        finally:
+            self.hash_index.release(ihash, known)
+
+    async def store_original(self, spooled: SpooledFile) -> float:
+        """
+        Move spooled upload to the originals store and start rendering its thumbnails in the background
+        :param spooled: uploaded file written to disk
+        :return: time spent storing the file (seconds)
+        """
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.originals.commit, spooled.path, spooled.ihash)
+        self.thumbnails.warm(spooled.ihash)
+        return time.perf_counter() - start
+
+    async def save_uploads(self, uploads: list[tuple[SpooledFile, str]], reservation: Reservation) -> list[dict]:
+        """
+        Parse spooled uploads in parallel, then save all new photos with a single insert and keep their originals
+        :param uploads: uploaded files written to disk with their original filenames
+        :param reservation: process pool room reserved for the uploads
+        :return: status for every upload
+        """
+        results = [{"filename": filename, "ihash": spooled.ihash} for spooled, filename in uploads]
+        pending = []
+        for (spooled, _), result in zip(uploads, results):
+            if self.hash_index.reserve(spooled.ihash):
+                pending.append((spooled, result))
             else:
-                camera = database.Camera(camera_id=None, make=exif_data["camera_make"], model=exif_data["camera_model"])
-                result = await self.database.save_camera(camera)
-                photo.camera = result["id"]
-        else:
-            photo.camera = None
-        result = await self.database.save_photo(photo)
-        photo_id = int(result["id"])
-        await loop.run_in_executor(executor, partial(make_thumbnails, image_file, photo, self.config.MEDIA_PATH))
-        await cache.del_value(self.cache, "geotagged_photos")
-        await cache.del_value(self.cache, "stats")
-        return web.json_response({"status": "ok", "message": f"photo saved, id {photo_id}"})
+                result.update({"status": "duplicate", "details": "photo hash already exists"})
+        known: set[str] = set()
+        try:
+            tasks = [
+                reservation.run(partial(ingest, spooled.path, spooled.ihash, self.config.MEDIA_PATH, thumbnails=False))
+                for spooled, _ in pending
+            ]
+            metadata = await asyncio.gather(*tasks, return_exceptions=True)
+            camera_dict = await self.get_camera_dict()
+            photos = []
+            for (spooled, result), exif_data in zip(pending, metadata):
+                try:
+                    if isinstance(exif_data, BaseException):
+                        raise exif_data
+                    photo = self.make_photo(exif_data, spooled.ihash, result["filename"])
+                    photo.camera = await self.get_camera_id(exif_data, camera_dict)
+                    self.metrics.upload_stages.observe(exif_data["timings"]["exif"], stage="exif")
+                except Exception as exc:  # pylint: disable=broad-exception-caught
+                    logger.warning("cannot import photo %s: %s", result["filename"], exc)
+                    result.update({"status": "error", "details": str(exc)})
+                    continue
+                photos.append((photo, result))
+            start = time.perf_counter()
+            photo_ids = await self.database.save_photos([photo for photo, _ in photos])
+            self.metrics.upload_stages.observe(time.perf_counter() - start, stage="database")
+            spooled_files = {spooled.ihash: spooled for spooled, _ in pending}
+            for photo, result in photos:
+                known.add(photo.ihash)
+                if photo.ihash not in photo_ids:
+                    result.update({"status": "duplicate", "details": "photo hash already exists"})
+                    continue
+                duration = await self.store_original(spooled_files[photo.ihash])
+                self.metrics.upload_stages.observe(duration, stage="store")
+                result.update({"status": "ok", "id": photo_ids[photo.ihash]})
+                if photo.lat is not None and photo.lng is not None:
+                    self.cluster_index.add(
+                        photo_ids[photo.ihash], photo.ihash, photo.lat, photo.lng, to_epoch(photo.moment)
+                    )
+            if photo_ids:
+                await self.cache.bump("photos")
+        finally:
+            for spooled, _ in pending:
+                self.hash_index.release(spooled.ihash, spooled.ihash in known)
+        logger.info("batch upload: %d files, %d new photos", len(uploads), len(photo_ids))
+        return results
+
+
+class Thumbnail(BaseView):
+    """
+    Serve photo thumbnails in the best format accepted by the client, rendering missing ones from the original photo
+    """
+
+    async def get(self) -> web.StreamResponse:
+        ihash = self.request.match_info["ihash"]
+        resolution = int(self.request.match_info["resolution"])
+        match_info = self.request.match_info
+        if resolution not in self.config.THUMBNAIL_RESOLUTIONS or (match_info["a"], match_info["b"]) != tuple(
+            ihash[:2]
+        ):
+            raise web.HTTPNotFound()
+        image_format = negotiate_format(self.request.headers.get("Accept", ""), self.thumbnails.formats)
+        try:
+            path = await self.thumbnails.get(ihash, resolution, image_format)
+            if not path and image_format != "jpeg":
+                image_format = "jpeg"
+                path = await self.thumbnails.get(ihash, resolution, image_format)
+        except Overloaded as exc:
+            return web.json_response(
+                {"status": "error", "details": str(exc)}, status=503, headers={"Retry-After": str(exc.retry_after)}
+            )
+        if not path:
+            raise web.HTTPNotFound()
+        headers = {"Content-Type": MIME_TYPES[image_format], "Cache-Control": "max-age=31536000", "Vary": "Accept"}
+        return FileResponse(path, headers=headers)
+
+
+class Original(BaseView):
+    """
+    Serve original photos (zero-copy via sendfile, with Range and conditional request support)
+    """
+
+    @BaseView.authenticated
+    async def get(self) -> web.StreamResponse:
+        ihash = self.request.match_info["ihash"]
+        match_info = self.request.match_info
+        if (match_info["a"], match_info["b"]) != tuple(ihash[:2]) or ihash not in self.originals:
+            raise web.HTTPNotFound()
+        path = self.originals.path(ihash)
+        headers = {"Cache-Control": "private, max-age=31536000, immutable"}
+        mime_type = await asyncio.get_running_loop().run_in_executor(None, detect_mime_type, path)
+        if mime_type:  # otherwise FileResponse falls back to a generic type
+            headers["Content-Type"] = mime_type
+        return FileResponse(path, headers=headers)
+
+
+class Metrics(BaseView):
+    """
+    Expose application metrics in the Prometheus text format
+    """
+
+    async def get(self) -> web.Response:
+        return web.Response(
+            body=self.metrics.render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+
+class Queries(BaseView):
+    """
+    Debug view listing the slowest database statements with their query plans
+    """
+
+    @BaseView.authenticated
+    async def get(self) -> web.Response:
+        limit = self.request.query.get("limit", "10")
+        if not limit.isdigit():
+            return web.json_response({"status": "error", "details": "invalid limit"}, status=400)
+        explain = self.request.query.get("explain", "1") != "0"
+        queries = await self.database.get_slow_queries(min(int(limit), 100), explain)
+        return web.json_response({"status": "ok", "queries": queries})
 
 
 class Stats(BaseView):
@@ -266,12 +724,18 @@ class Stats(BaseView):
     async def get(self) -> web.Response:
         op = self.request.query.get("op")
         if op == "get_stats":
-            stats = await cache.get_value(self.cache, "stats")
-            if not stats:
-                stats = await self.database.get_stats()
-                stats = [dict(stat) for stat in stats]
-                await cache.set_value(self.cache, "stats", stats)
+            generation = await self.cache.generation("photos")
+            stats = await self.cache.get_or_set(f"stats:{generation}", self.database.get_stats)
             return web.json_response(stats)
+        if op == "get_photos":
+            try:
+                after_id = int(self.request.query.get("after", "0"))
+                page_size = max(min(int(self.request.query.get("page_size", "1000")), 10000), 1)
+            except ValueError:
+                return web.json_response({"status": "error", "details": "after and/or page_size invalid"}, status=400)
+            photos = await self.database.get_photo_page(after_id, page_size)
+            next_id = photos[-1]["id"] if len(photos) == page_size else None
+            return web.json_response({"photos": [dict(photo) for photo in photos], "next": next_id})
         return aiohttp_jinja2.render_template("stats.html", self.request, context={"session": self.session})
 
 
@@ -5,11 +5,14 @@ Created on 2023-01-07
 """
 
 import asyncio
+from typing import Generator
 
 import aiohttp.web
 import pytest
 from aiohttp.test_utils import TestClient
 
+import settings
+from database import Database
 from main import make_app
 
 pytest_plugins = "aiohttp.pytest_plugin"  # pylint: disable=invalid-name
@@ -25,3 +28,23 @@ def photomap_app(loop: asyncio.AbstractEventLoop, aiohttp_client: TestClient) ->
     """
     app = make_app()
     return loop.run_until_complete(aiohttp_client(app))
+
+
+@pytest.fixture
+def photomap_db(loop: asyncio.AbstractEventLoop) -> Generator[Database, None, None]:
+    """
+    Create connected Database instance to be used in tests
+    :param loop: asyncio loop
+    :return: database instance
+    """
+    database = Database(
+        settings.POSTGRES_USER,
+        settings.POSTGRES_PASSWORD,
+        settings.POSTGRES_HOST,
+        settings.POSTGRES_PORT,
+        settings.POSTGRES_DB,
+    )
+    loop.run_until_complete(database.connect())
+    loop.run_until_complete(database.create_structure())
+    yield database
+    loop.run_until_complete(database.disconnect())
@@ -0,0 +1,57 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, Overloaded
+
+
+async def test_admission_bounds_work() -> None:
+    """Test that at most `workers` tasks run at once and new work is rejected while the queue is full"""
+    admission = AdmissionController(None, workers=2, max_queue=3)
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def work() -> None:
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+
+    tasks = [asyncio.ensure_future(admission.run(work)) for _ in range(5)]
+    await asyncio.sleep(0.005)
+    assert admission.running == 2 and admission.waiting == 3
+    with pytest.raises(Overloaded) as exc_info:
+        admission.admit()
+    assert exc_info.value.retry_after >= 1
+    with pytest.raises(Overloaded):
+        await admission.run(work)  # work not reserved with admit is bounded as well
+    await asyncio.gather(*tasks)
+    admission.admit().close()  # queue drained
+    stats = admission.stats()
+    assert peak[0] == 2
+    assert stats["completed"] == 5 and stats["rejected"] == 2 and stats["reserved"] == 0
+    assert stats["wait_max"] > 0
+
+
+async def test_admission_reservations() -> None:
+    """Test that admitted requests hold their queue room until they run their tasks or finish"""
+    admission = AdmissionController(None, workers=1, max_queue=3)
+    with admission.admit() as first, admission.admit() as second:
+        second.extend()
+        with pytest.raises(Overloaded):
+            first.extend()  # e.g. one more file of a batch upload
+        with pytest.raises(Overloaded):
+            admission.admit()
+        assert await first.run(sum, [1, 2]) == 3
+        assert admission.reserved == 2
+    assert admission.reserved == 0 and admission.stats()["rejected"] == 2
@@ -0,0 +1,81 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import asyncio
+
+from cache import Cache
+
+
+class FakeRedis:
+    """Minimal in-memory stand-in for the redis client methods used by Cache"""
+
+    def __init__(self) -> None:
+        self.data: dict[str, bytes] = {}
+        self.expiry: dict[str, int | None] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        """Return stored value"""
+        return self.data.get(key)
+
+    async def set(self, key: str, value: bytes, ex: int | None = None) -> None:
+        """Store value, remembering its TTL"""
+        self.data[key] = value
+        self.expiry[key] = ex
+
+    async def delete(self, *keys: str) -> None:
+        """Remove keys"""
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def incr(self, key: str) -> int:
+        """Increment integer value"""
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode()
+        return int(self.data[key])
+
+
+async def test_cache_roundtrip() -> None:
+    """Test namespacing, TTLs and compression"""
+    red = FakeRedis()
+    store = Cache(red, prefix="test", version=2, serializer="orjson", compress_min_size=64, ttl=60)  # type: ignore
+    value = {"cameras": [{"make": "Canon", "total": i} for i in range(100)]}
+    await store.set("stats", value)
+    assert red.data["test:2:stats"][:1] == b"z"
+    assert red.expiry["test:2:stats"] == 60
+    assert await store.get("stats") == value
+    await store.set("small", [1, 2], ttl=5)
+    assert red.data["test:2:small"][:1] == b"r"
+    assert red.expiry["test:2:small"] == 5
+    await store.delete("stats", "small")
+    assert not red.data
+
+
+async def test_cache_single_flight() -> None:
+    """Test that concurrent misses for the same key call the factory only once"""
+    store = Cache(FakeRedis(), serializer="pickle")  # type: ignore[arg-type]
+    calls = []
+
+    async def factory() -> dict:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"total": 42}
+
+    results = await asyncio.gather(*[store.get_or_set("stats", factory) for _ in range(10)])
+    assert results == [{"total": 42}] * 10
+    assert len(calls) == 1
+    assert await store.get_or_set("stats", factory) == {"total": 42}
+    assert len(calls) == 1
+    assert not store.inflight
+
+
+async def test_cache_generation() -> None:
+    """Test that bumping the generation makes previously built keys miss"""
+    store = Cache(FakeRedis())  # type: ignore[arg-type]
+    generation = await store.generation("photos")
+    assert generation == 0
+    await store.set(f"geotagged_photos:{generation}:2020-01-01:2021-01-01", [{"id": 1}])
+    assert await store.bump("photos") == 1
+    generation = await store.generation("photos")
+    assert await store.get(f"geotagged_photos:{generation}:2020-01-01:2021-01-01") is None
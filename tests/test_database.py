@@ -0,0 +1,73 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import datetime
+
+from database import Database, QueryStats, redact
+
+
+async def test_photos_in_bbox(photomap_db: Database) -> None:
+    """Test that bounding box queries only return photos inside the box"""
+    bbox = (20.0, 44.0, 30.0, 48.5)  # Romania
+    start, stop = datetime.datetime(2010, 1, 1), datetime.datetime(2030, 1, 1)
+    photos = await photomap_db.get_photos_in_bbox(bbox, start, stop, 100)
+    assert 0 < len(photos) <= 100
+    for photo in photos:
+        assert 20.0 <= photo["lng"] <= 30.0
+        assert 44.0 <= photo["lat"] <= 48.5
+    assert [photo["moment"] for photo in photos] == sorted(photo["moment"] for photo in photos)
+
+
+async def test_photos_in_bbox_uses_index(photomap_db: Database) -> None:
+    """Test that the bounding box query is planned with the GiST location index"""
+    args = (21.0, 45.5, 21.5, 46.0, datetime.datetime(2010, 1, 1), datetime.datetime(2030, 1, 1), 100)
+    async with photomap_db.pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            for antimeridian in (False, True):
+                plan = await conn.fetch("EXPLAIN " + photomap_db.bbox_query(antimeridian), *args)
+                assert "photo_location_idx" in "\n".join(row[0] for row in plan)
+
+
+async def test_photos_nogps_uses_index(photomap_db: Database) -> None:
+    """Test that geotag queue pages are planned with the partial (moment, id) index"""
+    args = (datetime.datetime(2020, 6, 1), 1000, datetime.datetime(2010, 1, 1), datetime.datetime(2030, 1, 1), 30)
+    await photomap_db.get_photos_nogps(args[2], args[3], (args[0], args[1]), args[4])
+    query = next(stats.query for stats in photomap_db.query_stats.values() if stats.method == "get_photos_nogps")
+    async with photomap_db.pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            plan = await conn.fetch("EXPLAIN " + query, *args)
+            assert "photo_nogps_idx" in "\n".join(row[0] for row in plan)
+
+
+async def test_slow_queries(photomap_db: Database) -> None:
+    """Test that statements are timed per calling method and reported with their plans"""
+    await photomap_db.get_cameras()
+    await photomap_db.get_photo(1)
+    queries = await photomap_db.get_slow_queries(limit=100)
+    methods = {query["method"]: query for query in queries}
+    assert {"get_cameras", "get_photo"} <= set(methods)
+    assert methods["get_photo"]["count"] >= 1
+    assert methods["get_photo"]["p50"] <= methods["get_photo"]["p95"] <= methods["get_photo"]["max"]
+    assert isinstance(methods["get_photo"]["plan"], list)
+
+
+async def test_iter_photos(photomap_db: Database) -> None:
+    """Test that the server-side cursor returns every photo once, in ID order"""
+    photo_ids = [photo["id"] async for photo in photomap_db.iter_photos(batch_size=7)]
+    assert photo_ids == [row["id"] for row in await photomap_db.fetch("SELECT id FROM photo ORDER BY id")]
+
+
+def test_query_stats() -> None:
+    """Test percentiles over the recent executions and parameter redaction"""
+    stats = QueryStats("get_photo", "SELECT 1", window=100)
+    for duration in range(1, 201):
+        stats.add(duration / 1000, (duration,))
+    assert stats.percentile(0.5) == 0.151  # only the last 100 executions (101-200 ms)
+    assert stats.percentile(0.95) == 0.195
+    assert stats.slowest_args == (200,)
+    assert redact("secret@example.com") == "<str:18>" and redact(None) == "NULL" and redact(42) == "<int>"
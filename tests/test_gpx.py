@@ -0,0 +1,62 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import io
+import pathlib
+
+import pytest
+
+from gpx import Track, load_tracks, match_photos, parse_gpx
+
+GPX = b"""<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">
+  <metadata><time>2021-05-04T00:00:00Z</time></metadata>
+  <trk><trkseg>
+    <trkpt lat="45.70" lon="21.20"><ele>90</ele><time>2021-05-04T10:00:00Z</time></trkpt>
+    <trkpt lat="45.80" lon="21.30"><time>2021-05-04T10:01:40Z</time></trkpt>
+    <trkpt lat="46.00" lon="21.00"></trkpt>
+  </trkseg><trkseg>
+    <trkpt lat="45.00" lon="21.00"><time>2021-05-04T09:00:00.500+00:00</time></trkpt>
+    <trkpt lat="47.00" lon="23.00"><time>2021-05-04T12:00:00Z</time></trkpt>
+  </trkseg></trk>
+</gpx>
+"""
+START = 1620122400  # 2021-05-04 10:00:00 UTC
+
+
+def test_parse_gpx(tmp_path: pathlib.Path) -> None:
+    """Test that timestamped points from all segments are loaded in time order"""
+    track = Track()
+    assert parse_gpx(io.BytesIO(GPX), track) == 4
+    path = tmp_path / "track.gpx"
+    path.write_bytes(GPX)
+    track = load_tracks([str(path)])
+    assert list(track.times) == [START - 3599.5, START, START + 100, START + 7200]
+    assert list(track.lats) == [45.0, 45.7, 45.8, 47.0]
+
+
+def test_locate() -> None:
+    """Test interpolation between close points and the max gap limit"""
+    track = Track()
+    for moment, lat, lng in ((0, 45.0, 21.0), (100, 46.0, 22.0), (10000, 50.0, 20.0)):
+        track.add(moment, lat, lng)
+    assert track.locate(25, 300) == pytest.approx((45.25, 21.25))
+    assert track.locate(100, 300) == (46.0, 22.0)
+    assert track.locate(350, 300) == (46.0, 22.0)  # gap too large to interpolate, nearest point is close enough
+    assert track.locate(5000, 300) is None
+    assert track.locate(-200, 300) == (45.0, 21.0)
+    assert track.locate(10400, 300) is None
+
+
+def test_match_photos() -> None:
+    """Test that the camera clock offset is applied before matching"""
+    track = load_tracks([])
+    track.add(START, 45.7, 21.2)
+    track.add(START + 100, 45.8, 21.3)
+    photos = [(1, "a" * 40, START + 3 * 3600 + 50), (2, "b" * 40, START + 50)]  # camera set to UTC+3
+    matches = match_photos(track, photos, 3 * 3600, 120)
+    assert [(photo_id, ihash) for photo_id, ihash, _, _ in matches] == [(1, "a" * 40)]
+    assert matches[0][2:] == pytest.approx((45.75, 21.25))
@@ -0,0 +1,72 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import datetime
+
+from indexes import ClusterIndex, HashIndex, to_epoch
+
+
+def make_index() -> ClusterIndex:
+    """Build a small index with a dense group around Timisoara and a single photo in Bucharest"""
+    index = ClusterIndex(max_zoom=16, cell_size=64, min_points=4)
+    moment = to_epoch(datetime.datetime(2023, 6, 1))
+    for i in range(10):
+        index.add(i, f"{i:040x}", 45.75 + i * 0.0001, 21.23 + i * 0.0001, moment + i)
+    index.add(100, "f" * 40, 44.43, 26.10, moment)
+    return index
+
+
+def test_cluster_index_low_zoom() -> None:
+    """Test that dense cells are aggregated and sparse cells are returned as photos"""
+    index = make_index()
+    start, stop = to_epoch(datetime.date(2023, 1, 1)), to_epoch(datetime.date(2024, 1, 1))
+    result = index.query((-180, -90, 180, 90), 5, start, stop)
+    assert len(result["clusters"]) == 1
+    cluster = result["clusters"][0]
+    assert cluster["count"] == 10
+    assert abs(cluster["lat"] - 45.75045) < 1e-6
+    assert cluster["ihash"] == f"{9:040x}"
+    assert [photo["id"] for photo in result["photos"]] == [100]
+
+
+def test_cluster_index_filters() -> None:
+    """Test filtering by date range, bounding box and removal of photos"""
+    index = make_index()
+    start = to_epoch(datetime.date(2023, 1, 1))
+    result = index.query((-180, -90, 180, 90), 5, start, to_epoch(datetime.datetime(2023, 6, 1)) + 2)
+    assert not result["clusters"]
+    assert {photo["id"] for photo in result["photos"]} == {0, 1, 100}
+    result = index.query((25, 44, 27, 45), 8, start, to_epoch(datetime.date(2024, 1, 1)))
+    assert not result["clusters"]
+    assert [photo["id"] for photo in result["photos"]] == [100]
+    index.remove(100)
+    assert len(index) == 10
+    result = index.query((25, 44, 27, 45), 8, start, to_epoch(datetime.date(2024, 1, 1)))
+    assert not result["clusters"] and not result["photos"]
+
+
+def test_cluster_index_max_zoom() -> None:
+    """Test that all photos are returned individually above the maximum cluster zoom"""
+    index = make_index()
+    result = index.query((21, 45, 22, 46), 17, 0, to_epoch(datetime.date(2024, 1, 1)))
+    assert not result["clusters"]
+    assert len(result["photos"]) == 10
+
+
+def test_hash_index() -> None:
+    """Test that known and in-progress hashes are rejected"""
+    index = HashIndex()
+    index.add("a" * 40)
+    assert not index.reserve("a" * 40)
+    assert index.reserve("b" * 40)
+    assert not index.reserve("b" * 40)  # concurrent upload of the same photo
+    index.release("b" * 40, False)
+    assert "b" * 40 not in index
+    assert index.reserve("b" * 40)
+    index.release("b" * 40, True)
+    assert "b" * 40 in index
+    index.discard("a" * 40)
+    assert len(index) == 1
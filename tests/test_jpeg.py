@@ -0,0 +1,79 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import io
+import os
+
+import piexif
+import pytest
+from PIL import Image as PilImage
+
+from jpeg import InvalidJpeg, read_header
+from photo import parse_exif
+
+
+def jpeg_bytes(width: int, height: int, exif: dict | None = None) -> bytes:
+    """
+    Encode a synthetic JPEG with optional EXIF data
+    :param width: image width
+    :param height: image height
+    :param exif: piexif dictionary
+    :return: file content
+    """
+    output = io.BytesIO()
+    image = PilImage.new("RGB", (width, height), (10, 200, 90))
+    if exif is None:
+        image.save(output, "JPEG")
+    else:
+        image.save(output, "JPEG", exif=piexif.dump(exif))
+    return output.getvalue()
+
+
+def test_read_header(tmp_path: str) -> None:
+    """Test that path and buffer sources give the same EXIF segment and frame dimensions"""
+    exif = {"0th": {piexif.ImageIFD.Make: b"Nikon", piexif.ImageIFD.Orientation: 6}, "Exif": {}, "GPS": {}}
+    content = jpeg_bytes(640, 480, exif)
+    path = os.path.join(tmp_path, "photo.jpg")
+    with open(path, "wb") as output:
+        output.write(content)
+    from_path = read_header(path)
+    from_buffer = read_header(memoryview(content))
+    assert (from_path.width, from_path.height) == (from_buffer.width, from_buffer.height) == (640, 480)
+    assert isinstance(from_buffer.exif, memoryview) and from_buffer.exif.obj is content
+    assert bytes(from_path.exif) == bytes(from_buffer.exif)
+    assert piexif.load(bytes(from_path.exif))["0th"][piexif.ImageIFD.Orientation] == 6
+
+
+def test_read_header_stops_at_frame() -> None:
+    """Test that only the header is needed, the entropy coded data is never reached"""
+    content = jpeg_bytes(320, 200)
+    header = read_header(content[: content.index(b"\xff\xda")])  # cut at start of scan
+    assert (header.exif, header.width, header.height) == (None, 320, 200)
+    with pytest.raises(InvalidJpeg):
+        read_header(content[:20])
+    with pytest.raises(InvalidJpeg):
+        read_header(b"\x89PNG\r\n\x1a\n")
+
+
+def test_read_header_truncated(tmp_path: str) -> None:
+    """Test that files ending right after a marker or with an invalid segment length are rejected"""
+    for content in (b"\xff\xd8\xff\xe0", b"\xff\xd8\xff\xe0\x00", b"\xff\xd8\xff\xe0\x00\x01"):
+        path = os.path.join(tmp_path, "truncated.jpg")
+        with open(path, "wb") as output:
+            output.write(content)
+        with pytest.raises(InvalidJpeg):
+            read_header(path)
+        with pytest.raises(InvalidJpeg):
+            read_header(content)
+
+
+def test_parse_exif_dimensions() -> None:
+    """Test that frame dimensions are used when the EXIF pixel dimensions are missing"""
+    exif = {"0th": {piexif.ImageIFD.DateTime: b"2021:05:04 10:11:12"}, "Exif": {}, "GPS": {}}
+    content = jpeg_bytes(300, 500, exif)
+    data = parse_exif(memoryview(content))
+    assert (data["width"], data["height"], data["size"]) == (300, 500, len(content))
+    assert data["moment"].year == 2021 and data["orientation"] == 1
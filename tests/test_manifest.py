@@ -0,0 +1,33 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import pathlib
+
+from manifest import FAILED, HASHED, UPLOADED, Manifest
+
+
+def test_manifest_resume(tmp_path: pathlib.Path) -> None:
+    """Test that hashes and upload statuses survive reopening the manifest"""
+    path = str(tmp_path / "manifest.sqlite")
+    manifest = Manifest(path)
+    manifest.add_hashes([("/a.jpg", 10, 100, "aaa"), ("/b.jpg", 20, 200, "bbb"), ("/c.jpg", 30, 300, "ccc")])
+    manifest.set_status(["/a.jpg"], UPLOADED)
+    manifest.set_status(["/c.jpg"], FAILED)
+    manifest.close()
+
+    known = Manifest(path).load()  # reopened, as after an interrupted run
+    assert known["/a.jpg"] == (10, 100, "aaa", UPLOADED)
+    assert known["/b.jpg"] == (20, 200, "bbb", HASHED)
+    assert known["/c.jpg"] == (30, 300, "ccc", FAILED)
+
+
+def test_manifest_changed_file(tmp_path: pathlib.Path) -> None:
+    """Test that re-hashing a modified file resets its upload status"""
+    manifest = Manifest(str(tmp_path / "manifest.sqlite"))
+    manifest.add_hashes([("/a.jpg", 10, 100, "aaa")])
+    manifest.set_status(["/a.jpg"], UPLOADED)
+    manifest.add_hashes([("/a.jpg", 11, 101, "abc")])  # file modified, re-hashed
+    assert manifest.load()["/a.jpg"] == (11, 101, "abc", HASHED)
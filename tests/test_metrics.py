@@ -0,0 +1,44 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient
+
+from metrics import Histogram, Metrics
+from middlewares import metrics_middleware
+
+
+def test_histogram_render() -> None:
+    """Test cumulative buckets, sum and count in the exposition format"""
+    histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, route="/map")
+    lines = histogram.render()
+    assert lines[:2] == ["# HELP latency_seconds Latency", "# TYPE latency_seconds histogram"]
+    assert 'latency_seconds_bucket{route="/map",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/map",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{route="/map",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{route="/map"} 4.05' in lines
+    assert 'latency_seconds_count{route="/map"} 4' in lines
+
+
+async def test_metrics_middleware(aiohttp_client: TestClient) -> None:
+    """Test that requests are counted per route pattern"""
+
+    async def handler(_: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    app = web.Application(middlewares=[metrics_middleware])
+    app.metrics = Metrics()
+    app.router.add_get("/photo/{photo_id}", handler)
+    client = await aiohttp_client(app)
+    for photo_id in range(3):
+        assert (await client.get(f"/photo/{photo_id}")).status == 200
+    assert (await client.get("/missing")).status == 404
+    text = app.metrics.render()
+    assert 'photomap_http_requests_total{route="/photo/{photo_id}",method="GET",status="200"} 3' in text
+    assert 'photomap_http_requests_total{route="unmatched",method="GET",status="404"} 1' in text
+    assert 'photomap_http_request_duration_seconds_count{route="/photo/{photo_id}",method="GET"} 3' in text
@@ -0,0 +1,88 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import os
+
+import piexif
+from PIL import Image as PilImage
+
+from photo import detect_mime_type, ingest, load_image, make_thumbnails
+from utils import save_thumbnail
+
+
+def make_jpeg(path: str, width: int, height: int, exif: dict | None = None) -> str:
+    """
+    Write a synthetic JPEG with optional EXIF data
+    :param path: output file
+    :param width: image width
+    :param height: image height
+    :param exif: piexif dictionary
+    :return: output file
+    """
+    image = PilImage.new("RGB", (width, height), (120, 60, 200))
+    exif_bytes = piexif.dump(exif or {"0th": {}, "Exif": {}, "GPS": {}})
+    image.save(path, "JPEG", exif=exif_bytes)
+    return path
+
+
+def test_ingest(tmp_path: str) -> None:
+    """Test that ingest returns metadata, timings and writes all thumbnails"""
+    exif = {
+        "0th": {piexif.ImageIFD.Make: b"Canon", piexif.ImageIFD.Model: b"Canon EOS", piexif.ImageIFD.Orientation: 1},
+        "Exif": {},
+        "GPS": {
+            piexif.GPSIFD.GPSLatitudeRef: b"S",
+            piexif.GPSIFD.GPSLatitude: ((45, 1), (30, 1), (0, 1)),
+            piexif.GPSIFD.GPSLongitudeRef: b"E",
+            piexif.GPSIFD.GPSLongitude: ((21, 1), (15, 1), (0, 1)),
+        },
+    }
+    path = make_jpeg(os.path.join(tmp_path, "photo.jpg"), 1200, 800, exif)
+    ihash = "ab" + "0" * 38
+    data = ingest(path, ihash, str(tmp_path))
+    assert (data["width"], data["height"]) == (1200, 800)
+    assert data["camera_make"] == "Canon" and data["camera_model"] == "EOS"
+    assert data["lat"] == -45.5 and data["lng"] == 21.25
+    assert data["gps_ref"] == "SE0"
+    assert set(data["timings"]) == {"exif", "decode", "thumbnails"}
+    for size in (64, 192, 960):
+        thumbnail = os.path.join(tmp_path, "thumbnails", f"{size}px", "a", "b", ihash)
+        with PilImage.open(thumbnail) as image:
+            assert max(image.size) == size
+
+
+def test_make_thumbnails_draft(tmp_path: str) -> None:
+    """Test that JPEGs are decoded at reduced scale and all thumbnail sizes are still exact"""
+    path = make_jpeg(os.path.join(tmp_path, "large.jpg"), 2400, 1600)
+    image = load_image(path, 1, 960)
+    assert image.size == (1200, 800)
+    ihash = "cd" + "0" * 38
+    make_thumbnails(image, ihash, str(tmp_path))
+    for size, expected in ((64, (64, 43)), (192, (192, 128)), (960, (960, 640))):
+        with PilImage.open(os.path.join(tmp_path, "thumbnails", f"{size}px", "c", "d", ihash)) as thumbnail:
+            assert thumbnail.size == expected
+
+
+def test_save_thumbnail_atomic(tmp_path: str) -> None:
+    """Test that thumbnails appear under their final name only when fully written"""
+    outfile = os.path.join(tmp_path, "thumbnail")
+    save_thumbnail(PilImage.new("RGBA", (64, 64)), outfile, "JPEG")  # RGBA cannot be saved as JPEG
+    assert not os.listdir(tmp_path)
+    save_thumbnail(PilImage.new("RGB", (64, 64)), outfile, "JPEG")
+    assert os.listdir(tmp_path) == ["thumbnail"]
+
+
+def test_detect_mime_type(tmp_path: str) -> None:
+    """Test that the MIME type of extension-less originals is detected from their contents"""
+    path = make_jpeg(os.path.join(tmp_path, "0" * 40), 8, 8)
+    assert detect_mime_type(path) == "image/jpeg"
+    path = os.path.join(tmp_path, "1" * 40)
+    PilImage.new("RGB", (8, 8)).save(path, "PNG")
+    assert detect_mime_type(path) == "image/png"
+    path = os.path.join(tmp_path, "2" * 40)
+    with open(path, "wb") as output:
+        output.write(b"not an image")
+    assert detect_mime_type(path) is None
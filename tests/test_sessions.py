@@ -0,0 +1,80 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import pytest
+from aiohttp import web
+from aiohttp.pytest_plugin import AiohttpClient
+from aiohttp_session import get_session, new_session, setup
+
+from sessions import RevocableCookieStorage, RevocationList
+
+
+class FakeRedis:
+    """Minimal in-memory stand-in for the redis client methods used by RevocationList"""
+
+    def __init__(self) -> None:
+        self.data: dict[str, bytes] = {}
+        self.expiry: dict[str, int | None] = {}
+        self.lookups = 0
+
+    async def exists(self, key: str) -> int:
+        """Count lookup and check key"""
+        self.lookups += 1
+        return int(key in self.data)
+
+    async def set(self, key: str, value: bytes, ex: int | None = None) -> None:
+        """Store value, remembering its TTL"""
+        self.data[key] = value
+        self.expiry[key] = ex
+
+
+async def test_revocation_list() -> None:
+    """Test that lookups are cached for the TTL and revocations apply immediately in process"""
+    red = FakeRedis()
+    revocations = RevocationList(red, prefix="test", ttl=60)  # type: ignore[arg-type]
+    assert not await revocations.is_revoked("a")
+    assert not await revocations.is_revoked("a")
+    assert red.lookups == 1
+    await revocations.revoke("a")
+    assert await revocations.is_revoked("a")
+    assert "test:revoked:a" in red.data and red.expiry["test:revoked:a"] == revocations.max_age
+    other = RevocationList(red, prefix="test", ttl=60)  # type: ignore[arg-type]  # another process
+    assert await other.is_revoked("a")
+
+
+async def test_cookie_sessions(aiohttp_client: AiohttpClient) -> None:
+    """Test that cookie sessions are loaded without Redis and rejected after logout"""
+    pytest.importorskip("cryptography")
+
+    async def login(request: web.Request) -> web.Response:
+        session = await new_session(request)
+        session["username"] = "test"
+        return web.Response(text="ok")
+
+    async def whoami(request: web.Request) -> web.Response:
+        session = await get_session(request)
+        return web.Response(text=session.get("username", ""))
+
+    async def logout(request: web.Request) -> web.Response:
+        (await get_session(request)).invalidate()
+        return web.Response(text="ok")
+
+    red = FakeRedis()
+    app = web.Application()
+    setup(app, RevocableCookieStorage("secret", RevocationList(red, ttl=60)))  # type: ignore[arg-type]
+    app.router.add_get("/login", login)
+    app.router.add_get("/whoami", whoami)
+    app.router.add_get("/logout", logout)
+    client = await aiohttp_client(app)
+    await client.get("/login")
+    cookie = client.session.cookie_jar.filter_cookies(client.make_url("/"))["AIOHTTP_SESSION"].value
+    assert "test" not in cookie  # encrypted
+    for _ in range(3):
+        assert await (await client.get("/whoami")).text() == "test"
+    assert red.lookups == 1
+    await client.get("/logout")
+    client.session.cookie_jar.update_cookies({"AIOHTTP_SESSION": cookie})  # replay the old cookie
+    assert await (await client.get("/whoami")).text() == ""
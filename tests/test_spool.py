@@ -0,0 +1,47 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import hashlib
+import os
+import pathlib
+
+from aiohttp import FormData, web
+from aiohttp.pytest_plugin import AiohttpClient
+
+from spool import TooLarge, spool_part
+
+
+async def test_spool_part(aiohttp_client: AiohttpClient, tmp_path: pathlib.Path) -> None:
+    """Test that parts are written to disk with their hash and that too large parts are rejected and removed"""
+    directory = str(tmp_path / "spool")
+
+    async def upload(request: web.Request) -> web.Response:
+        reader = await request.multipart()
+        part = await reader.next()
+        try:
+            spooled = await spool_part(part, directory, chunk_size=64, max_size=1000)  # type: ignore[arg-type]
+        except TooLarge as exc:
+            return web.json_response({"status": "error", "details": str(exc)}, status=413)
+        with open(spooled.path, "rb") as spooled_file:
+            data = spooled_file.read()
+        spooled.remove()
+        return web.json_response({"ihash": spooled.ihash, "size": spooled.size, "data": data.decode()})
+
+    app = web.Application()
+    app.router.add_post("/upload", upload)
+    client = await aiohttp_client(app)
+    payload = b"0123456789" * 100
+    form = FormData()
+    form.add_field("photo", payload, filename="photo.jpg")
+    response = await client.post("/upload", data=form)
+    assert response.status == 200
+    data = await response.json()
+    assert data == {"ihash": hashlib.sha1(payload).hexdigest(), "size": 1000, "data": payload.decode()}
+    form = FormData()
+    form.add_field("photo", payload + b"!", filename="photo.jpg")
+    response = await client.post("/upload", data=form)
+    assert response.status == 413
+    assert not os.listdir(directory)
@@ -0,0 +1,33 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import hashlib
+import os
+
+from storage import BlobStore
+
+
+def test_blob_store(tmp_path: str) -> None:
+    """Test that files are stored once, under their hash, and temporary files are consumed"""
+    store = BlobStore(os.path.join(tmp_path, "original"))
+    content = b"\xff\xd8photo\xff\xd9"
+    ihash = hashlib.sha1(content).hexdigest()
+    spooled = os.path.join(tmp_path, "upload-1")
+    with open(spooled, "wb") as output:
+        output.write(content)
+    path = store.commit(spooled, ihash)
+    assert path == os.path.join(tmp_path, "original", ihash[0], ihash[1], ihash)
+    assert ihash in store and not os.path.exists(spooled)
+    with open(path, "rb") as stored:
+        assert stored.read() == content
+
+    duplicate = os.path.join(tmp_path, "upload-2")
+    with open(duplicate, "wb") as output:
+        output.write(content)
+    assert store.commit(duplicate, ihash) == path
+    assert not os.path.exists(duplicate)
+    assert store.put_file(path, ihash) == path
+    assert os.listdir(os.path.dirname(path)) == [ihash]  # no temporary files left behind
@@ -0,0 +1,55 @@
+"""
+Created on 2026-10-18
+
+@author: iticus
+"""
+
+import asyncio
+import os
+from unittest import mock
+
+from PIL import Image as PilImage
+
+import thumbnails
+from admission import AdmissionController
+from photo import original_path, render_thumbnails, thumbnail_path
+from thumbnails import ThumbnailStore, negotiate_format
+
+
+async def test_thumbnail_store(tmp_path: str) -> None:
+    """Test that missing thumbnails are rendered from the original, once for concurrent requests"""
+    ihash = "cd" + "1" * 38
+    original = original_path(str(tmp_path), ihash)
+    os.makedirs(os.path.dirname(original))
+    PilImage.new("RGB", (1600, 1200), (20, 140, 80)).save(original, "JPEG")
+    store = ThumbnailStore(str(tmp_path), AdmissionController(None, workers=2, max_queue=8))
+    with mock.patch.object(thumbnails, "render_thumbnails", wraps=thumbnails.render_thumbnails) as render:
+        paths = await asyncio.gather(*[store.get(ihash, size) for size in (64, 192, 960, 64)])
+        assert render.call_count == 1
+        assert await store.get(ihash, 192) == paths[1]  # served from disk
+        assert render.call_count == 1
+    assert paths[0] == os.path.join(tmp_path, "thumbnails", "64px", "c", "d", ihash)
+    assert all(os.path.isfile(path) for path in paths)
+    assert not store.inflight
+    assert await store.get("ef" + "2" * 38, 64) is None  # no original
+
+
+def test_negotiate_format() -> None:
+    """Test that explicitly accepted formats are preferred over JPEG"""
+    formats = ["jpeg", "avif", "webp"]
+    assert negotiate_format("image/avif,image/webp,image/apng,*/*;q=0.8", formats) == "avif"
+    assert negotiate_format("image/avif;q=0,image/webp,*/*", formats) == "webp"
+    assert negotiate_format("image/webp,*/*", ["jpeg"]) == "jpeg"
+    assert negotiate_format("*/*", formats) == "jpeg"
+
+
+def test_render_variants_from_thumbnail(tmp_path: str) -> None:
+    """Test that photos without an original get their variants from the largest JPEG thumbnail"""
+    ihash = "ab" + "3" * 38
+    source = thumbnail_path(str(tmp_path), 960, ihash)
+    os.makedirs(os.path.dirname(source))
+    PilImage.new("RGB", (960, 640), (200, 40, 40)).save(source, "JPEG")
+    assert render_thumbnails(ihash, str(tmp_path), formats=["webp"])
+    for size in (64, 192, 960):
+        with PilImage.open(thumbnail_path(str(tmp_path), size, ihash, "webp")) as image:
+            assert image.format == "WEBP" and max(image.size) == size
@@ -4,7 +4,10 @@ Created on 2023-01-07
 @author: iticus
 """
 
-from aiohttp import web
+import os
+
+import pytest
+from aiohttp import FormData, web
 
 
 async def test_homepage(photomap_app: web.Application) -> None:
@@ -43,13 +46,21 @@ async def test_geotag(photomap_app: web.Application) -> None:
 
 async def test_geotag_ajax(photomap_app: web.Application) -> None:
     """Test that the geotag AJAX request returns non tagged images"""
-    params = {"op": "get_photo_list", "start_filter": "2020-01-01", "stop_filter": "2022-01-01"}
+    params = {"op": "get_photo_list", "start_filter": "2020-01-01", "stop_filter": "2022-01-01", "page_size": "30"}
     request = await photomap_app.get("/geotag", params=params)
     assert request.status == 200
     data = await request.json()
-    assert isinstance(data, list)
-    assert len(data) == 30
-    photo = data[0]
+    assert isinstance(data["photos"], list)
+    assert len(data["photos"]) == 30
+    assert data["next"] == f"{data['photos'][-1]['moment']}:{data['photos'][-1]['id']}"
+    request = await photomap_app.get("/geotag", params={**params, "after": data["next"]})
+    assert request.status == 200
+    next_page = await request.json()
+    assert not {photo["id"] for photo in data["photos"]} & {photo["id"] for photo in next_page["photos"]}
+    assert all(photo["moment"] >= data["photos"][-1]["moment"] for photo in next_page["photos"])
+    request = await photomap_app.get("/geotag", params={**params, "after": "not-a-cursor"})
+    assert request.status == 400
+    photo = data["photos"][0]
     assert "height" in photo
     assert "width" in photo
     assert "lat" not in photo
@@ -58,6 +69,139 @@ async def test_geotag_ajax(photomap_app: web.Application) -> None:
     assert isinstance(photo["model"], str) or photo["model"] is None
 
 
+async def test_geotag_tracks(photomap_app: web.Application) -> None:
+    """Test that GPX tracks are matched against untagged photos (dry run, nothing is updated)"""
+    track = b"""<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>
+        <trkpt lat="45.75" lon="21.22"><time>2021-01-01T00:00:00Z</time></trkpt>
+        <trkpt lat="45.76" lon="21.23"><time>2021-12-31T23:59:59Z</time></trkpt>
+        </trkseg></trk></gpx>"""
+    form = FormData()
+    form.add_field("track", track, filename="track.gpx")
+    params = {"op": "match_tracks", "max_gap": str(366 * 86400), "dry_run": "1"}
+    request = await photomap_app.post("/geotag", params=params, data=form)
+    assert request.status == 200
+    data = await request.json()
+    assert data["points"] == 2 and data["updated"] == 0
+    assert len(data["photos"]) == data["candidates"] > 0
+    assert all(45.75 <= photo["lat"] <= 45.76 for photo in data["photos"])
+    form = FormData()
+    form.add_field("track", b"<gpx><trk>", filename="broken.gpx")
+    request = await photomap_app.post("/geotag", params=params, data=form)
+    assert request.status == 400
+    for invalid in ({"offset": "nan"}, {"offset": "1e300"}, {"max_gap": "inf"}, {"max_gap": "-1"}):
+        request = await photomap_app.post("/geotag", params={**params, **invalid}, data=b"")
+        assert request.status == 400
+
+
+async def test_upload_too_large(photomap_app: web.Application, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that streamed photos and tracks larger than UPLOAD_MAX_SIZE are rejected and not left on disk"""
+    app = photomap_app.server.app
+    monkeypatch.setattr(app.config, "UPLOAD_MAX_SIZE", 1000)
+    for path, params, name in (
+        ("/upload", {}, "photo"),
+        ("/upload", {"op": "batch"}, "photo"),
+        ("/geotag", {"op": "match_tracks"}, "track"),
+    ):
+        form = FormData()
+        form.add_field(name, b"0" * 1001, filename="large")
+        request = await photomap_app.post(path, params=params, data=form, headers={"Authentication": app.config.SECRET})
+        assert request.status == 413
+        assert not os.listdir(app.config.UPLOAD_TMP_PATH)
+
+
+async def test_upload_check_hashes(photomap_app: web.Application) -> None:
+    """Test that hashes of uploads still in progress are reported as missing"""
+    app = photomap_app.server.app
+    ihash = "e" * 40
+    assert app.hash_index.reserve(ihash)
+    try:
+        request = await photomap_app.post(
+            "/upload",
+            params={"op": "check_hashes"},
+            json={"hashes": [ihash]},
+            headers={"Authentication": app.config.SECRET},
+        )
+        assert request.status == 200
+        assert (await request.json())["missing"] == [ihash]
+    finally:
+        app.hash_index.release(ihash, False)
+
+
+async def test_geotag_update_locations(photomap_app: web.Application) -> None:
+    """Test that invalid items of a location batch are reported per item"""
+    locations = [
+        {"id": 1, "hash": "0" * 40, "lat": 45.75, "lng": 21.22},  # hash mismatch, nothing is updated
+        {"id": 2, "hash": "0" * 40, "lat": 91, "lng": 21.22},
+        {"hash": "0" * 40, "lat": 45.75, "lng": 21.22},
+    ]
+    request = await photomap_app.post("/geotag", params={"op": "update_locations"}, json={"locations": locations})
+    assert request.status == 200
+    data = await request.json()
+    assert data["updated"] == 0
+    assert [result["status"] for result in data["results"]] == ["error"] * 3
+    assert data["results"][0]["details"] == "photo not found or hash mismatch"
+    request = await photomap_app.post("/geotag", params={"op": "update_locations"}, json={"locations": []})
+    assert request.status == 400
+    invalid_ids = [1.9, True, "1", 2**31]
+    locations = [{"id": photo_id, "hash": "0" * 40, "lat": 45.75, "lng": 21.22} for photo_id in invalid_ids]
+    request = await photomap_app.post("/geotag", params={"op": "update_locations"}, json={"locations": locations})
+    assert request.status == 200
+    data = await request.json()
+    assert [result["details"] for result in data["results"]] == ["id, hash, lat and/or lng invalid"] * 4
+
+
+async def test_geotag_update_locations_saved(photomap_app: web.Application) -> None:
+    """Test that a location batch updates the photos, the cluster index and bumps the cache once"""
+    app = photomap_app.server.app
+    params = {"op": "get_photo_list", "start_filter": "2000-01-01", "stop_filter": "2030-01-01", "page_size": "2"}
+    photos = (await (await photomap_app.get("/geotag", params=params)).json())["photos"]
+    assert len(photos) == 2
+    locations = [{"id": photo["id"], "hash": photo["ihash"], "lat": 45.75, "lng": 21.22} for photo in photos]
+    generation = await app.cache.generation("photos")
+    try:
+        request = await photomap_app.post("/geotag", params={"op": "update_locations"}, json={"locations": locations})
+        assert request.status == 200
+        data = await request.json()
+        assert data["updated"] == 2 and [result["status"] for result in data["results"]] == ["ok", "ok"]
+        for photo in photos:
+            row = await app.database.fetchrow("SELECT lat, lng FROM photo WHERE id=$1", photo["id"])
+            assert (row["lat"], row["lng"]) == (45.75, 21.22)
+            assert app.cluster_index.photos[photo["id"]][3:] == (45.75, 21.22)
+        assert await app.cache.generation("photos") == generation + 1
+    finally:
+        for photo in photos:  # back to the geotag queue
+            await app.database.execute("UPDATE photo SET lat=NULL, lng=NULL WHERE id=$1", photo["id"])
+            app.cluster_index.remove(photo["id"])
+
+
+async def test_photo_delete(photomap_app: web.Application) -> None:
+    """Test that deleting a photo removes it from the database and the in-memory indexes"""
+    app = photomap_app.server.app
+    ihash = "f" * 40
+    query = """INSERT INTO photo(ihash, description, moment, filename, width, height, size, lat, lng, gps_ref, access)
+            VALUES($1, '', '2021-01-01', 'deleted.jpg', 1, 1, 1, 45.75, 21.22, '', 1) RETURNING id"""
+    photo_id = await app.database.fetchval(query, ihash)
+    app.hash_index.add(ihash)
+    app.cluster_index.add(photo_id, ihash, 45.75, 21.22, 1609459200)
+    request = await photomap_app.delete("/photo", params={"photo_id": str(photo_id)})
+    assert request.status == 200
+    assert ihash not in app.hash_index and photo_id not in app.cluster_index.photos
+    assert await app.database.get_photo(photo_id) is None
+    request = await photomap_app.delete("/photo", params={"photo_id": str(photo_id)})
+    assert request.status == 404
+    request = await photomap_app.delete("/photo", params={"photo_id": "abc"})
+    assert request.status == 400
+
+
+async def test_thumbnail_overloaded(photomap_app: web.Application) -> None:
+    """Test that missing thumbnails are not rendered while the process pool queue is full"""
+    app = photomap_app.server.app
+    with app.admission.admit(app.admission.max_queue):
+        request = await photomap_app.get(f"/media/thumbnails/64px/a/b/ab{'3' * 38}")
+    assert request.status == 503
+    assert int(request.headers["Retry-After"]) >= 1
+
+
 async def test_stats(photomap_app: web.Application) -> None:
     """Test that the stats page renders the template correctly"""
     request = await photomap_app.get("/stats")
@@ -70,15 +214,56 @@ async def test_stats(photomap_app: web.Application) -> None:
 
 
 async def test_stats_ajax(photomap_app: web.Application) -> None:
-    """Test that the stats AJAX request returns all photo details"""
+    """Test that the stats AJAX request returns aggregated photo stats"""
     request = await photomap_app.get("/stats", params={"op": "get_stats"})
     assert request.status == 200
     data = await request.json()
-    assert isinstance(data, list)
-    assert 10000 < len(data) < 30000  # there are around 20k photos
-    photo = data[0]
+    assert set(data) == {"cameras", "months", "sizes", "resolutions", "location"}
+    total = sum(camera["total"] for camera in data["cameras"])
+    assert 10000 < total < 30000  # there are around 20k photos
+    assert total == data["location"]["geotagged"] + data["location"]["not_geotagged"]
+    assert total == sum(month["total"] for month in data["months"])
+    camera = data["cameras"][0]
+    assert "make" in camera
+    assert "geotagged" in camera
+    assert isinstance(camera["start"], int) or camera["start"] is None
+
+
+async def test_stats_photos(photomap_app: web.Application) -> None:
+    """Test that the stats photo list is paginated"""
+    request = await photomap_app.get("/stats", params={"op": "get_photos", "page_size": "100"})
+    assert request.status == 200
+    data = await request.json()
+    assert len(data["photos"]) == 100
+    photo = data["photos"][0]
     assert "height" in photo
     assert "width" in photo
     assert "lat" in photo
     assert "lng" in photo
     assert isinstance(photo["moment"], int) or photo["moment"] is None
+    request = await photomap_app.get("/stats", params={"op": "get_photos", "page_size": "100", "after": data["next"]})
+    data = await request.json()
+    assert data["photos"][0]["id"] > photo["id"]
+    for page_size in ("0", "-5"):  # clamped to a single photo
+        request = await photomap_app.get("/stats", params={"op": "get_photos", "page_size": page_size})
+        assert request.status == 200
+        data = await request.json()
+        assert len(data["photos"]) == 1 and data["next"] == data["photos"][0]["id"]
+
+
+async def test_map_clusters(photomap_app: web.Application) -> None:
+    """Test that the map AJAX request returns clusters and photos for the requested viewport"""
+    params = {"op": "photos", "start_dt": "2020-01-01", "end_dt": "2024-01-01", "bbox": "-180,-90,180,90", "zoom": "2"}
+    request = await photomap_app.get("/map", params=params)
+    assert request.status == 200
+    data = await request.json()
+    assert isinstance(data["clusters"], list)
+    assert isinstance(data["photos"], list)
+    cluster = data["clusters"][0]
+    assert cluster["count"] > 1
+    assert "lat" in cluster
+    assert "lng" in cluster
+    assert len(cluster["ihash"]) == 40
+    params["bbox"] = "invalid"
+    request = await photomap_app.get("/map", params=params)
+    assert request.status == 400